@@ -1,8 +1,34 @@
 """
 将棋ゲームのAIプレイヤーを実装するモジュール（Phase C: 高度な機能版）
 """
+import atexit
+import multiprocessing
+import os
 import random
 import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from pieces import create_piece
+from tsume import DfPnSolver, is_mating_move, has_mate_threat
+from hisshi import ThreatSpaceSearcher
+from moves import generate_moves, decode_move, encode_move_dict, is_drop, move_to, move_from, can_promote
+
+class StepClock:
+    """呼び出すたびに一定時間だけ進む仮想の時計（決定的モード用）
+
+    実時間の代わりに使うと、時間制限による探索の打ち切りが呼び出し回数だけで決まり、
+    同じシードなら何度実行しても同じ指し手・同じ探索局面数になる。
+    """
+    
+    def __init__(self, step=0.0005):
+        self.step = step  # 1回の呼び出しで進む秒数
+        self.now = 0.0
+        
+    def __call__(self):
+        self.now += self.step
+        return self.now
+
 
 class TacticsEngine:
     """戦術パターン認識エンジン"""
@@ -287,20 +313,7 @@ class TacticsEngine:
         
     def _is_square_attacked(self, board, pos, by_player):
         """指定位置が指定プレイヤーに攻撃されているかチェック"""
-        row, col = pos
-        
-        for r in range(9):
-            for c in range(9):
-                piece = board.grid[r][c]
-                if piece and piece.player == by_player:
-                    try:
-                        attacks = piece.get_possible_moves(board, (r, c))
-                        if (row, col) in attacks:
-                            return True
-                    except:
-                        continue
-                        
-        return False
+        return board.is_position_under_attack(pos, by_player)
         
     def _evaluate_sacrifice_benefit(self, board, move):
         """捨て駒による利益を評価"""
@@ -334,225 +347,36 @@ class TacticsEngine:
 class EndgameEngine:
     """終盤特化エンジン"""
     
-    def __init__(self, evaluator):
+    def __init__(self, evaluator, clock=time.time):
         self.evaluator = evaluator
-        self.mate_search_depth = 7  # 詰み探索の深度
+        self.mate_search_depth = 7  # 詰み探索の深度（攻め方の手数）
+        self.mate_solver = DfPnSolver(clock=clock)  # df-pnによる詰み探索
+        self.hisshi_searcher = ThreatSpaceSearcher(clock=clock)  # 脅威空間探索による必至探索
         
-    def search_mate(self, board, max_depth=None):
-        """詰み探索"""
+    def search_mate(self, board, max_depth=None, time_limit=1.0, max_nodes=50000):
+        """詰み探索（df-pn）。詰み手順（整数の指し手のリスト）を返し、見つからなければNone"""
         if max_depth is None:
             max_depth = self.mate_search_depth
             
-        return self._mate_search_recursive(board, max_depth, True)
-        
-    def _mate_search_recursive(self, board, depth, is_attacking):
-        """再帰的詰み探索"""
-        if depth == 0:
-            return None
-            
-        if is_attacking:
-            # 攻撃側：王手をかける手を探す
-            possible_moves = self._get_checking_moves(board)
-            
-            for move in possible_moves:
-                # 手を実行
-                original_state = self._save_state(board)
-                self._execute_move_simple(board, move)
-                
-                try:
-                    # 相手の応手を確認
-                    board.player_turn = 3 - board.player_turn
-                    defense_moves = self._get_all_legal_moves(board)
-                    
-                    if not defense_moves:
-                        # 詰み発見
-                        return [move]
-                        
-                    # 全ての応手に対して詰みが続くかチェック
-                    mate_continues = True
-                    for defense_move in defense_moves:
-                        defense_state = self._save_state(board)
-                        self._execute_move_simple(board, defense_move)
-                        
-                        try:
-                            board.player_turn = 3 - board.player_turn
-                            continuation = self._mate_search_recursive(board, depth - 1, True)
-                            if continuation is None:
-                                mate_continues = False
-                                self._restore_state(board, defense_state)
-                                break
-                        finally:
-                            self._restore_state(board, defense_state)
-                            
-                    if mate_continues:
-                        # 詰み手順発見
-                        return [move]
-                        
-                finally:
-                    self._restore_state(board, original_state)
-                    
-        return None
-        
-    def _get_checking_moves(self, board):
-        """王手をかける手のみを取得"""
-        checking_moves = []
-        
-        for row in range(9):
-            for col in range(9):
-                piece = board.grid[row][col]
-                if piece and piece.player == board.player_turn:
-                    try:
-                        moves = piece.get_possible_moves(board, (row, col))
-                        for move_row, move_col in moves:
-                            move = {
-                                'type': 'move',
-                                'from': (row, col),
-                                'to': (move_row, move_col),
-                                'piece': piece
-                            }
-                            if self._gives_check(board, move):
-                                checking_moves.append(move)
-                    except:
-                        continue
-                        
-        # 持ち駒による王手
-        for i, piece in enumerate(board.captured_pieces[board.player_turn]):
-            try:
-                drop_positions = board.get_valid_drop_positions(piece)
-                for drop_row, drop_col in drop_positions:
-                    move = {
-                        'type': 'drop',
-                        'piece_index': i,
-                        'to': (drop_row, drop_col),
-                        'piece': piece
-                    }
-                    if self._gives_check_after_drop(board, move):
-                        checking_moves.append(move)
-            except:
-                continue
-                
-        return checking_moves
+        self.mate_solver.max_ply = max_depth * 2 - 1
+        self.mate_solver.time_limit = time_limit
+        self.mate_solver.max_nodes = max_nodes
+        return self.mate_solver.solve(board)
         
-    def _gives_check(self, board, move):
-        """手が王手をかけるかチェック"""
-        to_row, to_col = move['to']
-        piece = move['piece']
+    def search_hisshi(self, board, time_limit=1.0, max_nodes=20000):
+        """必至探索。どう受けても詰む手（整数の指し手）を返し、見つからなければNone"""
+        self.hisshi_searcher.max_nodes = max_nodes
+        return self.hisshi_searcher.search(board, time_limit=time_limit)
         
-        enemy_king_pos = self._find_enemy_king(board, piece.player)
-        if not enemy_king_pos:
-            return False
-            
-        try:
-            attack_positions = piece.get_possible_moves(board, (to_row, to_col))
-            return enemy_king_pos in attack_positions
-        except:
-            return False
-            
-    def _gives_check_after_drop(self, board, move):
-        """持ち駒配置後に王手をかけるかチェック"""
-        to_row, to_col = move['to']
-        piece = move['piece']
+    def table_counts(self):
+        """詰み探索と必至探索の詰み判定のdf-pnが置換表を引いた回数と、そのうち結果があった回数（累計）"""
+        solvers = (self.mate_solver, self.hisshi_searcher.solver)
+        return sum(solver.probes for solver in solvers), sum(solver.hits for solver in solvers)
         
-        enemy_king_pos = self._find_enemy_king(board, piece.player)
-        if not enemy_king_pos:
-            return False
-            
-        try:
-            attack_positions = piece.get_possible_moves(board, (to_row, to_col))
-            return enemy_king_pos in attack_positions
-        except:
-            return False
-            
     def _find_enemy_king(self, board, player):
         """敵の王の位置を探す"""
-        enemy_player = 3 - player
-        for row in range(9):
-            for col in range(9):
-                piece = board.grid[row][col]
-                if piece and piece.name == "king" and piece.player == enemy_player:
-                    return (row, col)
-        return None
-        
-    def _get_all_legal_moves(self, board):
-        """全ての合法手を取得（簡易版）"""
-        moves = []
+        return board.find_king_position(3 - player)
         
-        for row in range(9):
-            for col in range(9):
-                piece = board.grid[row][col]
-                if piece and piece.player == board.player_turn:
-                    try:
-                        piece_moves = piece.get_possible_moves(board, (row, col))
-                        for move_row, move_col in piece_moves:
-                            moves.append({
-                                'type': 'move',
-                                'from': (row, col),
-                                'to': (move_row, move_col),
-                                'piece': piece
-                            })
-                    except:
-                        continue
-                        
-        for i, piece in enumerate(board.captured_pieces[board.player_turn]):
-            try:
-                drop_positions = board.get_valid_drop_positions(piece)
-                for drop_row, drop_col in drop_positions:
-                    moves.append({
-                        'type': 'drop',
-                        'piece_index': i,
-                        'to': (drop_row, drop_col),
-                        'piece': piece
-                    })
-            except:
-                continue
-                
-        return moves
-        
-    def _save_state(self, board):
-        """簡易状態保存"""
-        grid_copy = []
-        for row in board.grid:
-            grid_copy.append(row[:])
-            
-        return {
-            'grid': grid_copy,
-            'player_turn': board.player_turn,
-            'captured_pieces': {
-                1: board.captured_pieces[1][:],
-                2: board.captured_pieces[2][:]
-            }
-        }
-        
-    def _restore_state(self, board, state):
-        """簡易状態復元"""
-        board.grid = state['grid']
-        board.player_turn = state['player_turn']
-        board.captured_pieces = state['captured_pieces']
-        
-    def _execute_move_simple(self, board, move):
-        """簡易手実行"""
-        if move['type'] == 'move':
-            from_row, from_col = move['from']
-            to_row, to_col = move['to']
-            
-            piece = board.grid[from_row][from_col]
-            captured = board.grid[to_row][to_col]
-            
-            board.grid[from_row][from_col] = None
-            board.grid[to_row][to_col] = piece
-            
-            if captured:
-                captured.is_promoted = False
-                board.captured_pieces[board.player_turn].append(captured)
-                
-        elif move['type'] == 'drop':
-            piece_index = move['piece_index']
-            to_row, to_col = move['to']
-            
-            if piece_index < len(board.captured_pieces[board.player_turn]):
-                piece = board.captured_pieces[board.player_turn][piece_index]
-                board.grid[to_row][to_col] = piece
-                
     def evaluate_endgame_position(self, board, player):
         """終盤局面の特別評価"""
         score = 0
@@ -586,7 +410,8 @@ class EndgameEngine:
                     if piece is None or piece.player == player:
                         escape_squares += 1
                         
-        return escape_squares <= 2
+        # 逃げ場が少ないときだけ、詰めろ（1手詰めの狙い）が実際にあるかを調べる
+        return escape_squares <= 2 and has_mate_threat(board, 3 - player)
         
     def _evaluate_king_safety_endgame(self, board, player):
         """終盤の王の安全度評価"""
@@ -613,24 +438,19 @@ class EndgameEngine:
         """終盤の持ち駒評価"""
         score = 0
         
-        for piece in board.captured_pieces[player]:
-            base_value = self.evaluator.piece_values[piece.name]
-            score += base_value * 1.2
+        for piece_name, count in board.iter_hand(player):
+            base_value = self.evaluator.piece_values[piece_name]
+            score += base_value * 1.2 * count
             
-        for piece in board.captured_pieces[3 - player]:
-            base_value = self.evaluator.piece_values[piece.name]
-            score -= base_value * 1.2
+        for piece_name, count in board.iter_hand(3 - player):
+            base_value = self.evaluator.piece_values[piece_name]
+            score -= base_value * 1.2 * count
             
         return score
         
     def _find_king_position(self, board, player):
         """王の位置を探す"""
-        for row in range(9):
-            for col in range(9):
-                piece = board.grid[row][col]
-                if piece and piece.name == "king" and piece.player == player:
-                    return (row, col)
-        return None
+        return board.find_king_position(player)
 
 
 class OpeningBook:
@@ -742,8 +562,8 @@ class OpeningBook:
     def _is_bishop_exchanged(self, board):
         """角の交換が行われたかチェック"""
         # 簡易実装：両者の持ち駒に角があるかチェック
-        player1_has_bishop = any(piece.name == "bishop" for piece in board.captured_pieces[1])
-        player2_has_bishop = any(piece.name == "bishop" for piece in board.captured_pieces[2])
+        player1_has_bishop = board.hand_count(1, "bishop") > 0
+        player2_has_bishop = board.hand_count(2, "bishop") > 0
         
         return player1_has_bishop or player2_has_bishop
         
@@ -764,7 +584,7 @@ class OpeningBook:
             
         # 合法手かチェック
         try:
-            possible_moves = piece.get_possible_moves(board, from_pos)
+            possible_moves = board.get_piece_moves(from_pos)
             return to_pos in possible_moves
         except:
             return False
@@ -816,21 +636,278 @@ class OpeningBook:
         return positions
 
 
+_outcome_searcher = None  # ワーカープロセスで使い回す探索エンジン
+_outcome_executor = None  # 特殊技の結果を並列に評価するプロセスプール（プロセスで1つ）
+
+
+def _outcome_values(board, player, deltas, depth, max_replies, searcher=None):
+    """特殊技の結果（差分）ごとに、反映した局面をsearch_after_turnで探索した評価値を返す
+
+    ProcessPoolExecutorのワーカーから呼び出すのでモジュールの関数にしている。
+    """
+    global _outcome_searcher
+    if searcher is None:
+        if _outcome_searcher is None:
+            _outcome_searcher = MoveSearcher(PositionEvaluator())
+        searcher = _outcome_searcher
+        
+    values = []
+    for delta in deltas:
+        board.apply_delta(delta)
+        try:
+            values.append(searcher.search_after_turn(board, player, depth, max_replies))
+        finally:
+            board.undo_delta(delta)
+    return values
+
+
+def _get_outcome_executor(max_workers):
+    """特殊技の結果の評価用のプロセスプールを返す（pygameの状態を引き継がないようspawnで起動）
+
+    プロセスの終了時にshutdown_outcome_executorでワーカープロセスを終了する。
+    """
+    global _outcome_executor
+    if _outcome_executor is None:
+        _outcome_executor = ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+        atexit.register(shutdown_outcome_executor)
+    return _outcome_executor
+
+
+def shutdown_outcome_executor():
+    """特殊技の結果の評価用のプロセスプールを終了する（次に使うときに作り直す）"""
+    global _outcome_executor
+    executor = _outcome_executor
+    if executor is not None:
+        _outcome_executor = None
+        atexit.unregister(shutdown_outcome_executor)
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+class SpecialMovePlanner:
+    """特殊技をルートのチャンスノードとして評価するクラス
+
+    未使用の特殊技ごとに効果の結果の確率分布（結果が少なければ全列挙、多ければ抽出）を
+    求め、各結果の局面を浅く探索した評価値の期待値を、通常の探索での最善手の評価値と比べる。
+    結果の局面の探索はワーカープロセスで並列に行い、使えない環境では直列に行う。
+    """
+    
+    def __init__(self, searcher, max_outcomes=16, depth=2, max_replies=12, margin=500, max_workers=None, rng=None):
+        self.searcher = searcher
+        self.rng = rng  # 結果の抽出に使う乱数（Noneなら対局の乱数）
+        self.max_outcomes = max_outcomes  # 特殊技1つあたりの結果の数の上限
+        self.depth = depth  # 結果の局面を探索する手数（相手の応手を含む）
+        self.max_replies = max_replies  # 結果の局面で調べる相手の応手の数
+        self.margin = margin  # 1度しか使えない特殊技を選ぶのに必要な期待値の差
+        if max_workers is None:
+            max_workers = min(4, os.cpu_count() or 1)
+        self.max_workers = max_workers  # 1なら直列に評価する
+        
+    def choose(self, board, player, best_move, best_score=None):
+        """通常の最善手より期待値が十分に高い特殊技を返す。なければNone
+
+        best_scoreには探索での最善手の評価値（MoveSearcher.last_best_score）を渡す。
+        Noneなら最善手を指した局面を結果の局面と同じ浅い探索で評価する。
+        """
+        if best_score == float('inf'):
+            return None  # 詰み・必至を見つけている
+        candidates = board.special_state.available_moves(board, player)
+        if not candidates:
+            return None
+            
+        baseline = best_score
+        if baseline is None:
+            undo = board.make_move(best_move)
+            try:
+                baseline = self.searcher.search_after_turn(board, player, self.depth, self.max_replies)
+            finally:
+                board.unmake_move(best_move, undo)
+            
+        distributions = [special_move.outcomes(board, player, self.max_outcomes, self.rng) for special_move in candidates]
+        values = self._score_outcomes(board, player, distributions)
+        
+        best_special = None
+        best_expected = baseline + self.margin
+        for special_move, outcomes, outcome_values in zip(candidates, distributions, values):
+            if not outcomes:
+                continue
+            expected = sum(probability * value for (probability, delta), value in zip(outcomes, outcome_values))
+            if expected > best_expected:
+                best_special = special_move
+                best_expected = expected
+                
+        if best_special:
+            print(f"特殊技「{best_special.name}」の期待値 {best_expected:.0f} が最善手の評価値 {baseline:.0f} を上回りました")
+        return best_special
+        
+    def _score_outcomes(self, board, player, distributions):
+        """特殊技ごとの結果の評価値のリストを返す"""
+        deltas = [delta for outcomes in distributions for probability, delta in outcomes]
+        flat_values = None
+        
+        if self.max_workers > 1 and len(deltas) > 1:
+            try:
+                executor = _get_outcome_executor(self.max_workers)
+                chunk_size = -(-len(deltas) // self.max_workers)
+                futures = [
+                    executor.submit(_outcome_values, board, player, deltas[i:i + chunk_size],
+                                    self.depth, self.max_replies)
+                    for i in range(0, len(deltas), chunk_size)
+                ]
+                flat_values = [value for future in futures for value in future.result()]
+            except Exception as e:
+                # ワーカープロセスが使えない環境では以降は直列に評価する
+                print(f"特殊技の並列評価に失敗したため直列で評価します: {e}")
+                self.max_workers = 1
+                
+        if flat_values is None:
+            flat_values = _outcome_values(board, player, deltas, self.depth, self.max_replies, self.searcher)
+            
+        # 特殊技ごとに分け直す
+        values = []
+        index = 0
+        for outcomes in distributions:
+            values.append(flat_values[index:index + len(outcomes)])
+            index += len(outcomes)
+        return values
+
+
+class SearchStats:
+    """1回の探索の統計（MoveSearcherが探索中に記録する）
+
+    統計を取らない探索ではMoveSearcher.statsはNoneのままで、記録の処理は一切行われない。
+    各工程の時間はStepClockを進めないようtime.perf_counterで測る。
+    """
+    
+    PHASES = ("movegen", "ordering", "eval", "tactics", "mate")
+    
+    def __init__(self):
+        self.nodes = 0  # アルファベータ探索で展開した局面数
+        self.mate_nodes = 0  # 詰み探索・必至探索で展開した局面数
+        self.depth = 0  # 指定した探索深度
+        self.seldepth = 0  # 実際に到達した最大の手数
+        self.beta_cutoffs = 0  # 枝刈りが起きた回数
+        self.first_move_cutoffs = 0  # そのうち最初に調べた手で枝刈りが起きた回数
+        self.tt_probes = 0  # 必至探索のcacheと詰み探索・必至探索のdf-pnの置換表を引いた回数
+        self.tt_hits = 0  # そのうち結果があった回数
+        self.eval_calls = 0  # 末端の局面の評価回数
+        self.eval_repeats = 0  # そのうち同じ探索内で評価済みの局面を再び評価した回数
+        self.phase_times = {phase: 0.0 for phase in self.PHASES}  # 工程 -> 秒
+        self.iterations = []  # 反復ごとの {depth, score, pv, nodes, time}
+        self.elapsed = 0.0  # 探索全体の秒数
+        self.ply = 0  # 探索中の現在の手数
+        self.pv_table = {}  # 手数 -> その局面からの最善手順（探索中の作業用）
+        self.evaluated = set()  # 評価済みの局面のハッシュ値（探索中の作業用）
+        
+    @property
+    def nps(self):
+        """1秒あたりの展開局面数（詰み探索を含む）"""
+        return (self.nodes + self.mate_nodes) / self.elapsed if self.elapsed > 0 else 0.0
+        
+    @property
+    def first_move_cutoff_ratio(self):
+        """枝刈りのうち最初の手で起きた割合（手の順序付けの良さの目安）"""
+        return self.first_move_cutoffs / self.beta_cutoffs if self.beta_cutoffs else None
+        
+    @property
+    def tt_hit_rate(self):
+        return self.tt_hits / self.tt_probes if self.tt_probes else None
+        
+    def add_time(self, phase, start):
+        """startからの経過時間を工程phaseに加える"""
+        self.phase_times[phase] += time.perf_counter() - start
+        
+    def as_dict(self):
+        """JSONに書き出せる辞書を返す"""
+        return {
+            "nodes": self.nodes,
+            "mate_nodes": self.mate_nodes,
+            "nps": round(self.nps),
+            "depth": self.depth,
+            "seldepth": self.seldepth,
+            "beta_cutoffs": self.beta_cutoffs,
+            "first_move_cutoff_ratio": self.first_move_cutoff_ratio,
+            "tt_probes": self.tt_probes,
+            "tt_hits": self.tt_hits,
+            "eval_calls": self.eval_calls,
+            "eval_repeats": self.eval_repeats,
+            "phase_times": {phase: round(seconds, 4) for phase, seconds in self.phase_times.items()},
+            "iterations": self.iterations,
+            "elapsed": round(self.elapsed, 4),
+        }
+        
+    def summary(self):
+        """1行の要約"""
+        ratio = self.first_move_cutoff_ratio
+        phases = " ".join(f"{phase}={seconds:.2f}s" for phase, seconds in self.phase_times.items())
+        return (f"探索統計: 局面数{self.nodes}+{self.mate_nodes} {self.nps:.0f} nodes/秒 "
+                f"深さ{self.depth}/{self.seldepth} 枝刈り{self.beta_cutoffs}"
+                f"（初手{'-' if ratio is None else f'{ratio:.0%}'}） 評価{self.eval_calls}（再評価{self.eval_repeats}） "
+                f"{phases}")
+
+
 class MoveSearcher:
     """ミニマックス探索を担当するクラス（アルファベータ枝刈り対応）"""
     
-    def __init__(self, evaluator, max_depth=4):  # 深度を4に増加
+    def __init__(self, evaluator, max_depth=4, clock=time.time, collect_stats=False, stats_callback=None):  # 深度を4に増加
         self.evaluator = evaluator
         self.max_depth = max_depth
+        self.clock = clock  # 制限時間の計測に使う時計
         self.tactics_engine = TacticsEngine(evaluator)
-        self.endgame_engine = EndgameEngine(evaluator)
-        
-    def search_best_move(self, board, possible_moves, time_limit=10.0):  # 時間制限を10秒に変更
-        """制限時間内で最適手を探索（アルファベータ枝刈り）"""
-        start_time = time.time()
+        self.endgame_engine = EndgameEngine(evaluator, clock)
+        self._ply_buffers = {}  # 残り深さ -> 指し手生成用のバッファ（再利用する）
+        self.nodes = 0  # 直前の探索でアルファベータ探索が展開した局面数
+        self.collect_stats = collect_stats  # 探索ごとにSearchStatsを記録して表示するかどうか
+        self.stats_callback = stats_callback  # 探索が終わるたびにSearchStatsを渡す関数（指定すると統計を記録する）
+        self.stats = None  # 探索中のSearchStats（統計を取らない探索ではNone）
+        self.last_stats = None  # 直前の探索のSearchStats
+        self.last_best_score = None  # 直前の探索の最善手の評価値（詰み・必至ならinf、1手も評価できなければNone）
+        
+    def search_best_move(self, board, possible_moves, time_limit=10.0, depth=None):  # 時間制限を10秒に変更
+        """制限時間内で最適手を探索（アルファベータ枝刈り）。depthを指定すると探索深度を固定する
+
+        統計を取る設定ならlast_statsに探索の統計を残し、stats_callbackに渡す。
+        """
+        if not (self.collect_stats or self.stats_callback):
+            return self._search_best_move(board, possible_moves, time_limit, depth)
+            
+        stats = self.stats = SearchStats()
+        probes, hits = self._table_counts()
+        start = time.perf_counter()
+        try:
+            best_moves = self._search_best_move(board, possible_moves, time_limit, depth)
+        finally:
+            self.stats = None
+        stats.elapsed = time.perf_counter() - start
+        stats.nodes = self.nodes
+        table_probes, table_hits = self._table_counts()
+        stats.tt_probes = table_probes - probes
+        stats.tt_hits = table_hits - hits
+        stats.pv_table = {}
+        stats.evaluated = set()
+        self.last_stats = stats
+        if self.collect_stats:
+            print(stats.summary())
+        if self.stats_callback:
+            self.stats_callback(stats)
+        return best_moves
+        
+    def _table_counts(self):
+        """必至探索のcacheとdf-pnの置換表を引いた回数と、そのうち結果があった回数（累計）"""
+        hisshi = self.endgame_engine.hisshi_searcher
+        probes, hits = self.endgame_engine.table_counts()
+        return probes + hisshi.cache_probes, hits + hisshi.cache_hits
+        
+    def _search_best_move(self, board, possible_moves, time_limit, depth):
+        start_time = self.clock()
+        stats = self.stats
+        self.nodes = 0
+        self.last_best_score = None
         
         # 時間に応じて探索深度を調整
-        if time_limit <= 1.0:
+        if depth is not None:
+            max_depth = depth
+        elif time_limit <= 1.0:
             max_depth = 2  # 時間が少ない場合は浅く
         elif time_limit <= 3.0:
             max_depth = 3
@@ -840,22 +917,52 @@ class MoveSearcher:
             max_depth = 5  # 時間に余裕がある場合は深く
             
         print(f"探索深度: {max_depth}, 制限時間: {time_limit:.1f}秒")
+        if stats is not None:
+            stats.depth = max_depth
         
         # 終盤では詰み探索を優先
         if self._is_endgame(board):
-            mate_move = self.endgame_engine.search_mate(board, 5)
-            if mate_move:
-                return [mate_move]
+            if stats is not None:
+                phase_start = time.perf_counter()
+            mate_sequence = self.endgame_engine.search_mate(board, 8, time_limit=time_limit * 0.1)
+            if stats is not None:
+                stats.mate_nodes += self.endgame_engine.mate_solver.nodes
+            if mate_sequence:
+                mate_length = self.endgame_engine.mate_solver.mate_length
+                print(f"詰みを発見: {mate_length}手詰め")
+                self.last_best_score = float('inf')
+                if stats is not None:
+                    stats.add_time("mate", phase_start)
+                    stats.iterations.append({"depth": mate_length, "score": float('inf'),
+                                             "pv": list(mate_sequence), "nodes": 0,
+                                             "time": round(time.perf_counter() - phase_start, 4)})
+                return [mate_sequence[0]]
+                
+            # 王手で詰まなければ、受けのない詰めろ（必至）を探す
+            hisshi_move = self.endgame_engine.search_hisshi(board, time_limit=time_limit * 0.2)
+            if stats is not None:
+                stats.mate_nodes += self.endgame_engine.hisshi_searcher.nodes
+                stats.add_time("mate", phase_start)
+            if hisshi_move is not None:
+                print("必至を発見")
+                self.last_best_score = float('inf')
+                return [hisshi_move]
         
         # 手の順序付け（良い手を先に評価）
+        if stats is not None:
+            phase_start = time.perf_counter()
         ordered_moves = self._order_moves(board, possible_moves)
+        if stats is not None:
+            stats.add_time("ordering", phase_start)
+            iteration_start = time.perf_counter()
+            best_pv = []
         
         best_moves = []
         best_score = float('-inf')
         
         for i, move in enumerate(ordered_moves):
             # 時間制限チェック（90%の時間を使ったら終了）
-            elapsed = time.time() - start_time
+            elapsed = self.clock() - start_time
             if elapsed > time_limit * 0.9:
                 print(f"時間制限により探索終了 ({i+1}/{len(ordered_moves)}手評価済み)")
                 break
@@ -875,35 +982,71 @@ class MoveSearcher:
             if score > best_score:
                 best_score = score
                 best_moves = [move]
+                if stats is not None:
+                    best_pv = stats.pv_table.get(1, [move])
             elif score == best_score:
                 best_moves.append(move)
                 
+        if stats is not None:
+            stats.iterations.append({"depth": max_depth, "score": best_score, "pv": best_pv,
+                                     "nodes": self.nodes,
+                                     "time": round(time.perf_counter() - iteration_start, 4)})
+        if best_moves:
+            self.last_best_score = best_score
         return best_moves if best_moves else [ordered_moves[0]]
         
     def _alpha_beta_search(self, board, move, depth, alpha, beta, is_maximizing, start_time, time_limit):
         """アルファベータ枝刈り探索"""
+        stats = self.stats
         # 時間制限チェック（95%の時間を使ったら即座に終了）
-        elapsed = time.time() - start_time
+        elapsed = self.clock() - start_time
         if elapsed > time_limit * 0.95:
+            if stats is not None:
+                stats.pv_table[stats.ply + 1] = [move]
             return self._quick_evaluate(board, move)
             
         # 手を実行
-        original_state = self._save_simple_state(board)
-        self._execute_move_simple(board, move)
+        self.nodes += 1
+        if stats is not None:
+            stats.ply += 1
+            ply = stats.ply
+            if ply > stats.seldepth:
+                stats.seldepth = ply
+            best_line = []
+        original_player = board.player_turn
+        undo = board.make_move(move)
         
         try:
             # 終端条件
             if depth == 0 or self._is_terminal_position(board):
-                score = self.evaluator.evaluate_position(board, original_state['original_player'])
+                if stats is not None:
+                    stats.eval_calls += 1
+                    if board.zobrist_key in stats.evaluated:
+                        stats.eval_repeats += 1
+                    else:
+                        stats.evaluated.add(board.zobrist_key)
+                    stats.pv_table[ply] = [move]
+                    phase_start = time.perf_counter()
+                score = self.evaluator.evaluate_position(board, original_player)
+                if stats is not None:
+                    stats.add_time("eval", phase_start)
+                    phase_start = time.perf_counter()
                 
-                # 戦術ボーナスを追加
-                tactical_bonus = self.tactics_engine.evaluate_tactics(board, move)
+                # 戦術ボーナスを追加（戦術認識は辞書形式の手を使う）
+                to_row, to_col = move_to(move)
+                tactical_bonus = self.tactics_engine.evaluate_tactics(
+                    board, decode_move(board, move, board.grid[to_row][to_col]))
                 score += tactical_bonus
+                if stats is not None:
+                    stats.add_time("tactics", phase_start)
+                    phase_start = time.perf_counter()
                 
                 # 終盤では特別評価を追加
                 if self._is_endgame(board):
-                    endgame_bonus = self.endgame_engine.evaluate_endgame_position(board, original_state['original_player'])
+                    endgame_bonus = self.endgame_engine.evaluate_endgame_position(board, original_player)
                     score += endgame_bonus * 0.3
+                if stats is not None:
+                    stats.add_time("eval", phase_start)
                 
                 return score
                 
@@ -911,10 +1054,16 @@ class MoveSearcher:
             board.player_turn = 3 - board.player_turn
             
             # 次の手の候補を取得
-            next_moves = self._get_possible_moves_simple(board)
+            if stats is not None:
+                phase_start = time.perf_counter()
+            next_moves = self._get_possible_moves_simple(board, depth)
+            if stats is not None:
+                stats.add_time("movegen", phase_start)
             
             if not next_moves:
                 # 合法手がない場合（詰み）
+                if stats is not None:
+                    stats.pv_table[ply] = [move]
                 if is_maximizing:
                     return float('-inf')
                 else:
@@ -929,47 +1078,69 @@ class MoveSearcher:
             else:
                 max_moves = 15  # 上位15手まで
                 
+            if stats is not None:
+                phase_start = time.perf_counter()
             ordered_next_moves = self._order_moves(board, next_moves[:max_moves])
+            if stats is not None:
+                stats.add_time("ordering", phase_start)
             
             if is_maximizing:
                 max_eval = float('-inf')
-                for next_move in ordered_next_moves:
+                for index, next_move in enumerate(ordered_next_moves):
                     eval_score = self._alpha_beta_search(board, next_move, depth - 1, 
                                                        alpha, beta, False, start_time, time_limit)
+                    if stats is not None and (eval_score > max_eval or not best_line):
+                        best_line = stats.pv_table.get(ply + 1, [next_move])
                     max_eval = max(max_eval, eval_score)
                     alpha = max(alpha, eval_score)
                     
                     # ベータカット
                     if beta <= alpha:
+                        if stats is not None:
+                            stats.beta_cutoffs += 1
+                            stats.first_move_cutoffs += index == 0
                         break
                         
+                if stats is not None:
+                    stats.pv_table[ply] = [move] + best_line
                 return max_eval
             else:
                 min_eval = float('inf')
-                for next_move in ordered_next_moves:
+                for index, next_move in enumerate(ordered_next_moves):
                     eval_score = self._alpha_beta_search(board, next_move, depth - 1, 
                                                        alpha, beta, True, start_time, time_limit)
+                    if stats is not None and (eval_score < min_eval or not best_line):
+                        best_line = stats.pv_table.get(ply + 1, [next_move])
                     min_eval = min(min_eval, eval_score)
                     beta = min(beta, eval_score)
                     
                     # アルファカット
                     if beta <= alpha:
+                        if stats is not None:
+                            stats.beta_cutoffs += 1
+                            stats.first_move_cutoffs += index == 0
                         break
                         
+                if stats is not None:
+                    stats.pv_table[ply] = [move] + best_line
                 return min_eval
                 
         finally:
             # 盤面を復元
-            self._restore_simple_state(board, original_state)
+            board.player_turn = original_player
+            board.unmake_move(move, undo)
+            if stats is not None:
+                stats.ply -= 1
             
     def _order_moves(self, board, moves):
         """手の順序付け（良い手を先に評価）"""
         def move_priority(move):
             priority = 0
             
+            to_row, to_col = move_to(move)
+            
             # 駒を取る手を優先
-            if move['type'] == 'move':
-                to_row, to_col = move['to']
+            if not is_drop(move):
                 target = board.grid[to_row][to_col]
                 if target and target.player != board.player_turn:
                     priority += self.evaluator.piece_values[target.name]
@@ -979,8 +1150,7 @@ class MoveSearcher:
                 priority += 500
                 
             # 中央への手を優先
-            to_pos = move['to']
-            center_distance = abs(to_pos[0] - 4) + abs(to_pos[1] - 4)
+            center_distance = abs(to_row - 4) + abs(to_col - 4)
             priority += max(0, 8 - center_distance) * 10
             
             return priority
@@ -989,9 +1159,10 @@ class MoveSearcher:
         
     def _gives_check_quick(self, board, move):
         """簡易王手判定"""
-        if move['type'] == 'move':
-            to_row, to_col = move['to']
-            piece = move['piece']
+        if not is_drop(move):
+            to_row, to_col = move_to(move)
+            from_row, from_col = move_from(move)
+            piece = board.grid[from_row][from_col]
             
             # 相手の王の位置を探す
             enemy_king_pos = None
@@ -1014,6 +1185,31 @@ class MoveSearcher:
                     
         return False
         
+    def search_after_turn(self, board, player, depth=2, max_replies=12):
+        """playerが手番を終えた局面の評価値（相手の上位max_replies手の応手からdepth手先までの探索）
+
+        評価はsearch_best_moveの最善手の評価値と同じ基準（末端でplayerから見た評価）で、
+        depthは偶数にする（相手の応手とplayerの手で1組）。時間制限なしで探索するので結果は決定的。
+        """
+        opponent = 3 - player
+        original_player = board.player_turn
+        board.player_turn = opponent
+        start_time = self.clock()
+        try:
+            replies = self._order_moves(board, generate_moves(board, opponent, max_drops_per_type=5))
+            worst = None
+            for reply in replies[:max_replies]:
+                score = self._alpha_beta_search(board, reply, depth - 1, float('-inf'),
+                                                float('inf') if worst is None else worst, True,
+                                                start_time, float('inf'))
+                if worst is None or score < worst:
+                    worst = score
+            if worst is None:
+                worst = self.evaluator.evaluate_position(board, player)
+            return worst
+        finally:
+            board.player_turn = original_player
+        
     def _is_endgame(self, board):
         """終盤かどうかの判定"""
         total_pieces = 0
@@ -1027,22 +1223,23 @@ class MoveSearcher:
     def _minimax_search(self, board, move, depth, is_maximizing, start_time, time_limit):
         """ミニマックス探索（再帰）"""
         # 時間制限チェック
-        if time.time() - start_time > time_limit:
+        if self.clock() - start_time > time_limit:
             return self._quick_evaluate(board, move)
             
         # 手を実行
-        original_state = self._save_simple_state(board)
-        self._execute_move_simple(board, move)
+        self.nodes += 1
+        original_player = board.player_turn
+        undo = board.make_move(move)
         
         try:
             # 終端条件
             if depth == 0 or self._is_terminal_position(board):
-                return self.evaluator.evaluate_position(board, original_state['original_player'])
+                return self.evaluator.evaluate_position(board, original_player)
                 
             # 手番を交代
             board.player_turn = 3 - board.player_turn
             
-            # 次の手の候補を取得
+            # 次の手の候補を取得（再帰中に使い回さないよう新しいバッファに生成する）
             next_moves = self._get_possible_moves_simple(board)
             
             if not next_moves:
@@ -1067,7 +1264,8 @@ class MoveSearcher:
                 
         finally:
             # 盤面を復元
-            self._restore_simple_state(board, original_state)
+            board.player_turn = original_player
+            board.unmake_move(move, undo)
             
     def _quick_evaluate(self, board, move):
         """時間制限時の簡易評価"""
@@ -1078,8 +1276,8 @@ class MoveSearcher:
         score = 0
         
         # 駒を取る価値
-        if move['type'] == 'move':
-            to_row, to_col = move['to']
+        if not is_drop(move):
+            to_row, to_col = move_to(move)
             target_piece = board.grid[to_row][to_col]
             if target_piece and target_piece.player != board.player_turn:
                 score += self.evaluator.piece_values[target_piece.name]
@@ -1090,77 +1288,18 @@ class MoveSearcher:
         """終端局面かどうか"""
         return board.checkmate or board.game_over
         
-    def _save_simple_state(self, board):
-        """簡易状態保存"""
-        grid_copy = []
-        for row in board.grid:
-            grid_copy.append(row[:])  # 浅いコピー
-            
-        return {
-            'grid': grid_copy,
-            'player_turn': board.player_turn,
-            'original_player': board.player_turn
-        }
-        
-    def _restore_simple_state(self, board, state):
-        """簡易状態復元"""
-        board.grid = state['grid']
-        board.player_turn = state['player_turn']
-        
-    def _execute_move_simple(self, board, move):
-        """簡易手実行（探索用）"""
-        if move['type'] == 'move':
-            from_row, from_col = move['from']
-            to_row, to_col = move['to']
-            
-            piece = board.grid[from_row][from_col]
-            board.grid[from_row][from_col] = None
-            board.grid[to_row][to_col] = piece
-            
-        elif move['type'] == 'drop':
-            piece_index = move['piece_index']
-            to_row, to_col = move['to']
-            
-            if piece_index < len(board.captured_pieces[board.player_turn]):
-                piece = board.captured_pieces[board.player_turn][piece_index]
-                board.grid[to_row][to_col] = piece
-                
-    def _get_possible_moves_simple(self, board):
-        """簡易合法手生成"""
-        possible_moves = []
-        
-        # 盤上の駒の移動
-        for row in range(9):
-            for col in range(9):
-                piece = board.grid[row][col]
-                if piece and piece.player == board.player_turn:
-                    try:
-                        moves = piece.get_possible_moves(board, (row, col))
-                        for move_row, move_col in moves:
-                            possible_moves.append({
-                                'type': 'move',
-                                'from': (row, col),
-                                'to': (move_row, move_col),
-                                'piece': piece
-                            })
-                    except:
-                        continue
-        
-        # 持ち駒の配置（簡略化）
-        for i, piece in enumerate(board.captured_pieces[board.player_turn][:3]):  # 上位3つのみ
-            try:
-                drop_positions = board.get_valid_drop_positions(piece)
-                for drop_row, drop_col in drop_positions[:5]:  # 上位5箇所のみ
-                    possible_moves.append({
-                        'type': 'drop',
-                        'piece_index': i,
-                        'to': (drop_row, drop_col),
-                        'piece': piece
-                    })
-            except:
-                continue
-        
-        return possible_moves
+    def _get_possible_moves_simple(self, board, depth=None):
+        """簡易合法手生成（持ち駒は1種類につき上位5箇所のみ）
+
+        depthを指定すると、その深さ専用のバッファを再利用して生成する。
+        呼び出し側は次に同じ深さで生成する前に並べ替えなどで読み終えておくこと。
+        """
+        out = None
+        if depth is not None:
+            out = self._ply_buffers.get(depth)
+            if out is None:
+                out = self._ply_buffers[depth] = array('H')
+        return generate_moves(board, max_drops_per_type=5, out=out)
 
 
 class PositionEvaluator:
@@ -1382,11 +1521,11 @@ class PositionEvaluator:
                         score -= piece_value
         
         # 持ち駒を評価
-        for piece in board.captured_pieces[player]:
-            score += self.piece_values[piece.name] * 0.8
+        for piece_name, count in board.iter_hand(player):
+            score += self.piece_values[piece_name] * 0.8 * count
             
-        for piece in board.captured_pieces[3 - player]:
-            score -= self.piece_values[piece.name] * 0.8
+        for piece_name, count in board.iter_hand(3 - player):
+            score -= self.piece_values[piece_name] * 0.8 * count
             
         return score
         
@@ -1499,7 +1638,7 @@ class PositionEvaluator:
                 if piece and piece.player == player:
                     if piece.name in ["rook", "bishop"]:
                         try:
-                            moves = piece.get_possible_moves(board, (row, col))
+                            moves = board.get_piece_moves((row, col))
                             score += len(moves) * 3  # 移動可能マス数で評価
                         except:
                             continue
@@ -1548,42 +1687,44 @@ class PositionEvaluator:
         score = 0
         
         # 持ち駒の種類による評価
-        for piece in board.captured_pieces[player]:
-            if piece.name in ["rook", "bishop"]:
-                score += 50  # 大駒は終盤で威力を発揮
-            elif piece.name == "gold":
-                score += 30
-            elif piece.name in ["silver", "knight"]:
-                score += 20
+        for piece_name, count in board.iter_hand(player):
+            if piece_name in ["rook", "bishop"]:
+                score += 50 * count  # 大駒は終盤で威力を発揮
+            elif piece_name == "gold":
+                score += 30 * count
+            elif piece_name in ["silver", "knight"]:
+                score += 20 * count
             else:
-                score += 10
+                score += 10 * count
                 
         return score
         
     def _find_king_position(self, board, player):
         """王の位置を探す"""
-        for row in range(9):
-            for col in range(9):
-                piece = board.grid[row][col]
-                if piece and piece.name == "king" and piece.player == player:
-                    return (row, col)
-        return None
+        return board.find_king_position(player)
 
 
 class ShogiAI:
-    def __init__(self, board, game_mode="normal"):
+    def __init__(self, board, game_mode="normal", seed=None, deterministic=False, collect_stats=False,
+                 stats_callback=None):
         self.board = board
         self.game_mode = game_mode  # ゲームモードを保存
+        # 同じ評価値の手からの選択・特殊技の結果の抽出に使う乱数（省略時は対局のシードから作る）
+        self.rng = random.Random(f"{board.seed}:ai" if seed is None else seed)
+        # 決定的モードでは実時間の代わりに呼び出し回数で進む時計を使う（再実行で同じ手順になる）
+        self.clock = StepClock() if deterministic else time.time
         self.evaluator = PositionEvaluator()
-        self.searcher = MoveSearcher(self.evaluator)  # アルファベータ対応探索エンジン
+        self.searcher = MoveSearcher(self.evaluator, clock=self.clock, collect_stats=collect_stats,
+                                     stats_callback=stats_callback)  # アルファベータ対応探索エンジン
         self.opening_book = OpeningBook()  # 序盤定跡エンジン
         self.tactics_engine = TacticsEngine(self.evaluator)  # 戦術認識エンジン
-        self.endgame_engine = EndgameEngine(self.evaluator)  # 終盤特化エンジン
+        self.endgame_engine = EndgameEngine(self.evaluator, self.clock)  # 終盤特化エンジン
+        self.special_planner = SpecialMovePlanner(self.searcher, rng=self.rng)  # 特殊技のチャンスノード評価
         self.move_count = 0  # 手数カウンター
         
     def make_move(self):
         """AIの手を決定して実行する"""
-        start_time = time.time()
+        start_time = self.clock()
         max_time = 10.0  # 最大10秒
         
         # 全ての合法手を列挙
@@ -1605,7 +1746,7 @@ class ShogiAI:
                 return True
         
         # 時間制限チェック
-        elapsed_time = time.time() - start_time
+        elapsed_time = self.clock() - start_time
         remaining_time = max_time - elapsed_time
         
         if remaining_time <= 0.5:  # 残り時間が0.5秒以下の場合は即座に手を選択
@@ -1615,46 +1756,36 @@ class ShogiAI:
             # 定跡がない場合、またはendgameモードの場合は通常の評価
             print(f"残り時間: {remaining_time:.1f}秒で思考開始")
             best_move = self._evaluate_moves(possible_moves, remaining_time)
+            
+            # 未使用の特殊技の期待値が最善手を上回る場合は特殊技を使う
+            if not self.board.in_check:
+                special_move = self.special_planner.choose(self.board, self.board.player_turn, best_move,
+                                                           self.searcher.last_best_score)
+                if special_move is not None and self._execute_special_move(special_move):
+                    print(f"思考時間: {self.clock() - start_time:.2f}秒")
+                    return True
         
-        # 選んだ手を実行
-        self._execute_move(best_move)
+        # 選んだ手を実行（実行処理は辞書形式の手を使う）
+        self._execute_move(decode_move(self.board, best_move))
         
         # 思考時間を表示
-        total_time = time.time() - start_time
+        total_time = self.clock() - start_time
         print(f"思考時間: {total_time:.2f}秒")
         
         return True
         
-    def _get_all_possible_moves(self):
-        """全ての合法手を取得"""
-        possible_moves = []
+    def _execute_special_move(self, special_move):
+        """特殊技を実行する（手番の交代はエフェクト完了後にBoardが行う）"""
+        print(f"特殊技を使用: {special_move.name}")
+        self.board.special_move_active = special_move
+        if self.board.apply_special_move(special_move):
+            return True
+        self.board.special_move_active = None
+        return False
         
-        # 盤上の駒の移動
-        for row in range(9):
-            for col in range(9):
-                piece = self.board.grid[row][col]
-                if piece and piece.player == self.board.player_turn:
-                    moves = piece.get_possible_moves(self.board, (row, col))
-                    for move_row, move_col in moves:
-                        possible_moves.append({
-                            'type': 'move',
-                            'from': (row, col),
-                            'to': (move_row, move_col),
-                            'piece': piece
-                        })
-        
-        # 持ち駒の配置
-        for i, piece in enumerate(self.board.captured_pieces[self.board.player_turn]):
-            drop_positions = self.board.get_valid_drop_positions(piece)
-            for drop_row, drop_col in drop_positions:
-                possible_moves.append({
-                    'type': 'drop',
-                    'piece_index': i,
-                    'to': (drop_row, drop_col),
-                    'piece': piece
-                })
-        
-        return possible_moves
+    def _get_all_possible_moves(self):
+        """全ての合法手を整数の指し手の配列で取得"""
+        return generate_moves(self.board)
         
     def _evaluate_moves(self, possible_moves, time_limit=10.0):
         """手を評価して最良の手を選択（ミニマックス探索版）"""
@@ -1666,7 +1797,7 @@ class ShogiAI:
         best_moves = self.searcher.search_best_move(self.board, possible_moves, time_limit)
         
         # 同じスコアの手からランダム選択（既存と同じ）
-        return random.choice(best_moves)
+        return self.rng.choice(best_moves)
         
     def _evaluate_moves_fast(self, possible_moves):
         """王手時の高速評価（従来の方法）"""
@@ -1674,8 +1805,8 @@ class ShogiAI:
         best_score = float('-inf')
         
         for move in possible_moves:
-            # 従来の評価方法を使用
-            score = self._evaluate_move_advanced(move)
+            # 従来の評価方法を使用（評価関数は辞書形式の手を使う）
+            score = self._evaluate_move_advanced(decode_move(self.board, move))
             
             if score > best_score:
                 best_score = score
@@ -1683,7 +1814,7 @@ class ShogiAI:
             elif score == best_score:
                 best_moves.append(move)
                 
-        return random.choice(best_moves)
+        return self.rng.choice(best_moves)
         
     def _evaluate_move_advanced(self, move):
         """改良された手の評価"""
@@ -1797,71 +1928,35 @@ class ShogiAI:
             
             # 駒を移動
             piece = self.board.grid[from_row][from_col]
-            captured_piece = self.board.grid[to_row][to_col]
             
-            self.board.grid[from_row][from_col] = None
-            self.board.grid[to_row][to_col] = piece
+            self.board.set_piece(from_row, from_col, None)
+            self.board.set_piece(to_row, to_col, piece)
             
             # 駒を取った場合の処理（シミュレーションなので持ち駒リストは変更しない）
-            # 実際の処理では captured_pieces に追加するが、シミュレーションでは省略
+            # 実際の処理では持ち駒に追加するが、シミュレーションでは省略
                 
         elif move['type'] == 'drop':
-            piece_index = move['piece_index']
+            piece_name = move['piece'].name
             to_row, to_col = move['to']
             
-            # 持ち駒を参照のみ（リストから削除しない）
-            if piece_index < len(self.board.captured_pieces[self.board.player_turn]):
-                piece = self.board.captured_pieces[self.board.player_turn][piece_index]
-                self.board.grid[to_row][to_col] = piece
-                # 注意: 持ち駒リストからは削除しない（シミュレーションのため）
+            # 持ち駒は参照のみ（枚数は減らさない）
+            if self.board.hand_count(self.board.player_turn, piece_name) > 0:
+                self.board.set_piece(to_row, to_col, create_piece(piece_name, self.board.player_turn))
+                # 注意: 持ち駒の枚数は減らさない（シミュレーションのため）
             
     def _is_king_in_check(self, player):
         """指定プレイヤーの王が王手をかけられているかチェック"""
-        # 王の位置を探す
-        king_pos = self._find_king(player)
-        if not king_pos:
-            return False  # 王がいない場合は王手ではない
-            
-        king_row, king_col = king_pos
-        opponent = 3 - player
-        
-        # 相手の全ての駒から王が攻撃されているかチェック
-        for row in range(9):
-            for col in range(9):
-                piece = self.board.grid[row][col]
-                if piece and piece.player == opponent:
-                    try:
-                        # この駒が王を攻撃できるかチェック
-                        possible_moves = piece.get_possible_moves(self.board, (row, col))
-                        if (king_row, king_col) in possible_moves:
-                            return True
-                    except:
-                        # エラーが発生した場合は無視
-                        continue
-                        
-        return False
+        return self.board.is_in_check(player)
         
     def _save_board_state(self):
-        """盤面状態を保存（簡素化版）"""
-        # 盤面のみをコピー（持ち駒リストは変更しないので保存不要）
-        grid_copy = []
-        for row in self.board.grid:
-            row_copy = []
-            for piece in row:
-                row_copy.append(piece)  # 参照をそのままコピー
-            grid_copy.append(row_copy)
-        
-        state = {
-            'grid': grid_copy,
-            'player_turn': self.board.player_turn,
-            'in_check': self.board.in_check
-        }
+        """盤面状態を保存（派生状態キャッシュごと保存）"""
+        state = self.board.save_position()
+        state['in_check'] = self.board.in_check
         return state
         
     def _restore_board_state(self, state):
-        """盤面状態を復元（簡素化版）"""
-        self.board.grid = state['grid']
-        self.board.player_turn = state['player_turn']
+        """盤面状態を復元"""
+        self.board.restore_position(state)
         self.board.in_check = state['in_check']
         
     def _captures_checking_piece(self, move):
@@ -2019,18 +2114,11 @@ class ShogiAI:
         if move['type'] != 'move':
             return False
             
-        piece = move['piece']
-        to_row, to_col = move['to']
-        
-        # 既に成っている駒や成れない駒
-        if piece.is_promoted or piece.name in ["king", "gold"]:
-            return False
+        # 指し手生成で成る手・成らない手を区別している場合はそれに従う
+        if 'promote' in move:
+            return move['promote']
             
-        # 敵陣に入る場合
-        if (piece.player == 1 and to_row <= 2) or (piece.player == 2 and to_row >= 6):
-            return True
-            
-        return False
+        return can_promote(move['piece'], move['from'][0], move['to'][0])
         
     def _gives_check(self, move):
         """この手が王手をかけるかどうか（簡易判定）"""
@@ -2077,12 +2165,7 @@ class ShogiAI:
         
     def _find_king(self, player):
         """指定したプレイヤーの王の位置を探す"""
-        for row in range(9):
-            for col in range(9):
-                piece = self.board.grid[row][col]
-                if piece and piece.name == "king" and piece.player == player:
-                    return (row, col)
-        return None
+        return self.board.find_king_position(player)
         
     def _get_mate_score(self, move):
         """詰み判定による評価"""
@@ -2099,57 +2182,20 @@ class ShogiAI:
         return score
         
     def _leads_to_mate(self, move):
-        """この手が詰みに繋がるかどうかの簡易判定"""
-        # 相手の王を取る手は詰み
-        if move['type'] == 'move':
-            to_row, to_col = move['to']
-            target_piece = self.board.grid[to_row][to_col]
-            if target_piece and target_piece.name == 'king':
-                return True
-                
-        # 王手をかけて、相手に逃げ場がない状況を作る手
-        if self._gives_check(move):
-            # 簡易的に、相手の王の周囲を制圧する手を詰みと判定
-            opponent = 3 - self.board.player_turn
-            enemy_king_pos = self._find_king(opponent)
-            if enemy_king_pos:
-                king_row, king_col = enemy_king_pos
-                
-                # 王の周囲8マスのうち、逃げられるマスが少ない場合
-                escape_squares = self._count_king_escape_squares(king_row, king_col, opponent)
-                if escape_squares <= 1:
-                    return True
-                    
-        return False
+        """この手で相手が詰むかどうか（王を取る手も含む）"""
+        return is_mating_move(self.board, encode_move_dict(move))
         
     def _leads_to_mate_threat(self, move):
-        """この手が詰めろ（次に詰み）に繋がるかどうか"""
-        # 王手をかける手で、相手の逃げ場を制限する手
-        if self._gives_check(move):
-            opponent = 3 - self.board.player_turn
-            enemy_king_pos = self._find_king(opponent)
-            if enemy_king_pos:
-                king_row, king_col = enemy_king_pos
-                escape_squares = self._count_king_escape_squares(king_row, king_col, opponent)
-                if escape_squares <= 2:
-                    return True
-                    
-        return False
-        
-    def _count_king_escape_squares(self, king_row, king_col, player):
-        """王の逃げ場の数を数える"""
-        escape_count = 0
-        directions = [(-1,-1), (-1,0), (-1,1), (0,-1), (0,1), (1,-1), (1,0), (1,1)]
-        
-        for dr, dc in directions:
-            new_row, new_col = king_row + dr, king_col + dc
-            if 0 <= new_row < 9 and 0 <= new_col < 9:
-                piece = self.board.grid[new_row][new_col]
-                # 空きマスまたは相手の駒がある場合は逃げ場の候補
-                if piece is None or piece.player != player:
-                    escape_count += 1
-                    
-        return escape_count
+        """この手が詰めろ（次に詰み）になるかどうか"""
+        move_code = encode_move_dict(move)
+        player = self.board.player_turn
+        opponent = 3 - player
+        undo = self.board.make_move(move_code)
+        try:
+            return has_mate_threat(self.board, opponent)
+        finally:
+            self.board.player_turn = player
+            self.board.unmake_move(move_code, undo)
         
     def _get_lookahead_score(self, move):
         """先読み評価（2手先まで）"""
@@ -2241,23 +2287,7 @@ class ShogiAI:
         
     def _is_under_attack(self, row, col, player):
         """指定した位置が敵の攻撃範囲にあるかどうか"""
-        opponent = 3 - player
-        
-        # 相手の全ての駒から攻撃されるかチェック
-        for r in range(9):
-            for c in range(9):
-                piece = self.board.grid[r][c]
-                if piece and piece.player == opponent:
-                    # この駒が(row, col)を攻撃できるかチェック
-                    try:
-                        possible_moves = piece.get_possible_moves(self.board, (r, c))
-                        if (row, col) in possible_moves:
-                            return True
-                    except:
-                        # エラーが発生した場合は安全側に倒す
-                        continue
-                        
-        return False
+        return self.board.is_position_under_attack((row, col), 3 - player)
         
     def _is_isolated_position(self, row, col, player):
         """指定した位置が孤立しているかどうか"""
@@ -2343,7 +2373,11 @@ class ShogiAI:
             from_pos = move['from']
             to_pos = move['to']
             
-            should_promote = self._should_promote(move)
+            # 指し手生成で成るかどうかが決まっている場合はそれに従う
+            if 'promote' in move:
+                should_promote = move['promote']
+            else:
+                should_promote = self._should_promote(move)
             self.board.move_piece(from_pos, to_pos)
             
             if self.board.promotion_pending:
@@ -2352,24 +2386,9 @@ class ShogiAI:
         elif move['type'] == 'drop':
             to_pos = move['to']
             piece = move['piece']
-            self.board.drop_piece(piece, to_pos)
+            self.board.drop_piece(piece.name, to_pos)
             
     def _should_promote(self, move):
         """成るかどうかを判断する"""
-        piece = move['piece']
-        to_row, to_col = move['to']
-        
-        # 成れない駒は成らない
-        if piece.name in ["king", "gold"] or piece.is_promoted:
-            return False
-            
-        # 敵陣に入った場合
-        if (piece.player == 1 and to_row <= 2) or (piece.player == 2 and to_row >= 6):
-            # 歩、香、桂、銀は基本的に成る
-            if piece.name in ["pawn", "lance", "knight", "silver"]:
-                return True
-            # 角、飛車は状況に応じて（今回は常に成る）
-            elif piece.name in ["bishop", "rook"]:
-                return True
-                
-        return False
+        # 成れる場合は常に成る（歩、香、桂、銀、角、飛車）
+        return can_promote(move['piece'], move['from'][0], move['to'][0])
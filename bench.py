@@ -0,0 +1,293 @@
+"""
+AIの探索の速さを固定の局面集で測り、保存した基準値と比べて劣化を検出するベンチマーク
+
+序盤・中盤・setup_random_endgameの終盤・詰将棋の局面で、ShogiAIの探索（MoveSearcher）を
+決定的モード（StepClock）かつ深さ固定で実行する。局面ごとに深さ1からの各深さの探索時間、
+探索局面数、nodes/秒、詰み探索・必至探索のdf-pnの置換表のヒット率、ピークメモリ、選んだ手を記録して
+JSONに書き出す。探索局面数と選んだ手は実行環境によらず同じになる。
+あわせて、詰みの手数を総当たりで確かめた局面でdf-pnの詰み手順が正しいかを確かめる。
+
+使い方:
+    python bench.py                       # 測定して基準値（bench_baseline.json）と比べる
+    python bench.py --depth 2             # 深さ2まで
+    python bench.py --output result.json  # 測定結果をJSONに書き出す
+    python bench.py --save-baseline       # 測定結果を基準値として保存する
+    python bench.py --threshold 0.25      # 25%を超える悪化を劣化とみなす
+    python bench.py --repeat 5            # 各深さを5回探索して最短の時間を使う
+
+探索時間とnodes/秒は実行環境の揺れを受けるので、各深さを繰り返した最短の時間で比べ、
+一瞬で終わる局面のnodes/秒や小さな探索局面数は比べない。
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+from ai import ShogiAI
+from game_state import GameState
+from moves import generate_moves, move_from, move_to
+from perft import parse_sfen, to_sfen, move_to_usi, START_SFEN
+from tsume import DfPnSolver, check_moves, evasion_moves, king_positions
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+
+# 局面集（名前, 種類, SFENまたはsetup_random_endgameのシード）
+BENCH_POSITIONS = [
+    ("初期配置", "序盤", START_SFEN),
+    ("矢倉模様", "中盤", "ln1g3nl/1r1s1kgb1/p1pppp1pp/1p3sp2/9/2P1P4/PP1P1PPPP/1BS2S1R1/LN1GKG1NL b - 1"),
+    ("ランダム終盤1", "終盤", 1),
+    ("ランダム終盤2", "終盤", 2),
+    ("1手詰め", "詰将棋", "8k/6G2/7G1/9/4P4/9/9/9/K8 b P 1"),
+    # setup_random_endgameのシード39・106・62の局面（最大手数を増やしながら解いて確かめた最短の詰みの手数）
+    ("7手詰め", "詰将棋", "g3k4/9/9/2+pn5/9/5+R3/9/8L/4K4 b 2RLb 1"),
+    ("9手詰め", "詰将棋", "4k1l2/3+s5/9/6+s2/9/8N/2B2L3/9/B3KR1+r1 b RGLn 1"),
+    ("11手詰め", "詰将棋", "4kr2r/9/9/+r8/6+R2/1G7/6N2/R8/4K4 b RBSPp 1"),
+]
+
+# 詰み手順の正しさを確かめる局面（名前, SFEN, 詰み探索の最大手数, 総当たりで確かめた最短の詰みの手数）
+# df-pnは最短の詰みを見つけるとは限らないので、最大手数以内で詰み、最短の手数より短くないことを確かめる
+TSUME_CHECKS = [
+    ("7手詰め", "g3k4/9/9/2+pn5/9/5+R3/9/8L/4K4 b 2RLb 1", 7, 7),
+    ("9手詰め（11手まで）", "2s1k4/r8/l8/9/7+L1/2R2R3/7N1/1+R7/4K4 b Nbn 1", 11, 9),
+]
+TSUME_CHECK_NODES = 1000000  # 詰み手順の確認で展開する局面数の上限
+
+# 時間・メモリ・局面数の比較で無視する小さな基準値（測定誤差が大きいため）
+MIN_COMPARED_TIME = 0.1  # 秒（nodes/秒も、最大の深さの探索時間がこれ未満なら比べない）
+MIN_COMPARED_MEMORY = 64  # KB
+MIN_COMPARED_NODES = 1000  # 探索局面数（探索と詰み探索の合計）
+
+DEFAULT_REPEAT = 3  # 各深さの探索を繰り返す回数（最短の時間を使う）
+
+
+def make_position(spec):
+    """SFENまたはsetup_random_endgameのシードから局面を作る"""
+    if isinstance(spec, int):
+        state = GameState(seed=spec)
+        state.setup_random_endgame()
+        return state
+    return parse_sfen(spec)
+
+
+def run_search(state, depth, profiler=None):
+    """決定的モードのShogiAIで深さdepthの探索をし、(選んだ手, AI, 経過秒)を返す
+
+    profiler（eval_profile.EvalProfiler）を渡すと探索の間だけ評価項目を計測する。
+    """
+    ai = ShogiAI(state, seed=0, deterministic=True)
+    moves = generate_moves(state)
+    if profiler is not None:
+        profiler.attach(ai.searcher)
+    start = time.perf_counter()
+    try:
+        # 探索中の途中経過の表示は結果の表を読みにくくするので捨てる
+        with contextlib.redirect_stdout(io.StringIO()):
+            best_moves = ai.searcher.search_best_move(state, moves, time_limit=1e9, depth=depth)
+    finally:
+        if profiler is not None:
+            profiler.detach()
+    elapsed = time.perf_counter() - start
+    return ai.rng.choice(best_moves), ai, elapsed
+
+
+def bench_position(kind, spec, max_depth, measure_memory=True, repeat=DEFAULT_REPEAT):
+    """1つの局面を深さ1からmax_depthまで測定した結果の辞書を返す
+
+    各深さをrepeat回探索して最短の時間を使う（探索は決定的なので、ばらつきは実行環境の揺れだけ）。
+    """
+    state = make_position(spec)
+    result = {"kind": kind, "sfen": to_sfen(state), "time_to_depth": {}}
+    for depth in range(1, max_depth + 1):
+        elapsed = None
+        for _ in range(repeat):
+            move, ai, seconds = run_search(state, depth)
+            elapsed = seconds if elapsed is None else min(elapsed, seconds)
+        result["time_to_depth"][str(depth)] = round(elapsed, 4)
+
+    searcher = ai.searcher
+    endgame = searcher.endgame_engine
+    mate_nodes = endgame.mate_solver.nodes + endgame.hisshi_searcher.nodes
+    probes, hits = endgame.table_counts()
+    result["move"] = move_to_usi(move)
+    result["nodes"] = searcher.nodes
+    result["mate_nodes"] = mate_nodes
+    result["nps"] = round((searcher.nodes + mate_nodes) / max(elapsed, 1e-9))
+    result["tt_probes"] = probes
+    result["tt_hits"] = hits
+    result["tt_hit_rate"] = round(hits / probes, 4) if probes else None
+
+    # tracemallocは探索を遅くするので、時間とは別にもう一度探索して測る
+    result["peak_memory_kb"] = None
+    if measure_memory:
+        tracemalloc.start()
+        try:
+            run_search(state, max_depth)
+            result["peak_memory_kb"] = round(tracemalloc.get_traced_memory()[1] / 1024)
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def run_bench(max_depth, measure_memory=True, repeat=DEFAULT_REPEAT):
+    """局面集のすべての局面を測定した結果の辞書を返す"""
+    results = {
+        "depth": max_depth,
+        "repeat": repeat,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "positions": {},
+    }
+    for name, kind, spec in BENCH_POSITIONS:
+        result = bench_position(kind, spec, max_depth, measure_memory, repeat)
+        results["positions"][name] = result
+        memory = "-" if result["peak_memory_kb"] is None else f"{result['peak_memory_kb']}KB"
+        hit_rate = "-" if result["tt_hit_rate"] is None else f"{result['tt_hit_rate']:.1%}"
+        print(f"{name}（{kind}）: {result['move']} 局面数{result['nodes']}+{result['mate_nodes']} "
+              f"{result['nps']} nodes/秒 深さ{max_depth}まで{result['time_to_depth'][str(max_depth)]:.2f}秒 "
+              f"ヒット率{hit_rate} メモリ{memory}")
+    return results
+
+
+def _is_mate_sequence(state, sequence):
+    """sequenceが攻め方の王手と玉方の王手の回避を交互に指して、玉方に回避手がなくなる手順か"""
+    kings = king_positions(state)
+    played = []
+    try:
+        for ply, move in enumerate(sequence):
+            children = check_moves(state, kings) if ply % 2 == 0 else evasion_moves(state, kings)
+            if move not in [child[0] for child in children]:
+                return False
+            player = state.player_turn
+            if move_from(move) == kings[player]:
+                kings[player] = move_to(move)
+            played.append((move, state.make_move(move), player))
+            state.player_turn = 3 - player
+        return len(sequence) % 2 == 1 and not evasion_moves(state, kings)
+    finally:
+        for move, undo, player in reversed(played):
+            state.player_turn = player
+            state.unmake_move(move, undo)
+
+
+def check_tsume():
+    """TSUME_CHECKSの局面をDfPnSolverで解き、正しくなかった結果の説明のリストを返す"""
+    errors = []
+    for name, sfen, max_ply, shortest in TSUME_CHECKS:
+        state = parse_sfen(sfen)
+        solver = DfPnSolver(max_nodes=TSUME_CHECK_NODES, time_limit=1e9, max_ply=max_ply)
+        sequence = solver.solve(state)
+        if sequence is None:
+            reason = "制限に達した" if solver.aborted else "詰みを見つけられない"
+            errors.append(f"{name}: {max_ply}手以内の詰みがあるのに{reason}")
+        elif not _is_mate_sequence(state, sequence):
+            errors.append(f"{name}: 詰みで終わらない手順 {' '.join(map(move_to_usi, sequence))}")
+        elif not shortest <= len(sequence) <= solver.mate_length <= max_ply:
+            errors.append(f"{name}: 詰みの手数{solver.mate_length}（手順{len(sequence)}手）が"
+                          f"最短の{shortest}手から最大の{max_ply}手の範囲にない")
+    return errors
+
+
+def _worse(current, baseline, threshold, higher_is_better=False):
+    """currentがbaselineよりthresholdの割合を超えて悪いかどうか"""
+    if current is None or baseline is None:
+        return False
+    if higher_is_better:
+        return current < baseline * (1 - threshold)
+    return current > baseline * (1 + threshold)
+
+
+def compare_results(results, baseline, threshold):
+    """基準値と比べて、(劣化のリスト, 参考情報のリスト)を返す"""
+    regressions = []
+    notes = []
+    same_depth = results["depth"] == baseline.get("depth")
+    if not same_depth:
+        notes.append(f"基準値の深さ{baseline.get('depth')}と測定の深さ{results['depth']}が違うため各深さの時間だけ比べる")
+    for name, current in results["positions"].items():
+        base = baseline.get("positions", {}).get(name)
+        if base is None:
+            notes.append(f"{name}: 基準値なし")
+            continue
+        if current["sfen"] != base["sfen"]:
+            notes.append(f"{name}: 局面が基準値と違うため比較しない")
+            continue
+        for depth, seconds in current["time_to_depth"].items():
+            base_seconds = base["time_to_depth"].get(depth)
+            if base_seconds is not None and base_seconds >= MIN_COMPARED_TIME \
+                    and _worse(seconds, base_seconds, threshold):
+                regressions.append(f"{name}: 深さ{depth}の探索時間 {base_seconds:.2f}秒 -> {seconds:.2f}秒")
+        if not same_depth:
+            continue
+        # 探索が一瞬で終わる局面のnodes/秒は時計の誤差なので比べない
+        depth = str(results["depth"])
+        seconds = current["time_to_depth"].get(depth)
+        base_seconds = base["time_to_depth"].get(depth)
+        if seconds is not None and base_seconds is not None and \
+                min(seconds, base_seconds) >= MIN_COMPARED_TIME and \
+                _worse(current["nps"], base["nps"], threshold, higher_is_better=True):
+            regressions.append(f"{name}: nodes/秒 {base['nps']} -> {current['nps']}")
+        if base["nodes"] + base["mate_nodes"] >= MIN_COMPARED_NODES and \
+                _worse(current["nodes"], base["nodes"], threshold):
+            regressions.append(f"{name}: 探索局面数 {base['nodes']} -> {current['nodes']}")
+        base_memory = base.get("peak_memory_kb")
+        if base_memory is not None and base_memory >= MIN_COMPARED_MEMORY \
+                and _worse(current["peak_memory_kb"], base_memory, threshold):
+            regressions.append(f"{name}: ピークメモリ {base_memory}KB -> {current['peak_memory_kb']}KB")
+        if current["move"] != base["move"]:
+            notes.append(f"{name}: 選んだ手が {base['move']} -> {current['move']} に変わった")
+    return regressions, notes
+
+
+def _write_json(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AIの探索のベンチマークを測定し、基準値と比べる")
+    parser.add_argument("--depth", type=int, default=3, help="測定する最大の探索深度")
+    parser.add_argument("--output", help="測定結果を書き出すJSONファイル")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="比べる基準値のJSONファイル")
+    parser.add_argument("--threshold", type=float, default=0.15, help="劣化とみなす悪化の割合")
+    parser.add_argument("--save-baseline", action="store_true", help="測定結果を基準値として保存する")
+    parser.add_argument("--no-memory", action="store_true", help="ピークメモリを測らない（測定が速くなる）")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="各深さの探索を繰り返す回数（最短の時間を使う）")
+    args = parser.parse_args(argv)
+
+    tsume_errors = check_tsume()
+    for error in tsume_errors:
+        print(f"詰み探索の誤り: {error}")
+    print(f"詰み探索の確認: {len(TSUME_CHECKS)}局面中 誤り{len(tsume_errors)}件")
+
+    results = run_bench(args.depth, measure_memory=not args.no_memory, repeat=args.repeat)
+    if args.output:
+        _write_json(args.output, results)
+        print(f"測定結果を保存: {args.output}")
+
+    if args.save_baseline:
+        _write_json(args.baseline, results)
+        print(f"基準値を保存: {args.baseline}")
+        return 1 if tsume_errors else 0
+
+    if not os.path.exists(args.baseline):
+        print(f"基準値がありません: {args.baseline}（--save-baseline で作成）")
+        return 1 if tsume_errors else 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions, notes = compare_results(results, baseline, args.threshold)
+    for note in notes:
+        print(f"参考: {note}")
+    for regression in regressions:
+        print(f"劣化: {regression}")
+    print(f"基準値との比較: 劣化{len(regressions)}件（しきい値 {args.threshold:.0%}）")
+    return 1 if regressions or tsume_errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""
+評価関数の項目ごとのプロファイラ
+
+PositionEvaluatorの各評価項目、TacticsEngineの7つの戦術検出、EndgameEngineの終盤評価について、
+呼び出し回数・累計時間・評価値への平均の寄与を記録する。MoveSearcherの評価器のメソッドを
+インスタンス属性で置き換えて計測するので、プロファイラを付けていない探索には影響しない。
+
+使い方:
+    python eval_profile.py                         # ベンチマークの局面集を深さ3で探索して集計
+    python eval_profile.py --sfen "<SFEN>" --depth 2
+    python eval_profile.py --sort mean_abs         # 平均の寄与の大きい順に表示
+    python eval_profile.py --json profile.json     # 集計をJSONに書き出す
+
+累計時間は内側の項目の時間を含む（例: evaluate_endgame_positionは_is_near_mateの時間を含む）。
+"""
+import argparse
+import json
+import sys
+import time
+
+# 計測する項目（searcherからの属性のたどり方, メソッド名, 寄与の計算）
+# 寄与の計算は、数値を返す項目は評価値にかかる重み、真偽を返す戦術検出は戦術ボーナスの名前、
+# 評価値に直接足されない項目はNone
+PROFILED_TERMS = [
+    ("evaluator", "_determine_game_phase", None),
+    ("evaluator", "_evaluate_material_and_position", 1.0),
+    ("evaluator", "_evaluate_piece_development_simple", 0.3),
+    ("evaluator", "_evaluate_center_control", 0.3),
+    ("evaluator", "_evaluate_king_safety_opening", 0.3),
+    ("evaluator", "_evaluate_attack_potential", 0.2),
+    ("evaluator", "_evaluate_piece_coordination", 0.2),
+    ("evaluator", "_evaluate_king_activity", 0.2),
+    ("evaluator", "_evaluate_captured_pieces_activity", 0.2),
+    ("tactics_engine", "_detect_fork", "fork"),
+    ("tactics_engine", "_detect_pin", "pin"),
+    ("tactics_engine", "_detect_skewer", "skewer"),
+    ("tactics_engine", "_detect_discovered_attack", "discovered_attack"),
+    ("tactics_engine", "_detect_double_attack", "double_attack"),
+    ("tactics_engine", "_detect_sacrifice_pattern", "sacrifice"),
+    ("tactics_engine", "_detect_promotion_threat", "promotion_threat"),
+    ("endgame_engine", "evaluate_endgame_position", 0.3),
+    ("endgame_engine", "_is_near_mate", None),
+    ("endgame_engine", "_evaluate_king_safety_endgame", 0.3),
+    ("endgame_engine", "_evaluate_captured_pieces_endgame", 0.3),
+]
+
+SORT_KEYS = ("time", "calls", "us_per_call", "mean_abs", "value_per_us")
+
+
+class TermStats:
+    """1つの評価項目の集計"""
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.time = 0.0  # 累計秒
+        self.contribution = 0.0  # 評価値への寄与の合計
+        self.abs_contribution = 0.0  # 寄与の絶対値の合計
+        self.scored = False  # 評価値に寄与する項目かどうか
+
+    def as_dict(self):
+        calls = self.calls or 1
+        us_per_call = self.time / calls * 1e6
+        mean_abs = self.abs_contribution / calls if self.scored else None
+        return {
+            "term": self.name,
+            "calls": self.calls,
+            "time": round(self.time, 4),
+            "us_per_call": round(us_per_call, 2),
+            "mean": round(self.contribution / calls, 2) if self.scored else None,
+            "mean_abs": None if mean_abs is None else round(mean_abs, 2),
+            # 1マイクロ秒あたりの寄与（費用に見合うかの目安）
+            "value_per_us": None if mean_abs is None else round(mean_abs / max(us_per_call, 1e-9), 3),
+        }
+
+
+class EvalProfiler:
+    """MoveSearcherの評価項目を計測するプロファイラ（attachからdetachまで計測する）"""
+
+    def __init__(self):
+        self.terms = {}  # 項目名 -> TermStats
+        self._attached = []  # (置き換えたオブジェクト, メソッド名)
+
+    def attach(self, searcher):
+        """searcherの評価器・戦術認識・終盤評価のメソッドを計測付きに置き換える"""
+        for owner_name, method_name, weight in PROFILED_TERMS:
+            owner = getattr(searcher, owner_name)
+            if method_name in vars(owner):
+                continue  # すでに計測中
+            if isinstance(weight, str):
+                weight = owner.tactical_bonuses[weight]
+            stats = self.terms.get(method_name)
+            if stats is None:
+                stats = self.terms[method_name] = TermStats(method_name)
+            stats.scored = weight is not None
+            setattr(owner, method_name, self._wrap(getattr(owner, method_name), stats, weight))
+            self._attached.append((owner, method_name))
+        return self
+
+    def detach(self):
+        """置き換えたメソッドを元に戻す"""
+        for owner, method_name in self._attached:
+            delattr(owner, method_name)
+        self._attached = []
+
+    @staticmethod
+    def _wrap(method, stats, weight):
+        perf_counter = time.perf_counter
+
+        def profiled(*args):
+            start = perf_counter()
+            result = method(*args)
+            stats.time += perf_counter() - start
+            stats.calls += 1
+            if weight is not None:
+                value = result * weight  # 真偽を返す戦術検出はボーナス×0/1になる
+                stats.contribution += value
+                stats.abs_contribution += abs(value)
+            return result
+        return profiled
+
+    def rows(self, sort="time"):
+        """集計の辞書のリストをsortの大きい順に返す"""
+        rows = [stats.as_dict() for stats in self.terms.values() if stats.calls]
+        rows.sort(key=lambda row: -1 if row[sort] is None else row[sort], reverse=True)
+        return rows
+
+    def table(self, sort="time"):
+        """集計の表（文字列）を返す"""
+        lines = [f"{'項目':<36}{'回数':>9}{'累計秒':>9}{'µs/回':>9}{'平均寄与':>10}{'平均|寄与|':>11}{'寄与/µs':>9}"]
+        for row in self.rows(sort):
+            mean = "-" if row["mean"] is None else f"{row['mean']:.1f}"
+            mean_abs = "-" if row["mean_abs"] is None else f"{row['mean_abs']:.1f}"
+            value = "-" if row["value_per_us"] is None else f"{row['value_per_us']:.3f}"
+            lines.append(f"{row['term']:<36}{row['calls']:>9}{row['time']:>9.3f}{row['us_per_call']:>9.1f}"
+                         f"{mean:>10}{mean_abs:>11}{value:>9}")
+        return "\n".join(lines)
+
+
+def main(argv=None):
+    import bench
+
+    parser = argparse.ArgumentParser(description="評価関数の項目ごとの費用と寄与を測る")
+    parser.add_argument("--depth", type=int, default=3, help="探索深度")
+    parser.add_argument("--sfen", help="探索する局面のSFEN（省略時はベンチマークの局面集）")
+    parser.add_argument("--sort", choices=SORT_KEYS, default="time", help="表の並べ替えの基準")
+    parser.add_argument("--json", help="集計を書き出すJSONファイル")
+    args = parser.parse_args(argv)
+
+    specs = [args.sfen] if args.sfen else [spec for name, kind, spec in bench.BENCH_POSITIONS]
+    profiler = EvalProfiler()
+    start = time.perf_counter()
+    nodes = 0
+    for spec in specs:
+        move, ai, elapsed = bench.run_search(bench.make_position(spec), args.depth, profiler)
+        nodes += ai.searcher.nodes
+    elapsed = time.perf_counter() - start
+
+    print(profiler.table(args.sort))
+    print(f"局面数{nodes} {elapsed:.2f}秒（計測による遅れを含む）")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"depth": args.depth, "nodes": nodes, "terms": profiler.rows(args.sort)},
+                      f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"集計を保存: {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
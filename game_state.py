@@ -0,0 +1,993 @@
+"""
+対局の状態とルールを扱うモジュール（pygameに依存しない）
+
+盤面・持ち駒・手番・手数・特殊技の使用状態・勝敗を持つGameStateと、
+盤面のビットマスク・局面のハッシュ（Zobrist）の定数を定義する。
+描画・音声・マウス操作はGameStateを継承したboard.Boardが担当するので、
+AI・詰み探索などのエンジンは画面のない環境やワーカープロセスでもこのモジュールだけで動く。
+"""
+import heapq
+import random
+
+from pieces import Piece, Effect, HAND_PIECE_TYPES, HAND_INDEX, create_piece
+from special_moves import SpecialMoveState, SPECIAL_MOVE_INDEX
+from moves import SQUARES, is_drop, is_promotion, move_to, move_from, drop_piece_name, can_promote, must_promote
+
+# --- 盤面のビットマスク（マス (row, col) をビット row * 9 + col で表す） ---
+FULL_BOARD_MASK = (1 << 81) - 1
+FILE_MASKS = [sum(1 << (row * 9 + col) for row in range(9)) for col in range(9)]
+RANK_MASKS = [((1 << 9) - 1) << (row * 9) for row in range(9)]
+
+def _ranks_mask(rows):
+    """指定した段すべてのマスのビットマスク"""
+    mask = 0
+    for row in rows:
+        mask |= RANK_MASKS[row]
+    return mask
+
+# 打てる段のマスク（先手は下方向、後手は上方向に進む）
+DROP_RANK_MASKS = {
+    ("pawn", 1): _ranks_mask(range(0, 8)),
+    ("lance", 1): _ranks_mask(range(0, 8)),
+    ("knight", 1): _ranks_mask(range(0, 7)),
+    ("pawn", 2): _ranks_mask(range(1, 9)),
+    ("lance", 2): _ranks_mask(range(1, 9)),
+    ("knight", 2): _ranks_mask(range(2, 9)),
+}
+
+# 歩のある筋の9ビットマスク -> 二歩にならないマスのビットマスク
+NIFU_FREE_MASKS = [
+    FULL_BOARD_MASK & ~sum(FILE_MASKS[col] for col in range(9) if files >> col & 1)
+    for files in range(1 << 9)
+]
+
+# --- 局面のハッシュ（Zobrist）。手番は含めない ---
+_zobrist_rng = random.Random(20250117)  # 実行ごとに同じ値になるよう固定シード
+ZOBRIST_PIECES = {
+    (name, player, promoted): [_zobrist_rng.getrandbits(64) for _ in range(81)]
+    for name in HAND_PIECE_TYPES + ["king"]
+    for player in (1, 2)
+    for promoted in (False, True)
+}
+ZOBRIST_HANDS = {
+    player: [[_zobrist_rng.getrandbits(64) for _ in range(39)] for _ in HAND_PIECE_TYPES]
+    for player in (1, 2)
+}
+ZOBRIST_SPECIAL_MOVES = {
+    player: [_zobrist_rng.getrandbits(64) for _ in SPECIAL_MOVE_INDEX]
+    for player in (1, 2)
+}
+
+_zobrist_effects = {}  # (効果名, 値) -> マスごとのハッシュ値（効果の種類が増えても使えるよう必要になったら作る）
+
+def _effect_keys(name, value):
+    """駒の特殊効果のマスごとのハッシュ値"""
+    keys = _zobrist_effects.get((name, value))
+    if keys is None:
+        effect_rng = random.Random(f"effect:{name}:{value}")  # 実行ごとに同じ値になるよう効果から決まるシード
+        keys = [effect_rng.getrandbits(64) for _ in range(81)]
+        _zobrist_effects[(name, value)] = keys
+    return keys
+
+def _piece_key(piece, row, col):
+    """盤上の駒のハッシュ値（特殊効果を含む）"""
+    square = row * 9 + col
+    key = ZOBRIST_PIECES[(piece.name, piece.player, piece.is_promoted)][square]
+    if piece.effects:
+        for effect in piece.effects.values():
+            key ^= _effect_keys(effect.name, effect.value)[square]
+    return key
+
+def _is_unpromoted_pawn(piece):
+    """二歩の対象になる駒（成っていない歩）かどうか"""
+    return piece is not None and piece.name == "pawn" and not piece.is_promoted
+
+class DerivedStateCache:
+    """盤面から導出される状態（王手・詰み・移動可能マス・打てるマス）のキャッシュ
+
+    GameState.state_version と一致している間だけ有効。盤面や持ち駒が変更されると
+    state_version が進み、次の参照時に新しいキャッシュに置き換えられる。
+    """
+    def __init__(self, version):
+        self.version = version
+        self.kings = {}      # プレイヤー -> 王の位置
+        self.check = {}      # プレイヤー -> 王手状態かどうか
+        self.checkmate = {}  # プレイヤー -> 詰み状態かどうか
+        self.moves = {}      # マス -> その駒の移動可能なマス
+        self.attacks = {}    # プレイヤー -> 利いているマスの集合
+        self.drops = {}      # (駒の種類, プレイヤー) -> 打てるマス
+
+def restore_game_state(state):
+    """pickleした状態からGameStateを復元する（BoardもGameStateとして復元される）"""
+    game_state = GameState.__new__(GameState)
+    game_state.__dict__.update(state)
+    return game_state
+
+class GameState:
+    """対局の状態とルール（盤面・持ち駒・手番・手数・特殊技の使用状態・勝敗）
+
+    描画・音声は持たず、駒の移動・打ち・成り・王手と詰みの判定などのルールをすべて扱う。
+    Boardは描画・音声・操作のフック（_on_で始まるメソッド）を上書きする。
+    """
+    def __init__(self, seed=None, event_manager=None):
+        self.event_manager = event_manager  # 特殊技のイベントの通知先（Noneなら通知しない）
+        
+        # 対局ごとの乱数（終盤モードの初期配置・特殊技の効果）。シードを棋譜に記録して再現できるようにする
+        if seed is None:
+            seed = random.randrange(1 << 32)
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.game_record = {'seed': seed, 'mode': 'normal', 'moves': []}  # 棋譜
+        self.grid = [[None for _ in range(9)] for _ in range(9)]
+        self.state_version = 0  # 盤面・持ち駒が変更されるたびに増える
+        self._derived = DerivedStateCache(self.state_version)
+        self.occupied = 0  # 駒があるマスのビットマスク
+        self.pawn_files = {1: 0, 2: 0}  # 成っていない歩がある筋の9ビットマスク
+        self._pawn_file_counts = {1: [0] * 9, 2: [0] * 9}  # 筋ごとの成っていない歩の枚数
+        self.zobrist_key = 0  # 盤面と持ち駒のハッシュ値（refresh_positionで初期化）
+        self.player_turn = 1  # 1: 先手, 2: 後手
+        self.current_player = 1  # 現在のプレイヤー（特殊技用）
+        self.hands = {1: [0] * len(HAND_PIECE_TYPES), 2: [0] * len(HAND_PIECE_TYPES)}  # 持ち駒（駒の種類ごとの枚数）
+        self._hand_pieces = {}  # 持ち駒の表示・選択用の駒（駒の種類, プレイヤー） -> Piece
+        self.in_check = False  # 王手状態かどうか
+        self.checkmate = False  # 詰み状態かどうか
+        self.game_over = False  # ゲーム終了状態
+        self.winner = None     # 勝者（1: 先手, 2: 後手）
+        self.promotion_pending = False  # 成り判定中かどうか
+        self.pending_move = None  # 成り判定中の移動情報
+        self.special_move_active = None  # 現在選択中の特殊技
+        self.turn_count = 1  # 現在のターン数
+        self.move_count = 0  # 手数カウンター（2手で1ターン）
+        self.effect_expiries = []  # (切れるターン, 通し番号, 駒, Effect) の最小ヒープ
+        self._effect_sequence = 0  # 同じターンに切れる効果を適用順に並べるための通し番号
+        self.special_state = SpecialMoveState()  # プレイヤーごとの特殊技の使用状態
+        
+        self.setup_board()
+        
+    # --- 描画・音声を担当するBoardが上書きするフック ---
+    def _on_piece_moved(self):
+        """駒を動かした・打った後に呼ばれる（効果音用）"""
+        
+    def _on_game_over(self):
+        """勝敗が決まった後に呼ばれる（BGM・終局の演出用）"""
+        
+    def _on_special_move_applied(self):
+        """特殊技の効果を反映した後に呼ばれる（画面がなければすぐに手番を交代する）"""
+        self.end_turn()
+        
+    def _finish_game(self, winner):
+        """勝敗を決めて対局を終える"""
+        self.game_over = True
+        self.winner = winner
+        self._on_game_over()
+        
+    def __getstate__(self):
+        """pickle用の状態（派生状態キャッシュとイベントの通知先は除く）"""
+        state = self.__dict__.copy()
+        state['event_manager'] = None
+        state['_derived'] = DerivedStateCache(self.state_version)
+        return state
+        
+    def is_computer_player(self, player):
+        """指定したプレイヤーがコンピュータかどうかを判定"""
+        # 先手（player=1）がコンピュータ
+        return player == 1
+        
+    def setup_board(self):
+        # 駒の初期配置
+        # 歩兵
+        for i in range(9):
+            self.grid[2][i] = Piece("pawn", "歩", player=1)
+            self.grid[6][i] = Piece("pawn", "歩", player=2)
+        
+        # 香車
+        self.grid[0][0] = Piece("lance", "香", player=1)
+        self.grid[0][8] = Piece("lance", "香", player=1)
+        self.grid[8][0] = Piece("lance", "香", player=2)
+        self.grid[8][8] = Piece("lance", "香", player=2)
+        
+        # 桂馬
+        self.grid[0][1] = Piece("knight", "桂", player=1)
+        self.grid[0][7] = Piece("knight", "桂", player=1)
+        self.grid[8][1] = Piece("knight", "桂", player=2)
+        self.grid[8][7] = Piece("knight", "桂", player=2)
+        
+        # 銀将
+        self.grid[0][2] = Piece("silver", "銀", player=1)
+        self.grid[0][6] = Piece("silver", "銀", player=1)
+        self.grid[8][2] = Piece("silver", "銀", player=2)
+        self.grid[8][6] = Piece("silver", "銀", player=2)
+        
+        # 金将
+        self.grid[0][3] = Piece("gold", "金", player=1)
+        self.grid[0][5] = Piece("gold", "金", player=1)
+        self.grid[8][3] = Piece("gold", "金", player=2)
+        self.grid[8][5] = Piece("gold", "金", player=2)
+        
+        # 王将・玉将
+        self.grid[0][4] = Piece("king", "王", player=1)
+        self.grid[8][4] = Piece("king", "玉", player=2)
+        
+        # 飛車
+        self.grid[1][1] = Piece("rook", "飛", player=1)
+        self.grid[7][7] = Piece("rook", "飛", player=2)
+        
+        # 角行
+        self.grid[1][7] = Piece("bishop", "角", player=1)
+        self.grid[7][1] = Piece("bishop", "角", player=2)
+        
+        self.refresh_position()
+        
+    def setup_random_endgame(self):
+        """ランダムな終盤状態を生成する（対局の乱数を使うので、同じシードなら同じ配置になる）"""
+        rng = self.rng
+        self.game_record['mode'] = 'endgame'
+        
+        # 盤面をクリア
+        self.grid = [[None for _ in range(9)] for _ in range(9)]
+        
+        # 両者の王/玉は必ず配置
+        self.grid[0][4] = Piece("king", "王", player=1)  # 先手の王
+        self.grid[8][4] = Piece("king", "玉", player=2)  # 後手の玉
+        
+        # 残りの駒をランダムに配置（少数）
+        remaining_pieces = [
+            ("gold", "金"), ("silver", "銀"), ("rook", "飛"), 
+            ("bishop", "角"), ("pawn", "歩"), ("lance", "香"),
+            ("knight", "桂")
+        ]
+        
+        # 成り駒も含める
+        promoted_pieces = [
+            ("rook", "飛", True), ("bishop", "角", True),
+            ("silver", "銀", True), ("pawn", "歩", True),
+            ("lance", "香", True), ("knight", "桂", True)
+        ]
+        
+        # 先手の駒を3-5個ランダムに配置
+        num_pieces = rng.randint(3, 5)
+        for _ in range(num_pieces):
+            # 通常の駒か成り駒かをランダムに決定
+            if rng.random() < 0.3:  # 30%の確率で成り駒
+                piece_type, kanji, promoted = rng.choice(promoted_pieces)
+                row = rng.randint(0, 8)  # 成り駒は盤上のどこにでも配置可能
+            else:
+                piece_type, kanji = rng.choice(remaining_pieces)
+                promoted = False
+                row = rng.randint(0, 3)  # 通常の駒は自陣側に配置
+                
+            col = rng.randint(0, 8)
+            # 既に駒がある場合や王/玉の位置は避ける
+            if self.grid[row][col] is None and not (row == 0 and col == 4) and not (row == 8 and col == 4):
+                self.grid[row][col] = Piece(piece_type, kanji, is_promoted=promoted, player=1)
+        
+        # 後手の駒を2-4個ランダムに配置
+        num_pieces = rng.randint(2, 4)
+        for _ in range(num_pieces):
+            # 通常の駒か成り駒かをランダムに決定
+            if rng.random() < 0.3:  # 30%の確率で成り駒
+                piece_type, kanji, promoted = rng.choice(promoted_pieces)
+                row = rng.randint(0, 8)  # 成り駒は盤上のどこにでも配置可能
+            else:
+                piece_type, kanji = rng.choice(remaining_pieces)
+                promoted = False
+                row = rng.randint(5, 8)  # 通常の駒は自陣側に配置
+                
+            col = rng.randint(0, 8)
+            # 既に駒がある場合や王/玉の位置は避ける
+            if self.grid[row][col] is None and not (row == 0 and col == 4) and not (row == 8 and col == 4):
+                self.grid[row][col] = Piece(piece_type, kanji, is_promoted=promoted, player=2)
+        
+        # 持ち駒もランダムに設定
+        self.hands = {1: [0] * len(HAND_PIECE_TYPES), 2: [0] * len(HAND_PIECE_TYPES)}
+        for player in [1, 2]:
+            num_captured = rng.randint(1, 3)
+            for _ in range(num_captured):
+                piece_type, kanji = rng.choice(remaining_pieces)
+                self.hands[player][HAND_INDEX[piece_type]] += 1
+        
+        self.refresh_position()
+        
+        # 王手状態のチェックと修正
+        for player in [1, 2]:
+            # 王手状態かチェック
+            if self.is_in_check(player):
+                # 王手をかけている駒を特定
+                attacking_pieces = self.find_attacking_pieces(player)
+                
+                for piece_pos in attacking_pieces:
+                    # 駒を取り除く
+                    row, col = piece_pos
+                    piece = self.grid[row][col]
+                    self.set_piece(row, col, None)
+                    
+                    # 持ち駒に追加
+                    opponent = 3 - player
+                    self.add_to_hand(opponent, piece.name)
+                    
+                    # 再度王手チェック
+                    if not self.is_in_check(player):
+                        break  # 王手が解消されたら終了
+        
+    # --- 盤面の変更（派生状態キャッシュの無効化を伴う） ---
+    def refresh_position(self):
+        """盤面を一括で書き換えた後に呼び出し、派生状態とビットマスクを作り直す"""
+        self.occupied = 0
+        self.pawn_files = {1: 0, 2: 0}
+        self._pawn_file_counts = {1: [0] * 9, 2: [0] * 9}
+        key = 0
+        for row in range(9):
+            for col in range(9):
+                piece = self.grid[row][col]
+                if piece:
+                    self.occupied |= 1 << (row * 9 + col)
+                    key ^= _piece_key(piece, row, col)
+                    if _is_unpromoted_pawn(piece):
+                        self._add_pawn_on_file(piece.player, col)
+        for player in (1, 2):
+            for i, count in enumerate(self.hands[player]):
+                key ^= ZOBRIST_HANDS[player][i][count]
+            for move_name, i in SPECIAL_MOVE_INDEX.items():
+                if self.special_state.is_used(player, move_name):
+                    key ^= ZOBRIST_SPECIAL_MOVES[player][i]
+        self.zobrist_key = key
+        self.state_version += 1
+        
+    def _add_pawn_on_file(self, player, col):
+        """筋の歩の枚数を1増やす"""
+        self._pawn_file_counts[player][col] += 1
+        self.pawn_files[player] |= 1 << col
+        
+    def _remove_pawn_on_file(self, player, col):
+        """筋の歩の枚数を1減らす"""
+        counts = self._pawn_file_counts[player]
+        counts[col] -= 1
+        if counts[col] == 0:
+            self.pawn_files[player] &= ~(1 << col)
+        
+    def set_piece(self, row, col, piece):
+        """マスに駒を置く（Noneで駒を取り除く）"""
+        old_piece = self.grid[row][col]
+        if old_piece is not None:
+            self.zobrist_key ^= _piece_key(old_piece, row, col)
+            if _is_unpromoted_pawn(old_piece):
+                self._remove_pawn_on_file(old_piece.player, col)
+        self.grid[row][col] = piece
+        if piece is None:
+            self.occupied &= ~(1 << (row * 9 + col))
+        else:
+            self.occupied |= 1 << (row * 9 + col)
+            self.zobrist_key ^= _piece_key(piece, row, col)
+            if _is_unpromoted_pawn(piece):
+                self._add_pawn_on_file(piece.player, col)
+        self.state_version += 1
+        
+    def set_promoted(self, row, col, promoted):
+        """盤上の駒の成り状態を変更する"""
+        piece = self.grid[row][col]
+        if piece.name == "pawn" and piece.is_promoted != promoted:
+            if promoted:
+                self._remove_pawn_on_file(piece.player, col)
+            else:
+                self._add_pawn_on_file(piece.player, col)
+        self.zobrist_key ^= _piece_key(piece, row, col)
+        piece.is_promoted = promoted
+        self.zobrist_key ^= _piece_key(piece, row, col)
+        self.state_version += 1
+        
+    def apply_delta(self, delta):
+        """特殊技などの効果の差分を盤面に反映する
+
+        set_piece・set_promoted・add_to_hand・remove_from_handを通すので、
+        ハッシュ値・ビットマスク・派生状態キャッシュもすべて更新される。
+        """
+        for change in delta:
+            self._apply_change(change, False)
+        
+    def undo_delta(self, delta):
+        """apply_deltaで反映した差分を元に戻す"""
+        for change in reversed(delta):
+            self._apply_change(change, True)
+        
+    def _apply_change(self, change, reverse):
+        """差分の1項目を反映する（reverseなら変更前の状態に戻す）"""
+        kind = change[0]
+        if kind == "square":
+            (row, col), before, after = change[1:]
+            self.set_piece(row, col, before if reverse else after)
+        elif kind == "promote":
+            (row, col), before, after = change[1:]
+            self.set_promoted(row, col, before if reverse else after)
+        elif kind == "hand":
+            player, piece_name, count = change[1:]
+            if reverse:
+                count = -count
+            for _ in range(count):
+                self.add_to_hand(player, piece_name)
+            for _ in range(-count):
+                self.remove_from_hand(player, piece_name)
+        else:
+            raise ValueError(f"不明な差分の種類: {kind}")
+        
+    # --- 駒の特殊効果（局面のハッシュ値と期限切れキューを更新する） ---
+    def apply_effect(self, row, col, name, value=True, duration=None):
+        """盤上の駒に特殊効果をかける（durationターン後に切れる。Noneなら切れない）"""
+        piece = self.grid[row][col]
+        expires = None if duration is None else self.turn_count + duration
+        effect = Effect(name, value, expires)
+        self.zobrist_key ^= _piece_key(piece, row, col)
+        piece.apply_effect(effect)
+        self.zobrist_key ^= _piece_key(piece, row, col)
+        self.state_version += 1
+        if expires is not None:
+            heapq.heappush(self.effect_expiries, (expires, self._effect_sequence, piece, effect))
+            self._effect_sequence += 1
+        return effect
+        
+    def remove_effect(self, row, col, name):
+        """盤上の駒の特殊効果を解除する（期限切れキューの項目は切れるときに読み飛ばす）"""
+        piece = self.grid[row][col]
+        if name not in piece.effects:
+            return None
+        self.zobrist_key ^= _piece_key(piece, row, col)
+        effect = piece.remove_effect(name)
+        self.zobrist_key ^= _piece_key(piece, row, col)
+        self.state_version += 1
+        return effect
+        
+    def clear_effects(self, row, col):
+        """盤上の駒の特殊効果をすべて解除する"""
+        piece = self.grid[row][col]
+        if piece.effects:
+            self.zobrist_key ^= _piece_key(piece, row, col)
+            piece.reset_effects()
+            self.zobrist_key ^= _piece_key(piece, row, col)
+            self.state_version += 1
+        
+    def expire_effects(self):
+        """現在のターン数までに切れる効果だけを期限切れキューから取り出して解除する"""
+        expiries = self.effect_expiries
+        while expiries and expiries[0][0] <= self.turn_count:
+            _, _, piece, effect = heapq.heappop(expiries)
+            # 解除・置き換え済みの効果は読み飛ばす
+            if piece.effects.get(effect.name) is not effect:
+                continue
+            pos = self._find_piece(piece)
+            if pos is None:
+                continue  # 取られて盤上にない駒
+            self.remove_effect(pos[0], pos[1], effect.name)
+            print(f"{piece.kanji}の効果 {effect.name} が切れました")
+        
+    def _find_piece(self, piece):
+        """駒（インスタンス）のある盤上のマスを返す（なければNone）"""
+        for row in range(9):
+            for col in range(9):
+                if self.grid[row][col] is piece:
+                    return (row, col)
+        return None
+        
+    def mark_special_move_used(self, player, move_name):
+        """特殊技を使用済みにする（局面のハッシュ値も更新する）"""
+        if not self.special_state.is_used(player, move_name):
+            self.special_state.mark_used(player, move_name)
+            self.zobrist_key ^= ZOBRIST_SPECIAL_MOVES[player][SPECIAL_MOVE_INDEX[move_name]]
+        
+    def unmark_special_move_used(self, player, move_name):
+        """特殊技の使用を取り消す（探索で使った技を戻す）"""
+        if self.special_state.is_used(player, move_name):
+            self.special_state.unmark_used(player, move_name)
+            self.zobrist_key ^= ZOBRIST_SPECIAL_MOVES[player][SPECIAL_MOVE_INDEX[move_name]]
+        
+    def has_pawn_on_file(self, player, col, ignore=()):
+        """筋に成っていない自分の歩があるか（ignoreに指定したマスの駒は数えない）"""
+        count = self._pawn_file_counts[player][col]
+        for row, ignore_col in ignore:
+            piece = self.grid[row][ignore_col]
+            if ignore_col == col and _is_unpromoted_pawn(piece) and piece.player == player:
+                count -= 1
+        return count > 0
+        
+    def add_to_hand(self, player, piece_name):
+        """持ち駒に駒を1枚加える"""
+        index = HAND_INDEX[piece_name]
+        count = self.hands[player][index]
+        self.zobrist_key ^= ZOBRIST_HANDS[player][index][count] ^ ZOBRIST_HANDS[player][index][count + 1]
+        self.hands[player][index] = count + 1
+        self.state_version += 1
+        
+    def remove_from_hand(self, player, piece_name):
+        """持ち駒から駒を1枚取り除く"""
+        index = HAND_INDEX[piece_name]
+        count = self.hands[player][index]
+        self.zobrist_key ^= ZOBRIST_HANDS[player][index][count] ^ ZOBRIST_HANDS[player][index][count - 1]
+        self.hands[player][index] = count - 1
+        self.state_version += 1
+        
+    def hand_count(self, player, piece_name):
+        """持ち駒の枚数を返す"""
+        return self.hands[player][HAND_INDEX[piece_name]]
+        
+    def iter_hand(self, player):
+        """持っている持ち駒を (駒の種類, 枚数) で列挙する"""
+        hand = self.hands[player]
+        for i, piece_name in enumerate(HAND_PIECE_TYPES):
+            if hand[i]:
+                yield piece_name, hand[i]
+        
+    def hand_piece(self, player, piece_name):
+        """持ち駒の表示・選択・評価に使う駒を返す（盤上には置かない共有インスタンス）"""
+        key = (piece_name, player)
+        piece = self._hand_pieces.get(key)
+        if piece is None:
+            piece = create_piece(piece_name, player)
+            self._hand_pieces[key] = piece
+        return piece
+        
+    def save_position(self):
+        """探索・試行用に局面を保存する（派生状態キャッシュも含む）"""
+        return {
+            'grid': [row[:] for row in self.grid],
+            'hands': {1: self.hands[1][:], 2: self.hands[2][:]},
+            'occupied': self.occupied,
+            'zobrist_key': self.zobrist_key,
+            'pawn_files': dict(self.pawn_files),
+            'pawn_file_counts': {1: self._pawn_file_counts[1][:], 2: self._pawn_file_counts[2][:]},
+            'player_turn': self.player_turn,
+            'special_state': self.special_state.copy(),
+            'state_version': self.state_version,
+            'derived': self._derived
+        }
+        
+    def restore_position(self, state):
+        """save_positionで保存した局面に戻す"""
+        self.grid = state['grid']
+        self.hands = state['hands']
+        self.occupied = state['occupied']
+        self.zobrist_key = state['zobrist_key']
+        self.pawn_files = state['pawn_files']
+        self._pawn_file_counts = state['pawn_file_counts']
+        self.player_turn = state['player_turn']
+        self.special_state = state['special_state'].copy()
+        # 保存時のキャッシュは保存時の局面に対して有効なのでそのまま戻す
+        self.state_version = state['state_version']
+        self._derived = state['derived']
+        
+    # --- 探索用の指し手の実行（movesモジュールの整数表現） ---
+    def make_move(self, move):
+        """整数の指し手を盤面に反映する（手番は変更しない）。unmake_move用の情報を返す"""
+        to_row, to_col = move_to(move)
+        captured = self.grid[to_row][to_col]
+        
+        if is_drop(move):
+            undo = (captured, self.player_turn, False, self._derived, self.state_version)
+            piece_name = drop_piece_name(move)
+            self.remove_from_hand(self.player_turn, piece_name)
+            self.set_piece(to_row, to_col, create_piece(piece_name, self.player_turn))
+        else:
+            from_row, from_col = move_from(move)
+            piece = self.grid[from_row][from_col]
+            promoted_before = piece.is_promoted
+            undo = (captured, self.player_turn, promoted_before, self._derived, self.state_version)
+            self.set_piece(from_row, from_col, None)
+            self.set_piece(to_row, to_col, piece)
+            # 王を取った場合は対局終了なので持ち駒には加えない
+            if captured and captured.name != "king":
+                self.add_to_hand(piece.player, captured.name)
+            if is_promotion(move):
+                self.set_promoted(to_row, to_col, True)
+        return undo
+        
+    def zobrist_key_after(self, move):
+        """make_moveで指した後の局面のハッシュ値（盤面は変更しない）"""
+        to_row, to_col = move_to(move)
+        to_square = to_row * 9 + to_col
+        player = self.player_turn
+        key = self.zobrist_key
+        if is_drop(move):
+            piece_name = drop_piece_name(move)
+            index = HAND_INDEX[piece_name]
+            count = self.hands[player][index]
+            key ^= ZOBRIST_HANDS[player][index][count] ^ ZOBRIST_HANDS[player][index][count - 1]
+            return key ^ ZOBRIST_PIECES[(piece_name, player, False)][to_square]
+        
+        from_row, from_col = move_from(move)
+        piece = self.grid[from_row][from_col]
+        captured = self.grid[to_row][to_col]
+        key ^= _piece_key(piece, from_row, from_col) ^ _piece_key(piece, to_row, to_col)
+        if is_promotion(move) and not piece.is_promoted:
+            key ^= ZOBRIST_PIECES[(piece.name, piece.player, False)][to_square] ^ \
+                ZOBRIST_PIECES[(piece.name, piece.player, True)][to_square]
+        if captured:
+            key ^= _piece_key(captured, to_row, to_col)
+            # 王を取った場合は持ち駒に加えない（make_moveと同じ）
+            if captured.name != "king":
+                index = HAND_INDEX[captured.name]
+                count = self.hands[piece.player][index]
+                key ^= ZOBRIST_HANDS[piece.player][index][count] ^ ZOBRIST_HANDS[piece.player][index][count + 1]
+        return key
+        
+    def unmake_move(self, move, undo):
+        """make_moveで指した手を取り消す"""
+        captured, player, promoted_before, derived, version = undo
+        to_row, to_col = move_to(move)
+        
+        if is_drop(move):
+            self.set_piece(to_row, to_col, None)
+            self.add_to_hand(player, drop_piece_name(move))
+        else:
+            from_row, from_col = move_from(move)
+            piece = self.grid[to_row][to_col]
+            if is_promotion(move) and not promoted_before:
+                self.set_promoted(to_row, to_col, False)
+            self.set_piece(from_row, from_col, piece)
+            self.set_piece(to_row, to_col, captured)
+            if captured and captured.name != "king":
+                self.remove_from_hand(piece.player, captured.name)
+        # 指す前の局面に戻ったので指す前のキャッシュを復元する
+        self._derived = derived
+        self.state_version = version
+        
+    # --- 派生状態（キャッシュ経由で参照する） ---
+    def _derived_state(self):
+        """現在の局面に対応する派生状態キャッシュを返す"""
+        if self._derived.version != self.state_version:
+            self._derived = DerivedStateCache(self.state_version)
+        return self._derived
+        
+    def get_piece_moves(self, pos):
+        """盤上の駒の移動可能なマスを返す（キャッシュ付き）"""
+        cache = self._derived_state()
+        moves = cache.moves.get(pos)
+        if moves is None:
+            piece = self.grid[pos[0]][pos[1]]
+            moves = tuple(piece.get_possible_moves(self, pos)) if piece else ()
+            cache.moves[pos] = moves
+        return moves
+        
+    def get_attacked_squares(self, player):
+        """指定したプレイヤーの駒が利いているマスの集合を返す（キャッシュ付き）"""
+        cache = self._derived_state()
+        attacks = cache.attacks.get(player)
+        if attacks is None:
+            attacks = set()
+            for r in range(9):
+                for c in range(9):
+                    piece = self.grid[r][c]
+                    if piece and piece.player == player:
+                        attacks.update(self.get_piece_moves((r, c)))
+            cache.attacks[player] = attacks
+        return attacks
+        
+    def get_valid_drop_positions(self, piece_name, player):
+        """持ち駒を打てる場所のリストを返す（キャッシュ付き）"""
+        cache = self._derived_state()
+        key = (piece_name, player)
+        positions = cache.drops.get(key)
+        if positions is None:
+            positions = tuple(self._compute_drop_positions(self.hand_piece(player, piece_name)))
+            cache.drops[key] = positions
+        return positions
+        
+    def drop_target_mask(self, piece_name, player):
+        """持ち駒を打てるマスのビットマスク（空きマス & 打てる段 & 二歩にならない筋）"""
+        targets = ~self.occupied & DROP_RANK_MASKS.get((piece_name, player), FULL_BOARD_MASK)
+        if piece_name == "pawn":
+            targets &= NIFU_FREE_MASKS[self.pawn_files[player]]
+        return targets
+        
+    def _compute_drop_positions(self, piece):
+        """持ち駒を打てる場所のリストを計算する（drop_target_maskのマスを並べる）"""
+        targets = self.drop_target_mask(piece.name, piece.player)
+        
+        valid_positions = []
+        while targets:
+            low_bit = targets & -targets
+            valid_positions.append(SQUARES[low_bit.bit_length() - 1])
+            targets ^= low_bit
+        
+        return valid_positions
+        
+    def drop_piece(self, piece_name, pos):
+        """手番のプレイヤーの持ち駒を盤上に打つ"""
+        row, col = pos
+        
+        # 持ち駒から1枚減らす
+        player = self.player_turn
+        self.remove_from_hand(player, piece_name)
+        self.game_record['moves'].append({'type': 'drop', 'player': player, 'piece': piece_name, 'to': pos})
+        
+        # 盤上に新しい駒として配置
+        self.set_piece(row, col, create_piece(piece_name, player))
+        
+        # 効果音を鳴らす
+        self._on_piece_moved()
+        
+        # 王手と詰みの判定
+        opponent = 3 - player
+        self.in_check = self.is_in_check(opponent)
+        if self.in_check:
+            self.checkmate = self.is_checkmate(opponent)
+            if self.checkmate:
+                self._finish_game(player)
+                
+        # end_turnメソッドを使用して効果の持続時間も更新する
+        self.end_turn()
+        
+    def move_piece(self, from_pos, to_pos):
+        from_row, from_col = from_pos
+        to_row, to_col = to_pos
+        self.game_record['moves'].append(
+            {'type': 'move', 'player': self.player_turn, 'from': from_pos, 'to': to_pos, 'promote': False})
+        
+        # 相手の駒を取る場合
+        if self.grid[to_row][to_col]:
+            captured_piece = self.grid[to_row][to_col]
+            
+            # 王または玉を取った場合はゲーム終了
+            if captured_piece.name == "king":
+                self.set_piece(to_row, to_col, self.grid[from_row][from_col])
+                self.set_piece(from_row, from_col, None)
+                
+                # 効果音を鳴らす
+                self._on_piece_moved()
+                    
+                self._finish_game(self.player_turn)
+                return
+            else:
+                # 通常の駒を取る場合（成り・特殊効果は持ち駒にすると消える）
+                self.add_to_hand(self.player_turn, captured_piece.name)
+        
+        # 駒を移動
+        self.set_piece(to_row, to_col, self.grid[from_row][from_col])
+        self.set_piece(from_row, from_col, None)
+        
+        # 効果音を鳴らす
+        self._on_piece_moved()
+        
+        piece = self.grid[to_row][to_col]
+        
+        # 成りの判定（先手は下側3段（6,7,8）、後手は上側3段（0,1,2）が敵陣）
+        if can_promote(piece, from_row, to_row):
+            # 成り判定中フラグを立てる
+            self.promotion_pending = True
+            self.pending_move = (from_pos, to_pos)
+            # 行き所のない駒になる場合は選択させずに成る
+            if must_promote(piece.name, piece.player, to_row):
+                self.handle_promotion(True)
+            return
+        
+        # 成り判定がない場合は通常の処理を続行
+        self.finish_move()
+        
+    def finish_move(self):
+        """駒の移動を完了し、手番を交代する"""
+        # 王手と詰みの判定（ゲームが終了していない場合のみ）
+        if not self.game_over:
+            opponent = 3 - self.player_turn
+            self.in_check = self.is_in_check(opponent)
+            if self.in_check:
+                self.checkmate = self.is_checkmate(opponent)
+                if self.checkmate:
+                    self._finish_game(self.player_turn)
+        
+        # 手番を交代
+        if not self.promotion_pending:
+            # end_turnメソッドを使用して効果の持続時間も更新する
+            self.end_turn()
+        
+    def handle_promotion(self, promote):
+        """成り判定の結果を処理する"""
+        if not self.promotion_pending or not self.pending_move:
+            return
+            
+        from_pos, to_pos = self.pending_move
+        to_row, to_col = to_pos
+        piece = self.grid[to_row][to_col]
+        
+        if promote and piece:
+            self.set_promoted(to_row, to_col, True)
+            self.game_record['moves'][-1]['promote'] = True
+            # 成った場合、特殊効果をリセット
+            self.clear_effects(to_row, to_col)
+            print(f"{piece.kanji}が成り、特殊効果がリセットされました")
+            
+        self.promotion_pending = False
+        self.pending_move = None
+        
+        # 移動を完了（end_turnメソッドを使用）
+        self.end_turn()
+        
+    def find_king_position(self, player):
+        """指定したプレイヤーの王の位置を返す"""
+        cache = self._derived_state()
+        if player not in cache.kings:
+            cache.kings[player] = None
+            for row in range(9):
+                for col in range(9):
+                    piece = self.grid[row][col]
+                    if piece and piece.name == "king" and piece.player == player:
+                        cache.kings[player] = (row, col)
+                        break
+                if cache.kings[player]:
+                    break
+        return cache.kings[player]
+        
+    def is_position_under_attack(self, pos, attacking_player):
+        """指定した位置が指定したプレイヤーの駒から攻撃されているかチェック"""
+        return pos in self.get_attacked_squares(attacking_player)
+        
+    def find_attacking_pieces(self, player):
+        """プレイヤーの王/玉に王手をかけている相手の駒の位置を返す"""
+        attacking_pieces = []
+        
+        # 王/玉の位置を特定
+        king_pos = self.find_king_position(player)
+        if not king_pos:
+            return []
+            
+        opponent = 3 - player  # 相手プレイヤー
+        
+        # 盤面上の全ての相手の駒をチェック
+        for row in range(9):
+            for col in range(9):
+                piece = self.grid[row][col]
+                if piece and piece.player == opponent:
+                    # この駒が王/玉に到達可能かチェック
+                    if king_pos in self.get_piece_moves((row, col)):
+                        attacking_pieces.append((row, col))
+                        
+        return attacking_pieces
+        
+    def is_in_check(self, player):
+        """指定したプレイヤーが王手状態かどうかをチェック（キャッシュ付き）"""
+        cache = self._derived_state()
+        if player not in cache.check:
+            # 王の位置を取得
+            king_pos = self.find_king_position(player)
+            # 王が相手の駒から攻撃されているかチェック
+            cache.check[player] = bool(king_pos) and self.is_position_under_attack(king_pos, 3 - player)
+        return cache.check[player]
+        
+    def is_checkmate(self, player):
+        """指定したプレイヤーが詰み状態かどうかをチェック（キャッシュ付き）"""
+        cache = self._derived_state()
+        if player not in cache.checkmate:
+            cache.checkmate[player] = self._compute_checkmate(player)
+        return cache.checkmate[player]
+        
+    def _try_piece(self, pos, piece, captured_from=None):
+        """試行用に駒を置く。captured_fromを指定すると移動として扱う。元に戻す情報を返す"""
+        undo = (pos, self.grid[pos[0]][pos[1]], captured_from, self._derived, self.state_version)
+        self.set_piece(pos[0], pos[1], piece)
+        if captured_from:
+            self.set_piece(captured_from[0], captured_from[1], None)
+        return undo
+        
+    def _undo_try(self, undo):
+        """_try_pieceで置いた駒を元に戻す"""
+        pos, original, moved_from, derived, version = undo
+        if moved_from:
+            self.set_piece(moved_from[0], moved_from[1], self.grid[pos[0]][pos[1]])
+        self.set_piece(pos[0], pos[1], original)
+        # 試行前の局面に戻ったので試行前のキャッシュを復元する
+        self._derived = derived
+        self.state_version = version
+        
+    def _compute_checkmate(self, player):
+        """指定したプレイヤーが詰み状態かどうかを計算する"""
+        # 王手状態でなければ詰みではない
+        if not self.is_in_check(player):
+            return False
+            
+        # 王の位置を取得
+        king_pos = self.find_king_position(player)
+        if not king_pos:
+            return False
+            
+        king_row, king_col = king_pos
+        king = self.grid[king_row][king_col]
+        
+        # 王が移動できるかチェック
+        for move in self.get_piece_moves(king_pos):
+            # 一時的に王を移動させてみる
+            undo = self._try_piece(move, king, king_pos)
+            
+            # 移動先が攻撃されていないかチェック
+            is_safe = not self.is_position_under_attack(move, 3 - player)
+            
+            # 盤面を元に戻す
+            self._undo_try(undo)
+            
+            if is_safe:
+                return False  # 安全な移動先があるので詰みではない
+        
+        # 他の駒が王手を防げるかチェック
+        for r in range(9):
+            for c in range(9):
+                piece = self.grid[r][c]
+                if piece and piece.player == player and piece.name != "king":
+                    for move in self.get_piece_moves((r, c)):
+                        # 一時的に駒を移動させてみる
+                        undo = self._try_piece(move, piece, (r, c))
+                        
+                        # 王手が解消されるかチェック
+                        still_in_check = self.is_in_check(player)
+                        
+                        # 盤面を元に戻す
+                        self._undo_try(undo)
+                        
+                        if not still_in_check:
+                            return False  # 王手を防げる手があるので詰みではない
+        
+        # 持ち駒を打って王手を防げるかチェック（同じ種類の駒は1回だけ試す）
+        for piece_name, count in self.iter_hand(player):
+            piece = create_piece(piece_name, player)
+            for drop_pos in self.get_valid_drop_positions(piece_name, player):
+                # 一時的に持ち駒を打ってみる
+                undo = self._try_piece(drop_pos, piece)
+                
+                # 王手が解消されるかチェック
+                still_in_check = self.is_in_check(player)
+                
+                # 盤面を元に戻す
+                self._undo_try(undo)
+                
+                if not still_in_check:
+                    return False  # 持ち駒を打って王手を防げるので詰みではない
+        
+        # 全ての手を試しても王手を防げないので詰み
+        return True
+        
+    def apply_special_move(self, special_move, target_pos=None):
+        """特殊技を適用する"""
+        result = special_move.execute(self, self.player_turn, target_pos)
+        if result:
+            # 特殊技の使用に成功
+            self.mark_special_move_used(self.player_turn, special_move.name)
+            self.game_record['moves'].append({'type': 'special', 'player': self.player_turn, 'name': special_move.name})
+            self.special_move_active = None
+            self._on_special_move_applied()
+            return True
+        return False
+        
+    def end_turn(self):
+        """ターンを終了し、必要に応じて特殊効果の持続時間を減らす"""
+        # プレイヤーターンの切り替え
+        self.player_turn = 3 - self.player_turn  # 1→2, 2→1
+        self.current_player = self.player_turn
+        
+        # 手数カウンターを増やす
+        self.move_count += 1
+        
+        # 2手（先手と後手の両方が行動）で1ターン経過
+        if self.move_count % 2 == 0:
+            print(f"ターン{self.turn_count}が終了しました")
+            
+            # ターン数を増やす
+            self.turn_count += 1
+            
+            # このターンで切れる特殊効果だけを解除する
+            self.expire_effects()
+            
+        # 王手判定
+        self.check_for_check()
+        
+        # 詰み判定
+        if self.in_check:
+            self.check_for_checkmate()
+        
+    def check_for_check(self):
+        """現在のプレイヤーが王手状態かどうかをチェック"""
+        self.in_check = self.is_in_check(self.player_turn)
+        
+    def check_for_checkmate(self):
+        """現在のプレイヤーが詰み状態かどうかをチェック"""
+        if self.in_check:
+            self.checkmate = self.is_checkmate(self.player_turn)
+            if self.checkmate:
+                self._finish_game(3 - self.player_turn)  # 相手の勝ち
+        
+    def resign(self):
+        """現在のプレイヤーが投了する"""
+        # 現在のプレイヤーの相手を勝者とする
+        self._finish_game(3 - self.player_turn)
@@ -0,0 +1,142 @@
+"""
+脅威空間探索（threat-space search）による必至探索モジュール
+
+王手ではない静かな手のうち詰めろになる手だけを生成し、玉方のすべての応手に
+対して王手による詰み（短手数のdf-pn）が残ることを確かめて必至と判定する。
+"""
+import time
+
+from moves import generate_moves, move_to, move_from
+from tsume import DfPnSolver, find_mate_in_one, attackers, king_positions
+
+
+class ThreatSpaceSearcher:
+    """必至（どう受けても詰む詰めろ）を探す脅威空間探索"""
+
+    def __init__(self, threat_ply=3, max_nodes=20000, time_limit=1.0, solve_nodes=300, threat_radius=2,
+                 clock=time.time):
+        self.threat_ply = threat_ply  # 詰めろとみなす詰み手順の最大手数
+        self.max_nodes = max_nodes  # 1回の探索でdf-pnが展開する局面数の上限
+        self.time_limit = time_limit  # 制限時間（秒）
+        self.solve_nodes = solve_nodes  # 詰み判定1回あたりのdf-pnの局面数の上限
+        self.threat_radius = threat_radius  # 候補手の移動先と相手の王との距離の上限
+        self.clock = clock  # 制限時間の計測に使う時計
+        self.solver = DfPnSolver(max_ply=threat_ply, clock=clock)
+        self.cache = {}  # (局面のハッシュ値, 攻め方) -> 詰むかどうか（制限で打ち切った結果は保存しない）
+        self.max_cache_size = 200000
+        self.cache_probes = 0  # 詰み判定でcacheを引いた回数（累計）
+        self.cache_hits = 0  # そのうちcacheに結果があった回数（累計）
+        self.nodes = 0
+        self._deadline = 0
+
+    def search(self, board, attacker=None, time_limit=None):
+        """attacker（省略時は手番のプレイヤー）の必至になる手（整数の指し手）を返す。なければNone"""
+        if attacker is None:
+            attacker = board.player_turn
+        defender = 3 - attacker
+        self.nodes = 0
+        self._deadline = self.clock() + (self.time_limit if time_limit is None else time_limit)
+        if len(self.cache) > self.max_cache_size:
+            self.cache = {}
+
+        kings = king_positions(board)
+        if kings[attacker] is None or kings[defender] is None:
+            return None
+        # 自玉に王手がかかっている局面では必至を狙わない
+        if attackers(board, kings[attacker], defender, True):
+            return None
+
+        original_turn = board.player_turn
+        board.player_turn = attacker
+        try:
+            for move in self._threat_candidates(board, kings, attacker):
+                if self._out_of_budget():
+                    break
+                if self._is_hisshi(board, move, kings, attacker):
+                    return move
+            return None
+        finally:
+            board.player_turn = original_turn
+
+    def _out_of_budget(self):
+        return self.nodes >= self.max_nodes or self.clock() > self._deadline
+
+    def _threat_candidates(self, board, kings, attacker):
+        """相手の王に近いマスへ指す手を、王に近い順に並べる"""
+        king_row, king_col = kings[3 - attacker]
+        candidates = []
+        for move in generate_moves(board, attacker):
+            to_row, to_col = move_to(move)
+            distance = max(abs(to_row - king_row), abs(to_col - king_col))
+            if distance <= self.threat_radius:
+                candidates.append((distance, move))
+        candidates.sort()
+        return [move for distance, move in candidates]
+
+    def _is_hisshi(self, board, move, kings, attacker):
+        """王手ではない手で、指した後に詰めろになり、すべての応手で詰むかどうか"""
+        defender = 3 - attacker
+        from_pos = move_from(move)
+        own_king_after = move_to(move) if from_pos == kings[attacker] else kings[attacker]
+
+        undo = board.make_move(move)
+        board.player_turn = defender
+        try:
+            # 自玉を取られる手・王手（詰み探索の担当）は除く
+            if attackers(board, own_king_after, defender, True):
+                return False
+            if attackers(board, kings[defender], attacker, True):
+                return False
+            if not self._has_mate(board, attacker):
+                return False
+            return self._all_defenses_fail(board, kings[defender], attacker)
+        finally:
+            board.player_turn = attacker
+            board.unmake_move(move, undo)
+
+    def _all_defenses_fail(self, board, king_pos, attacker):
+        """玉方の手番で、どの合法手を指しても攻め方に詰みがあるかどうか"""
+        defender = 3 - attacker
+        for move in generate_moves(board, defender):
+            if self._out_of_budget():
+                return False
+            king_after = move_to(move) if move_from(move) == king_pos else king_pos
+            undo = board.make_move(move)
+            try:
+                # 王を取られる手は応手にならない
+                if attackers(board, king_after, attacker, True):
+                    continue
+                board.player_turn = attacker
+                if not self._has_mate(board, attacker):
+                    return False
+            finally:
+                board.player_turn = defender
+                board.unmake_move(move, undo)
+        return True
+
+    def _has_mate(self, board, attacker):
+        """attackerに王手による詰みがあるか（1手詰めを先に調べ、残りを短手数のdf-pnで調べる）"""
+        key = (board.zobrist_key, attacker)
+        cached = self.cache.get(key)
+        self.cache_probes += 1
+        if cached is not None:
+            self.cache_hits += 1
+            return cached
+
+        if find_mate_in_one(board, attacker) is not None:
+            result = True
+        elif self.threat_ply < 3:
+            result = False
+        else:
+            solver = self.solver
+            solver.max_ply = self.threat_ply
+            solver.max_nodes = min(self.solve_nodes, max(1, self.max_nodes - self.nodes))
+            solver.time_limit = max(0.0, self._deadline - self.clock())
+            result = solver.solve(board, attacker) is not None
+            self.nodes += solver.nodes
+            if solver.aborted and not result:
+                # 打ち切った場合は詰まないとみなすが、結果は保存しない
+                return False
+
+        self.cache[key] = result
+        return result
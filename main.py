@@ -5,10 +5,22 @@ from utils import load_piece_images, setup_fonts, load_sounds
 from board import Board
 from ui.button import Button
 from ui.windows import SpecialMoveWindow, PromotionWindow
+from ui.frame_profiler import FrameProfiler
+from ui.frame_pacer import FramePacer
+from ui.surface_pool import filled_surface
+from ui.text_cache import render_text
 from event_manager import EventManager, GameEvent
 from ai import ShogiAI
 from bgm_manager import BGMManager
 
+def parse_seed(argv):
+    """コマンドライン引数の --seed N から対局の乱数シードを取り出す（なければNone）"""
+    if "--seed" in argv:
+        index = argv.index("--seed")
+        if index + 1 < len(argv):
+            return int(argv[index + 1])
+    return None
+
 def main():
     # 初期化
     pygame.init()
@@ -34,21 +46,20 @@ def main():
     game_mode = show_game_mode_selection(screen, font, button_font, sounds)
     
     # ゲームオブジェクトの作成
-    board = Board(screen, font, piece_images, sounds, event_manager, bgm_manager)  # BGMManagerも渡す
-    
-    # 特殊技の使用状態をリセット
-    from special_moves import reset_special_moves
-    reset_special_moves()
+    board = Board(screen, font, piece_images, sounds, event_manager, bgm_manager,
+                  seed=parse_seed(sys.argv))  # BGMManagerも渡す（特殊技の使用状態も対局ごと）
     
     # 選択されたモードに応じて初期配置を設定
     if game_mode == "endgame":
         board.setup_random_endgame()
+    print(f"乱数シード: {board.seed}（--seed {board.seed} で同じ対局を再現できます）")
     # 通常モードの場合はデフォルトのsetup_boardが既に呼ばれている
     
     # 対局開始時にBGM再生
     bgm_manager.play_bgm(volume=0.3)  # 音量調整
     
-    clock = pygame.time.Clock()
+    # アニメーション・AIの手番・BGM待ちの間だけ60fpsで回し、それ以外はイベントが来るまで待つ
+    pacer = FramePacer(fps=60)
     
     # 「最初に戻る」ボタン
     restart_button = Button(
@@ -84,7 +95,12 @@ def main():
     promotion_window = PromotionWindow(font, button_font)
     
     # AIの初期化
-    ai = ShogiAI(board)
+    ai = ShogiAI(board, collect_stats="--search-stats" in sys.argv)
+    
+    # フレーム時間の計測（F3で表示切り替え、--frame-logで1秒ごとに要約を出力）
+    frame_profiler = FrameProfiler(log_every=60 if "--frame-log" in sys.argv else None)
+    profiler_font = pygame.font.SysFont("monospace", 14)
+    board.frame_profiler = frame_profiler
     
     # AI手番タイマー
     ai_move_timer = 0  # AIの手番タイマー
@@ -130,18 +146,22 @@ def main():
     # イベントリスナーを登録
     event_manager.subscribe(GameEvent.SPECIAL_MOVE_ACTIVATED, on_special_move_activated)
     
+    def ai_waiting():
+        """AIが指すのを待っているか（エフェクトの完了も待つ）"""
+        return (board.player_turn == 1 and not board.game_over and
+                not board.promotion_pending and not special_move_window.active and
+                board.can_change_turn())
+    
     running = True
     while running:
+        frame_profiler.begin_frame()
         mouse_pos = pygame.mouse.get_pos()
         
         # 特殊技エフェクト完了チェック
         board.check_special_effects_complete()
         
         # AIの手番処理（描画前に実行）
-        if (board.player_turn == 1 and not board.game_over and 
-            not board.promotion_pending and not special_move_window.active and
-            board.can_change_turn()):  # エフェクト完了チェックを追加
-            
+        if ai_waiting():
             ai_move_timer += 1
             if ai_move_timer >= ai_delay:
                 # AIの手を実行
@@ -149,10 +169,16 @@ def main():
                 ai_move_timer = 0  # タイマーリセット
         else:
             ai_move_timer = 0  # AI以外の手番ではタイマーリセット
+        frame_profiler.lap("ai")
         
-        for event in pygame.event.get():
+        for event in pacer.events():
             if event.type == pygame.QUIT:
                 running = False
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                frame_profiler.toggle_overlay()
+            elif event.type == pygame.WINDOWEXPOSED:
+                # ウィンドウが隠れて戻ったときは画面全体を描き直す
+                board.renderer.invalidate()
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 if event.button == 1:  # 左クリック
                     # 成り判定ウィンドウが開いている場合
@@ -186,16 +212,15 @@ def main():
                         
                         # ゲームをリセット
                         board = Board(screen, font, piece_images, sounds, event_manager, bgm_manager)
+                        board.frame_profiler = frame_profiler
                         # モード選択画面を再表示（音声再生も含む）
                         game_mode = show_game_mode_selection(screen, font, button_font, sounds)
                         # 選択されたモードに応じて初期配置を設定
                         if game_mode == "endgame":
                             board.setup_random_endgame()
-                        # 特殊技の使用状態をリセット
-                        from special_moves import reset_special_moves
-                        reset_special_moves()
+                        print(f"乱数シード: {board.seed}")
                         # AIも再初期化
-                        ai = ShogiAI(board)
+                        ai = ShogiAI(board, collect_stats="--search-stats" in sys.argv)
                         # AIタイマーもリセット
                         ai_move_timer = 0
                         
@@ -232,30 +257,29 @@ def main():
                         continue
                     
                     board.select(pos, event.pos)  # マウス位置も渡す
+        frame_profiler.lap("input")
             
-        # 画面クリア
-        screen.fill((255, 255, 255))
-        
-        # 盤と駒の描画
+        # 盤と駒の描画（持ち駒・エフェクトの時間はBoard.drawの中で分けて測る）
+        # 背景・盤・駒は変化した範囲だけを描き直すので画面はクリアしない
         show_restart = board.draw()
+        overlays = []  # このフレームで文字・ボタン・ウィンドウを描いた範囲
+        frame_profiler.lap("board")
         
-        # エフェクト表示の更新
-        board.effect_display.update()
-        
-        # ゲーム終了シーケンスの更新
+        # ゲーム終了シーケンスの更新（エフェクトはBoard.drawの中で1フレームに1回更新する）
         if board.game_over:
             board.update_game_end_sequence()
+        frame_profiler.lap("effects")
         
         # AI思考中の表示
         if (board.player_turn == 1 and not board.game_over and ai_move_timer > 0 and
             board.can_change_turn()):
-            thinking_text = font.render("コンピュータが考え中...", True, (255, 255, 255))
-            screen.blit(thinking_text, (10, 10))
+            thinking_text = render_text(font, "コンピュータが考え中...", (255, 255, 255))
+            overlays.append(screen.blit(thinking_text, (10, 10)))
         
         # 「技を使う」ボタンの更新と描画（ゲーム終了時または先手番は表示しない）
         if not board.game_over and not board.special_move_active and board.player_turn == 2:
             special_move_button.update(mouse_pos)
-            special_move_button.draw(screen, button_font)
+            overlays.append(special_move_button.draw(screen, button_font))
         
         # 特殊技選択中は「技選択に戻る」ボタンを更新
         if board.special_move_active and not board.special_move_confirm:
@@ -270,16 +294,16 @@ def main():
         if show_restart:
             # ゲーム終了時は「最初に戻る」ボタンを表示
             restart_button.update(mouse_pos)
-            restart_button.draw(screen, button_font)
+            overlays.append(restart_button.draw(screen, button_font))
         elif not board.special_move_active and not board.special_move_confirm and not promotion_window.active:
             # 後手番の時のみ「投了」ボタンを表示
             if board.player_turn == 2:
                 resign_button.update(mouse_pos)
-                resign_button.draw(screen, button_font)
+                overlays.append(resign_button.draw(screen, button_font))
         
         # 特殊技ウィンドウの描画
         special_move_window.update(mouse_pos)
-        special_move_window.draw(screen)
+        overlays.append(special_move_window.draw(screen))
         
         # 成り判定ウィンドウの表示
         if board.promotion_pending and not promotion_window.active:
@@ -290,10 +314,21 @@ def main():
         
         # 成り判定ウィンドウの描画
         promotion_window.update(mouse_pos)
-        promotion_window.draw(screen)
+        overlays.append(promotion_window.draw(screen))
         
-        pygame.display.flip()
-        clock.tick(60)
+        # フレーム時間の表示
+        overlays.append(frame_profiler.draw(screen, profiler_font))
+        frame_profiler.lap("windows")
+        
+        # 描き直した範囲と文字・ボタン・ウィンドウを描いた範囲だけを画面に反映する
+        for rect in overlays:
+            board.renderer.add_overlay(rect)
+        board.renderer.present()
+        frame_profiler.lap("flip")
+        frame_profiler.end_frame()
+        
+        # エフェクト・AIの手番・ゲーム終了のBGM待ちがなければ、次のイベントまで描き直さずに待つ
+        pacer.wait(board.needs_animation() or ai_waiting() or frame_profiler.overlay_visible)
     
     pygame.quit()
     sys.exit()
@@ -381,6 +416,7 @@ def show_game_mode_selection(screen, font, button_font, sounds=None):
     )
     
     selected_mode = None
+    pacer = FramePacer(fps=60)
     
     # 選択画面のループ
     while selected_mode is None:
@@ -389,7 +425,7 @@ def show_game_mode_selection(screen, font, button_font, sounds=None):
         
         mouse_pos = pygame.mouse.get_pos()
         
-        for event in pygame.event.get():
+        for event in pacer.events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
@@ -409,13 +445,12 @@ def show_game_mode_selection(screen, font, button_font, sounds=None):
         
         # 選択ウィンドウの描画（半透明にして背景画像を見えるようにする）
         window_rect = pygame.Rect(window_x, window_y, window_width, window_height)
-        window_surface = pygame.Surface((window_width, window_height), pygame.SRCALPHA)
-        window_surface.fill((240, 240, 240, 200))  # 半透明の背景
+        window_surface = filled_surface((window_width, window_height), (240, 240, 240, 200))  # 半透明の背景
         screen.blit(window_surface, (window_x, window_y))
         pygame.draw.rect(screen, WINDOW_BORDER_COLOR, window_rect, 2)
         
         # タイトルの描画
-        title_text = font.render("ゲームモードを選択してください", True, (0, 0, 0))
+        title_text = render_text(font, "ゲームモードを選択してください", (0, 0, 0))
         title_rect = title_text.get_rect(center=(SCREEN_WIDTH // 2, window_y + 40))
         screen.blit(title_text, title_rect)
         
@@ -427,6 +462,9 @@ def show_game_mode_selection(screen, font, button_font, sounds=None):
         endgame_button.draw(screen, button_font)
         
         pygame.display.flip()
+        
+        # タイトルBGMを始めるまでは60fpsで回し、その後はイベントが来るまで待つ
+        pacer.wait(not title_bgm_started)
     
     # モードが選択されたらタイトルBGMを停止
     pygame.mixer.music.stop()
@@ -0,0 +1,163 @@
+"""
+指し手を16ビットの整数で表すモジュール
+
+ビット配置: 0-6 移動先のマス / 7-13 移動元のマス（81以上は打つ駒の種類） / 14 成り
+マスは row * 9 + col の番号で表す。
+"""
+from array import array
+
+from pieces import HAND_PIECE_TYPES, HAND_INDEX
+
+SQUARES = [(i // 9, i % 9) for i in range(81)]  # マス番号 -> (row, col)
+DROP_FROM_BASE = 81  # 打つ手の移動元は 81 + 持ち駒の種類番号
+SQUARE_MASK = 0x7F
+PROMOTE_FLAG = 1 << 14
+
+PROMOTABLE_PIECES = ("pawn", "lance", "knight", "silver", "bishop", "rook")
+# 成らない手が常に損になる駒（成らない手は生成しない）
+ALWAYS_PROMOTE_PIECES = ("pawn", "bishop", "rook")
+
+
+def in_promotion_zone(player, row):
+    """敵陣（先手は6〜8段、後手は0〜2段）かどうか"""
+    return row >= 6 if player == 1 else row <= 2
+
+
+def can_promote(piece, from_row, to_row):
+    """この移動で成ることができるかどうか"""
+    if piece.is_promoted or piece.name not in PROMOTABLE_PIECES:
+        return False
+    return in_promotion_zone(piece.player, from_row) or in_promotion_zone(piece.player, to_row)
+
+
+def must_promote(piece_name, player, to_row):
+    """成らないと次に動けない駒（行き所のない駒）になるかどうか"""
+    if piece_name in ("pawn", "lance"):
+        return to_row == 8 if player == 1 else to_row == 0
+    if piece_name == "knight":
+        return to_row >= 7 if player == 1 else to_row <= 1
+    return False
+
+
+def encode_move(from_pos, to_pos, promote=False):
+    """盤上の駒を動かす手を整数にする"""
+    move = (from_pos[0] * 9 + from_pos[1]) << 7 | (to_pos[0] * 9 + to_pos[1])
+    if promote:
+        move |= PROMOTE_FLAG
+    return move
+
+
+def encode_drop(piece_name, to_pos):
+    """持ち駒を打つ手を整数にする"""
+    return (DROP_FROM_BASE + HAND_INDEX[piece_name]) << 7 | (to_pos[0] * 9 + to_pos[1])
+
+
+def is_drop(move):
+    """持ち駒を打つ手かどうか"""
+    return (move >> 7 & SQUARE_MASK) >= DROP_FROM_BASE
+
+
+def is_promotion(move):
+    """成る手かどうか"""
+    return move & PROMOTE_FLAG != 0
+
+
+def move_to(move):
+    """移動先のマス (row, col)"""
+    return SQUARES[move & SQUARE_MASK]
+
+
+def move_from(move):
+    """移動元のマス (row, col)（打つ手はNone）"""
+    from_square = move >> 7 & SQUARE_MASK
+    if from_square >= DROP_FROM_BASE:
+        return None
+    return SQUARES[from_square]
+
+
+def drop_piece_name(move):
+    """打つ駒の種類"""
+    return HAND_PIECE_TYPES[(move >> 7 & SQUARE_MASK) - DROP_FROM_BASE]
+
+
+def append_piece_moves(out, piece, row, col, targets):
+    """(row, col)の駒をtargetsの各マスに動かす手をoutに加える（成れる場合は成る手と成らない手）"""
+    player = piece.player
+    from_bits = (row * 9 + col) << 7
+    promotable = not piece.is_promoted and piece.name in PROMOTABLE_PIECES
+    always_promote = piece.name in ALWAYS_PROMOTE_PIECES
+    from_in_zone = in_promotion_zone(player, row)
+    for to_row, to_col in targets:
+        move = from_bits | (to_row * 9 + to_col)
+        if promotable and (from_in_zone or in_promotion_zone(player, to_row)):
+            out.append(move | PROMOTE_FLAG)
+            # 成らない手が損な駒・行き所のなくなる駒は成る手のみ
+            if always_promote or must_promote(piece.name, player, to_row):
+                continue
+        out.append(move)
+
+
+def generate_moves(board, player=None, max_drops_per_type=None, out=None, include_drops=True):
+    """指し手を array('H') に列挙する（outを渡すとそのバッファを空にして再利用する）"""
+    if player is None:
+        player = board.player_turn
+    if out is None:
+        out = array('H')
+    else:
+        del out[:]
+
+    # 盤上の駒の移動（成れる場合は成る手と成らない手を生成する）
+    grid = board.grid
+    for row in range(9):
+        for col in range(9):
+            piece = grid[row][col]
+            if piece and piece.player == player:
+                append_piece_moves(out, piece, row, col, board.get_piece_moves((row, col)))
+
+    if not include_drops:
+        return out
+
+    # 持ち駒の配置（同じ種類の駒は1回だけ生成する）
+    for piece_name, count in board.iter_hand(player):
+        from_bits = (DROP_FROM_BASE + HAND_INDEX[piece_name]) << 7
+        positions = board.get_valid_drop_positions(piece_name, player)
+        if max_drops_per_type is not None:
+            positions = positions[:max_drops_per_type]
+        for to_row, to_col in positions:
+            out.append(from_bits | (to_row * 9 + to_col))
+
+    return out
+
+
+def encode_move_dict(move):
+    """辞書形式の指し手を整数にする"""
+    if move['type'] == 'drop':
+        return encode_drop(move['piece'].name, move['to'])
+    return encode_move(move['from'], move['to'], move.get('promote', False))
+
+
+def decode_move(board, move, piece=None):
+    """整数の指し手を辞書形式に戻す（ShogiAI._execute_move・評価関数・画面表示用）
+
+    pieceを省略すると移動元の駒（打つ手は持ち駒の駒）を使うので、指す前の局面で呼び出す。
+    """
+    if is_drop(move):
+        piece_name = drop_piece_name(move)
+        if piece is None:
+            piece = board.hand_piece(board.player_turn, piece_name)
+        return {
+            'type': 'drop',
+            'to': move_to(move),
+            'piece': piece
+        }
+
+    from_pos = move_from(move)
+    if piece is None:
+        piece = board.grid[from_pos[0]][from_pos[1]]
+    return {
+        'type': 'move',
+        'from': from_pos,
+        'to': move_to(move),
+        'piece': piece,
+        'promote': is_promotion(move)
+    }
@@ -0,0 +1,340 @@
+"""
+指し手生成の正しさと速さを確かめるperft（指定した深さの末端の局面数を数える）ツール
+
+参照の指し手生成は駒のget_possible_movesと持ち駒の打てるマスの単純な判定だけで作り、
+成る/成らない手・行き所のない駒・二歩・打ち歩詰め・自玉への王手の放置をすべて扱う。
+movesモジュールの指し手生成などの高速化した生成をこの参照と照合できる。
+
+使い方:
+    python perft.py 3                    # 初期配置から深さ3
+    python perft.py 3 --divide           # 初手ごとの局面数
+    python perft.py 2 --sfen "<SFEN>"    # SFENの局面から
+    python perft.py 2 --corpus           # 組み込みの局面集を期待値と照合
+    python perft.py 3 --generator engine # moves.generate_movesで数える
+    python perft.py 2 --corpus --generator engine  # 意図して生成しない手を戻して局面集と照合
+    python perft.py 2 --compare engine   # 各局面でmoves.generate_movesを参照と照合
+"""
+import argparse
+import sys
+import time
+
+from game_state import GameState
+from pieces import HAND_PIECE_TYPES, create_piece
+from moves import (generate_moves, encode_move, encode_drop, is_drop, is_promotion, move_to, move_from,
+                   drop_piece_name, can_promote, must_promote, ALWAYS_PROMOTE_PIECES, PROMOTE_FLAG)
+
+# SFENの駒の文字 <-> 駒の種類（大文字が先手=player 1）
+SFEN_PIECES = {"P": "pawn", "L": "lance", "N": "knight", "S": "silver", "G": "gold",
+               "B": "bishop", "R": "rook", "K": "king"}
+SFEN_LETTERS = {name: letter for letter, name in SFEN_PIECES.items()}
+
+START_SFEN = "lnsgkgsnl/1r5b1/ppppppppp/9/9/9/PPPPPPPPP/1B5R1/LNSGKGSNL b - 1"
+
+# 局面集（名前, SFEN, {深さ: 末端の局面数}）。期待値は一般的な将棋のperftの値と手で数えた値
+PERFT_CORPUS = [
+    ("初期配置", START_SFEN, {1: 30, 2: 900, 3: 25470}),
+    ("祭り", "l6nl/5+P1gk/2np1S3/p1p4Pp/3P2Sp1/1PPb2P1P/P5GS1/R8/LN4bKL w RGgsn5p 1", {1: 207, 2: 28684}),
+    ("最多合法手", "R8/2K1S1SSk/4B4/9/9/9/9/9/1L1L1L3 b RBGSNLP3g3n17p 1", {1: 593}),
+    # P*1bは打ち歩詰め、5筋は二歩、1段目は行き所のない歩なので打てない
+    ("打ち歩詰め・二歩", "8k/6G2/7G1/9/4P4/9/9/9/K8 b P 1", {1: 75}),
+]
+
+
+# --- SFEN（盤面の向き: SFENのi段目j列目 = grid[8 - i][8 - j]） ---
+def parse_sfen(sfen):
+    """SFENの局面からGameStateを作る"""
+    fields = sfen.split()
+    board_field, turn_field, hand_field = fields[0], fields[1], fields[2]
+    state = GameState(seed=0)
+    state.grid = [[None for _ in range(9)] for _ in range(9)]
+    state.hands = {1: [0] * len(HAND_PIECE_TYPES), 2: [0] * len(HAND_PIECE_TYPES)}
+
+    for i, rank in enumerate(board_field.split("/")):
+        j = 0
+        promoted = False
+        for char in rank:
+            if char.isdigit():
+                j += int(char)
+            elif char == "+":
+                promoted = True
+            else:
+                player = 1 if char.isupper() else 2
+                state.grid[8 - i][8 - j] = create_piece(SFEN_PIECES[char.upper()], player, promoted)
+                promoted = False
+                j += 1
+
+    if hand_field != "-":
+        count = 0
+        for char in hand_field:
+            if char.isdigit():
+                count = count * 10 + int(char)
+            else:
+                player = 1 if char.isupper() else 2
+                state.hands[player][HAND_PIECE_TYPES.index(SFEN_PIECES[char.upper()])] += count or 1
+                count = 0
+
+    state.player_turn = 1 if turn_field == "b" else 2
+    state.current_player = state.player_turn
+    state.refresh_position()
+    return state
+
+
+def to_sfen(state):
+    """GameStateの局面をSFENにする"""
+    ranks = []
+    for i in range(9):
+        rank = ""
+        empty = 0
+        for j in range(9):
+            piece = state.grid[8 - i][8 - j]
+            if piece is None:
+                empty += 1
+                continue
+            if empty:
+                rank += str(empty)
+                empty = 0
+            letter = SFEN_LETTERS[piece.name]
+            rank += ("+" if piece.is_promoted else "") + (letter if piece.player == 1 else letter.lower())
+        if empty:
+            rank += str(empty)
+        ranks.append(rank)
+
+    hand = ""
+    for player in (1, 2):
+        for name in ("rook", "bishop", "gold", "silver", "knight", "lance", "pawn"):
+            count = state.hand_count(player, name)
+            if count:
+                letter = SFEN_LETTERS[name] if player == 1 else SFEN_LETTERS[name].lower()
+                hand += (str(count) if count > 1 else "") + letter
+    return f"{'/'.join(ranks)} {'b' if state.player_turn == 1 else 'w'} {hand or '-'} 1"
+
+
+def _usi_square(pos):
+    row, col = pos
+    return f"{col + 1}{chr(ord('a') + 8 - row)}"
+
+
+def move_to_usi(move):
+    """整数の指し手をUSI形式（7g7f, P*5e, 8h2b+）にする"""
+    if is_drop(move):
+        return f"{SFEN_LETTERS[drop_piece_name(move)]}*{_usi_square(move_to(move))}"
+    return _usi_square(move_from(move)) + _usi_square(move_to(move)) + ("+" if is_promotion(move) else "")
+
+
+# --- 参照の指し手生成 ---
+def reference_moves(state, player=None):
+    """駒のget_possible_movesから作る疑似合法手（自玉の王手放置・打ち歩詰めは含む）"""
+    if player is None:
+        player = state.player_turn
+    moves = []
+    for row in range(9):
+        for col in range(9):
+            piece = state.grid[row][col]
+            if piece is None or piece.player != player:
+                continue
+            for to_row, to_col in piece.get_possible_moves(state, (row, col)):
+                if can_promote(piece, row, to_row):
+                    moves.append(encode_move((row, col), (to_row, to_col), True))
+                    if must_promote(piece.name, player, to_row):
+                        continue
+                moves.append(encode_move((row, col), (to_row, to_col)))
+
+    for name in HAND_PIECE_TYPES:
+        if state.hand_count(player, name) == 0:
+            continue
+        for row in range(9):
+            if must_promote(name, player, row):
+                continue  # 行き所のない駒は打てない
+            for col in range(9):
+                if state.grid[row][col] is not None:
+                    continue
+                if name == "pawn" and _has_pawn_on_file(state, player, col):
+                    continue  # 二歩
+                moves.append(encode_drop(name, (row, col)))
+    return moves
+
+
+def _has_pawn_on_file(state, player, col):
+    """筋に成っていない自分の歩があるか（盤面を直接調べる）"""
+    for row in range(9):
+        piece = state.grid[row][col]
+        if piece and piece.name == "pawn" and piece.player == player and not piece.is_promoted:
+            return True
+    return False
+
+
+def engine_moves(state, player=None):
+    """movesモジュールの指し手生成（探索で使う生成）"""
+    return list(generate_moves(state, player))
+
+
+GENERATORS = {
+    "reference": reference_moves,
+    "engine": engine_moves,
+}
+
+
+def engine_omits(state, move):
+    """moves.generate_movesが意図して生成しない手（成れる歩・角・飛の成らない手）かどうか"""
+    if is_drop(move) or is_promotion(move):
+        return False
+    from_row, from_col = move_from(move)
+    piece = state.grid[from_row][from_col]
+    return piece.name in ALWAYS_PROMOTE_PIECES and can_promote(piece, from_row, move_to(move)[0])
+
+
+def with_omitted(generator, omits=engine_omits):
+    """generatorの手に、omitsに当てはまる意図して生成しない手（成る手の成らない版）を戻した指し手生成
+
+    局面集の期待値は成らない手もすべて数えた値なので、moves.generate_movesのように一部の成らない手を
+    生成しない指し手生成は、その手を戻してから数えると期待値と比べられる。
+    """
+    def generate(state, player=None):
+        moves = generator(state, player)
+        return moves + [move & ~PROMOTE_FLAG for move in moves
+                        if is_promotion(move) and omits(state, move & ~PROMOTE_FLAG)]
+    return generate
+
+
+def legal_moves(state, generator=reference_moves):
+    """generatorの疑似合法手から、自玉を王手にさらす手と打ち歩詰めを除いた合法手を返す"""
+    player = state.player_turn
+    legal = []
+    for move in generator(state, player):
+        undo = state.make_move(move)
+        try:
+            if state.is_in_check(player):
+                continue
+            if is_drop(move) and drop_piece_name(move) == "pawn" and _is_mated(state, 3 - player, generator):
+                continue  # 打ち歩詰め
+            legal.append(move)
+        finally:
+            state.unmake_move(move, undo)
+    return legal
+
+
+def _is_mated(state, player, generator):
+    """playerが王手されていて合法手がないかどうか"""
+    if not state.is_in_check(player):
+        return False
+    original_turn = state.player_turn
+    state.player_turn = player
+    try:
+        return not legal_moves(state, generator)
+    finally:
+        state.player_turn = original_turn
+
+
+# --- perft ---
+def perft(state, depth, generator=reference_moves):
+    """深さdepthの末端の局面数"""
+    moves = legal_moves(state, generator)
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    player = state.player_turn
+    for move in moves:
+        undo = state.make_move(move)
+        state.player_turn = 3 - player
+        nodes += perft(state, depth - 1, generator)
+        state.player_turn = player
+        state.unmake_move(move, undo)
+    return nodes
+
+
+def divide(state, depth, generator=reference_moves):
+    """初手ごとの深さdepthの末端の局面数 {USI形式の手: 局面数}"""
+    result = {}
+    player = state.player_turn
+    for move in legal_moves(state, generator):
+        undo = state.make_move(move)
+        state.player_turn = 3 - player
+        result[move_to_usi(move)] = perft(state, depth - 1, generator)
+        state.player_turn = player
+        state.unmake_move(move, undo)
+    return result
+
+
+def compare(state, depth, generator, omits=engine_omits):
+    """深さdepthまでのすべての局面でgeneratorの合法手を参照と照合し、食い違いのリストを返す
+
+    omitsに当てはまる参照の手（意図して生成しない手）は比較から除く。
+    """
+    mismatches = []
+    reference = legal_moves(state, reference_moves)
+    expected = {move for move in reference if not (omits and omits(state, move))}
+    actual = legal_moves(state, generator)
+    if len(actual) != len(set(actual)) or set(actual) != expected:
+        mismatches.append({
+            "sfen": to_sfen(state),
+            "missing": sorted(move_to_usi(move) for move in expected - set(actual)),
+            "extra": sorted(move_to_usi(move) for move in set(actual) - expected),
+            "duplicates": len(actual) - len(set(actual)),
+        })
+    if depth > 1:
+        player = state.player_turn
+        for move in reference:
+            undo = state.make_move(move)
+            state.player_turn = 3 - player
+            mismatches.extend(compare(state, depth - 1, generator, omits))
+            state.player_turn = player
+            state.unmake_move(move, undo)
+    return mismatches
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="指し手生成のperft（末端の局面数）を数える")
+    parser.add_argument("depth", type=int, help="探索する深さ")
+    parser.add_argument("--sfen", help="開始局面のSFEN（省略時は初期配置）")
+    parser.add_argument("--corpus", action="store_true", help="組み込みの局面集を期待値と照合する")
+    parser.add_argument("--divide", action="store_true", help="初手ごとの局面数を表示する")
+    parser.add_argument("--generator", choices=sorted(GENERATORS), default="reference", help="数えるのに使う指し手生成")
+    parser.add_argument("--compare", choices=sorted(GENERATORS), help="各局面でこの指し手生成を参照と照合する")
+    args = parser.parse_args(argv)
+    generator = GENERATORS[args.generator]
+
+    if args.compare:
+        state = parse_sfen(args.sfen or START_SFEN)
+        mismatches, elapsed = _timed(compare, state, args.depth, GENERATORS[args.compare])
+        for mismatch in mismatches[:20]:
+            print(f"食い違い: {mismatch}")
+        print(f"照合: 深さ{args.depth} 食い違い{len(mismatches)}件 ({elapsed:.2f}秒)")
+        return 1 if mismatches else 0
+
+    if args.corpus:
+        if args.generator != "reference":
+            # 期待値は成らない手も数えた値なので、意図して生成しない手を戻して数える
+            generator = with_omitted(generator)
+            print(f"参考: {args.generator}が生成しない成らない手を戻して数える（生成そのものの照合は --compare）")
+        failed = 0
+        for name, sfen, expected in PERFT_CORPUS:
+            for depth in range(1, args.depth + 1):
+                if depth not in expected:
+                    continue
+                nodes, elapsed = _timed(perft, parse_sfen(sfen), depth, generator)
+                status = "OK" if nodes == expected[depth] else f"NG（期待値 {expected[depth]}）"
+                failed += nodes != expected[depth]
+                print(f"{name} 深さ{depth}: {nodes} {status} ({elapsed:.2f}秒, {nodes / max(elapsed, 1e-9):.0f} nodes/秒)")
+        return 1 if failed else 0
+
+    state = parse_sfen(args.sfen) if args.sfen else GameState(seed=0)
+    if args.divide:
+        result, elapsed = _timed(divide, state, args.depth, generator)
+        for usi, nodes in sorted(result.items()):
+            print(f"{usi}: {nodes}")
+        nodes = sum(result.values())
+        print(f"手の数: {len(result)}")
+    else:
+        nodes, elapsed = _timed(perft, state, args.depth, generator)
+    print(f"perft({args.depth}) = {nodes} ({elapsed:.2f}秒, {nodes / max(elapsed, 1e-9):.0f} nodes/秒)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,68 +1,130 @@
-import pygame
 from constants import CELL_SIZE
+from ui.text_cache import render_text
 
-class Piece:
-    def __init__(self, name, kanji, is_promoted=False, player=1):
+# 持ち駒になる駒の種類（持ち駒の枚数配列はこの並び順）
+HAND_PIECE_TYPES = ["pawn", "lance", "knight", "silver", "gold", "bishop", "rook"]
+HAND_INDEX = {name: i for i, name in enumerate(HAND_PIECE_TYPES)}
+
+# 駒の種類ごとの漢字表記（王/玉はプレイヤーで異なるのでcreate_pieceで扱う）
+PIECE_KANJI = {
+    "pawn": "歩",
+    "lance": "香",
+    "knight": "桂",
+    "silver": "銀",
+    "gold": "金",
+    "bishop": "角",
+    "rook": "飛"
+}
+
+# 成った時の漢字
+PROMOTED_KANJI = {
+    "pawn": "と",
+    "lance": "杏",
+    "knight": "圭",
+    "silver": "全",
+    "bishop": "馬",
+    "rook": "龍"
+}
+
+# 成った後の動きタイプ（成った歩・香・桂・銀は金と同じ動き）
+PROMOTED_MOVE_TYPES = {
+    "pawn": "gold",
+    "lance": "gold",
+    "knight": "gold",
+    "silver": "gold",
+    "bishop": "horse",  # 馬
+    "rook": "dragon"  # 龍
+}
+
+class PieceType:
+    """駒の種類ごとに共有する変更しないデータ（フライウェイト。piece_typeで取得する）"""
+    __slots__ = ("name", "kanji", "player", "promoted_kanji", "move_types", "image_keys")
+    
+    def __init__(self, name, kanji, player):
         self.name = name
         self.kanji = kanji
+        self.player = player
+        self.promoted_kanji = PROMOTED_KANJI.get(name, kanji)
+        self.move_types = (name, PROMOTED_MOVE_TYPES.get(name, name))  # 成っていない/成った時の動きタイプ
+        self.image_keys = ((name, player, False), (name, player, True))  # 駒の画像の辞書のキー
+        
+    def __reduce__(self):
+        # 別プロセスで復元するときも共有のインスタンスを使う
+        return (piece_type, (self.name, self.kanji, self.player))
+
+
+_piece_types = {}  # (駒の種類, 漢字, プレイヤー) -> PieceType
+
+def piece_type(name, kanji, player):
+    """駒の種類のフライウェイトを返す（同じ組み合わせには同じインスタンスを返す）"""
+    key = (name, kanji, player)
+    shared = _piece_types.get(key)
+    if shared is None:
+        shared = PieceType(name, kanji, player)
+        _piece_types[key] = shared
+    return shared
+
+
+# 効果のない駒が共有する空の辞書（変更しない。効果を適用するときに駒ごとの辞書を作る）
+NO_EFFECTS = {}
+
+class Effect:
+    """駒にかかっている特殊効果（効果名・値・効果が切れるターン）"""
+    __slots__ = ("name", "value", "expires")
+    
+    def __init__(self, name, value=True, expires=None):
+        self.name = name
+        self.value = value
+        self.expires = expires  # このターン数になったら切れる（Noneは切れない）
+
+
+class Piece:
+    # 駒の種類ごとに変わらないデータはPieceTypeで共有し、駒ごとの状態だけを持つ
+    __slots__ = ("type", "name", "player", "is_promoted", "selected", "moved", "effects")
+    
+    def __init__(self, name, kanji, is_promoted=False, player=1):
+        self.type = piece_type(name, kanji, player)
+        self.name = name  # 指し手生成で頻繁に参照するので駒にも持つ
         self.is_promoted = is_promoted
         self.player = player  # 1: 先手(下側), 2: 後手(上側)
         self.selected = False
         self.moved = False
         
         # 特殊効果の状態を管理する変数
-        self.effects = {}  # 適用されている効果を辞書で管理
+        self.effects = NO_EFFECTS  # 効果名 -> Effect（持続時間の管理はBoardの期限切れキューが行う）
+        
+    @property
+    def kanji(self):
+        return self.type.kanji
         
-        # 成った時の漢字
-        self.promoted_kanji = {
-            "pawn": "と",
-            "lance": "杏",
-            "knight": "圭",
-            "silver": "全",
-            "bishop": "馬",
-            "rook": "龍"
-        }.get(name, kanji)
+    @property
+    def promoted_kanji(self):
+        """成った時の漢字"""
+        return self.type.promoted_kanji
+        
+    def __getstate__(self):
+        # 効果のない駒は共有の空の辞書に戻せるようNoneにする
+        return (self.type, self.name, self.player, self.is_promoted, self.selected, self.moved,
+                self.effects or None)
+        
+    def __setstate__(self, state):
+        self.type, self.name, self.player, self.is_promoted, self.selected, self.moved, effects = state
+        self.effects = effects or NO_EFFECTS
 
-    def draw(self, screen, x, y, piece_images, font, selected_color):
-        # 画像がある場合は画像を使用
-        image_key = (self.name, self.player, self.is_promoted)
-        if image_key in piece_images:
-            piece_image = piece_images[image_key]
-            # 画像のサイズをCELL_SIZEに合わせる
-            scaled_image = pygame.transform.scale(piece_image, (CELL_SIZE, CELL_SIZE))
-            screen.blit(scaled_image, (x, y))
-        else:
-            # 画像がない場合は従来の描画方法を使用
-            # 駒の背景（木の色）
-            piece_rect = pygame.Rect(x, y, CELL_SIZE, CELL_SIZE)
-            pygame.draw.rect(screen, (210, 180, 140), piece_rect)
-            pygame.draw.rect(screen, (0, 0, 0), piece_rect, 1)
-            
-            # 駒の文字
-            text_color = (0, 0, 0) if self.player == 1 else (200, 0, 0)
-            display_kanji = self.promoted_kanji if self.is_promoted else self.kanji
-            text = font.render(display_kanji, True, text_color)
-            text_rect = text.get_rect(center=(x + CELL_SIZE // 2, y + CELL_SIZE // 2))
-            screen.blit(text, text_rect)
+    def draw(self, screen, x, y, sprites, font, turn=None):
+        """ui.piece_sprites.PieceSpritesの合成済みの画像を描画する（選択中・強化中のハイライトを含む）"""
+        enhanced = self.has_effect('enhanced')
+        screen.blit(sprites.sprites[(self.type.image_keys[self.is_promoted], self.selected, enhanced)], (x, y),
+                    special_flags=sprites.blend_flags)
         
-        # 選択されている場合はハイライト
-        if self.selected:
-            highlight = pygame.Surface((CELL_SIZE, CELL_SIZE), pygame.SRCALPHA)
-            highlight.fill(selected_color)
-            screen.blit(highlight, (x, y))
-            
-        # 特殊効果の視覚表現
-        if 'enhanced' in self.effects and self.effects['enhanced']:
-            # 強化効果の表示（赤い輝き）
-            glow = pygame.Surface((CELL_SIZE, CELL_SIZE), pygame.SRCALPHA)
-            glow.fill((255, 0, 0, 50))
-            screen.blit(glow, (x, y))
-            
-            # 残りターン数を表示
-            if 'enhanced_duration' in self.effects:
-                duration_text = font.render(str(self.effects['enhanced_duration']), True, (255, 0, 0))
+        # 強化効果の残りターン数を表示
+        if enhanced:
+            expires = self.effects['enhanced'].expires
+            if expires is not None and turn is not None:
+                duration_text = render_text(font, str(expires - turn), (255, 0, 0))
                 small_text_rect = duration_text.get_rect(bottomright=(x + CELL_SIZE - 2, y + CELL_SIZE - 2))
                 screen.blit(duration_text, small_text_rect)
+                
     def get_possible_moves(self, board, pos):
         """駒の種類に応じた移動可能なマスのリストを返す"""
         row, col = pos
@@ -224,56 +286,13 @@ class Piece:
     def get_move_type(self):
         """現在の駒の動きタイプを返す（特殊効果を考慮）"""
         # 一時的な動きタイプが設定されている場合はそれを返す
-        if 'temp_move_type' in self.effects:
-            return self.effects['temp_move_type']
-        
-        # 通常の動きタイプを返す
-        if self.is_promoted:
-            if self.name in ["pawn", "lance", "knight", "silver"]:
-                return "gold"  # 成った歩、香、桂、銀は金と同じ動き
-            elif self.name == "bishop":
-                return "horse"  # 馬
-            elif self.name == "rook":
-                return "dragon"  # 龍
-        return self.name
-        
-    def apply_effect(self, effect_name, value=True, duration=1):
-        """駒に特殊効果を適用する"""
-        self.effects[effect_name] = value
-        self.effects[f"{effect_name}_duration"] = duration
-        self.effects[f"{effect_name}_new"] = True  # 新しく適用された効果のフラグ
+        move_type = self.effect_value('temp_move_type')
+        if move_type:
+            return move_type
         
-    def remove_effect(self, effect_name):
-        """駒から特殊効果を削除する"""
-        if effect_name in self.effects:
-            del self.effects[effect_name]
-            if f"{effect_name}_duration" in self.effects:
-                del self.effects[f"{effect_name}_duration"]
-                
-    def update_effects(self):
-        """ターン終了時に効果の持続時間を減らす"""
-        effects_to_remove = []
-        for effect_name in list(self.effects.keys()):
-            if effect_name.endswith("_duration"):
-                base_effect = effect_name[:-9]  # "_duration"の部分を除く
-                
-                # 新しく適用された効果かどうかを確認
-                new_effect_flag = f"{base_effect}_new"
-                if new_effect_flag in self.effects:
-                    # 新しく適用された効果の場合はフラグを削除するだけ
-                    del self.effects[new_effect_flag]
-                    print(f"{base_effect}効果が適用されました。次のターンからカウントダウンが始まります。")
-                else:
-                    # 既存の効果の場合は持続時間を減らす
-                    self.effects[effect_name] -= 1
-                    if self.effects[effect_name] <= 0:
-                        effects_to_remove.append(base_effect)
-                        effects_to_remove.append(effect_name)
+        # 通常の動きタイプを返す（成った歩、香、桂、銀は金と同じ動き）
+        return self.type.move_types[self.is_promoted]
         
-        for effect_name in effects_to_remove:
-            if effect_name in self.effects:
-                del self.effects[effect_name]
-                print(f"効果 {effect_name} が切れました")
     def get_possible_moves(self, board, pos):
         """駒の移動可能なマスのリストを返す（特殊効果を考慮）"""
         row, col = pos
@@ -283,7 +302,7 @@ class Piece:
         move_type = self.get_move_type()
         
         # 強化効果があるかどうか
-        enhanced = 'enhanced' in self.effects and self.effects['enhanced']
+        enhanced = self.has_effect('enhanced')
         
         # 歩兵
         if move_type == "pawn":
@@ -454,31 +473,43 @@ class Piece:
                         valid_moves.append((new_row, new_col))
         
         return valid_moves
-    def reset_effects(self):
-        """駒の特殊効果をすべてリセットする"""
-        self.effects = {}  # 効果をすべて削除
+    def has_effect(self, name):
+        """効果がかかっているか（値が偽の効果はかかっていないとみなす）"""
+        effect = self.effects.get(name)
+        return effect is not None and bool(effect.value)
         
-    def apply_effect(self, effect_name, value, duration=0):
-        """駒に特殊効果を適用する"""
-        self.effects[effect_name] = value
-        if duration > 0:
-            self.effects[f"{effect_name}_duration"] = duration
-            
-    def update_effects(self):
-        """ターン終了時に特殊効果の持続時間を更新する"""
-        effects_to_remove = []
+    def effect_value(self, name, default=None):
+        """効果の値を返す（かかっていなければdefault）"""
+        effect = self.effects.get(name)
+        return default if effect is None else effect.value
         
-        for effect_name, value in self.effects.items():
-            if effect_name.endswith("_duration"):
-                base_effect = effect_name[:-9]  # "_duration"の部分を除去
-                self.effects[effect_name] -= 1
-                
-                # 持続時間が0になったら効果を削除
-                if self.effects[effect_name] <= 0:
-                    effects_to_remove.append(base_effect)
-                    effects_to_remove.append(effect_name)
+    def apply_effect(self, effect):
+        """駒に特殊効果（Effect）を適用する。同じ名前の効果は置き換える
+
+        盤上の駒にはBoard.apply_effectを使う（局面のハッシュ値と期限切れキューも更新される）。
+        """
+        if self.effects is NO_EFFECTS:
+            self.effects = {}  # 最初の効果を適用するときに駒ごとの辞書を作る
+        self.effects[effect.name] = effect
         
-        # 期限切れの効果を削除
-        for effect_name in effects_to_remove:
-            if effect_name in self.effects:
-                del self.effects[effect_name]
+    def remove_effect(self, name):
+        """駒から特殊効果を削除し、削除したEffectを返す（なければNone）"""
+        if name not in self.effects:
+            return None
+        effect = self.effects.pop(name)
+        if not self.effects:
+            self.effects = NO_EFFECTS
+        return effect
+        
+    def reset_effects(self):
+        """駒の特殊効果をすべてリセットする"""
+        self.effects = NO_EFFECTS  # 効果をすべて削除
+
+
+def create_piece(name, player, is_promoted=False):
+    """駒の種類とプレイヤーから駒を作成する"""
+    if name == "king":
+        kanji = "王" if player == 1 else "玉"
+    else:
+        kanji = PIECE_KANJI[name]
+    return Piece(name, kanji, is_promoted=is_promoted, player=player)
@@ -1,7 +1,79 @@
 """
 将棋ゲームの特殊技を管理するモジュール
+
+技の効果は差分（delta）のリストで表し、Board.apply_deltaで盤面に反映する。
+  ("square", (row, col), 変更前の駒, 変更後の駒)
+  ("promote", (row, col), 変更前の成り状態, 変更後の成り状態)
+  ("hand", プレイヤー, 駒の種類, 枚数の増減)
+Board.undo_deltaで同じ差分を逆順に戻せるので、探索中の試行や棋譜の再生にも使える。
 """
-import random
+import itertools
+import math
+
+from pieces import create_piece
+
+
+def _outcome_distribution(candidates, weights, max_outcomes, rng, make_delta):
+    """候補（weightsは相対的な確率、Noneなら等確率）から効果の結果の一覧 [(確率, 差分)] を作る
+
+    候補がmax_outcomes個以下なら全て列挙し、多い場合はmax_outcomes個を確率に従って抽出する。
+    """
+    if not candidates:
+        return [(1.0, [])]  # 何も起こらない
+    if len(candidates) <= max_outcomes:
+        if weights is None:
+            weights = [1.0] * len(candidates)
+        total = sum(weights)
+        return [(weight / total, make_delta(candidate)) for candidate, weight in zip(candidates, weights)]
+    # 等確率なら重みの一覧を作らずに抽出する（重みが1.0ずつのときと同じ候補が選ばれる）
+    sampled = rng.choices(candidates, weights=weights, k=max_outcomes)
+    return [(1.0 / max_outcomes, make_delta(candidate)) for candidate in sampled]
+
+
+class Combinations:
+    """itemsからr個選ぶ組み合わせの列（itertools.combinationsと同じ順）
+
+    一覧を作らずに、長さと添字で組み合わせを取り出せるので、候補が多くてもrng.choicesで
+    直接抽出できる。
+    """
+
+    def __init__(self, items, r):
+        self.items = list(items)
+        self.r = r
+        self._len = math.comb(len(self.items), r)
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return itertools.combinations(self.items, self.r)
+
+    def __getitem__(self, index):
+        """辞書順でindex番目の組み合わせ"""
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError(index)
+        selected = []
+        n = len(self.items)
+        start = 0
+        for r in range(self.r, 0, -1):
+            # 先頭をitems[start]にする組み合わせの数ずつ飛ばす
+            while True:
+                count = math.comb(n - start - 1, r - 1)
+                if index < count:
+                    break
+                index -= count
+                start += 1
+            selected.append(self.items[start])
+            start += 1
+        return tuple(selected)
+
+
+def affected_positions(delta):
+    """差分で変化したマスのリスト（エフェクト表示用）"""
+    return [change[1] for change in delta if change[0] in ("square", "promote")]
+
 
 class SpecialMove:
     def __init__(self, name, description, duration=1, icon=None):
@@ -13,12 +85,38 @@ class SpecialMove:
     def can_use(self, board, player):
         """技が使用可能かどうかを判定する"""
         # 既に使用済みの場合は使用不可
-        if is_move_used(self.name):
+        if board.special_state.is_used(player, self.name):
             return False
             
         # デフォルトでは常に使用可能
         return True
         
+    def _candidates(self, board, player):
+        """効果の候補と相対的な確率（Noneなら等確率）を返す（継承先で実装）"""
+        return [], None
+        
+    def _delta(self, board, candidate):
+        """候補の効果を差分にする（継承先で実装）"""
+        return []
+        
+    def _choose(self, board, player):
+        """効果の候補を対局の乱数（board.rng）で確率に従って1つ選ぶ（候補がなければNone）"""
+        candidates, weights = self._candidates(board, player)
+        if not candidates:
+            return None
+        return board.rng.choices(candidates, weights=weights)[0]
+        
+    def outcomes(self, board, player, max_outcomes=16, rng=None):
+        """効果の結果の確率分布 [(確率, 差分)] を返す（探索のチャンスノード用）
+
+        結果が多い技はmax_outcomes個をrng（省略時は対局の乱数）で抽出する。
+        """
+        if rng is None:
+            rng = board.rng
+        candidates, weights = self._candidates(board, player)
+        return _outcome_distribution(candidates, weights, max_outcomes, rng,
+                                     lambda candidate: self._delta(board, candidate))
+        
     def execute(self, board, player, target_pos=None):
         """技の効果を実行する"""
         # 継承先で実装
@@ -48,41 +146,43 @@ class Menko(SpecialMove):
     
     def can_use(self, board, player):
         # 盤上に王と金以外の駒が3枚以上あるか確認
+        return len(self._get_valid_pieces(board)) >= 3
+    
+    def _get_valid_pieces(self, board):
+        """裏返せる駒（王と金以外）の位置のリストを返す"""
         valid_pieces = []
         for row in range(9):
             for col in range(9):
                 piece = board.grid[row][col]
                 if piece and piece.name not in ["king", "gold"]:
                     valid_pieces.append((row, col))
-        
-        return len(valid_pieces) >= 3
+        return valid_pieces
+    
+    def _candidates(self, board, player):
+        # 3枚の組み合わせは等確率（組み合わせの一覧は作らず、選んだものだけを取り出す）
+        return Combinations(self._get_valid_pieces(board), 3), None
+    
+    def _delta(self, board, selected):
+        delta = []
+        for row, col in selected:
+            promoted = board.grid[row][col].is_promoted
+            delta.append(("promote", (row, col), promoted, not promoted))
+        return delta
     
     def execute(self, board, player, target_pos=None):
-        # 盤上の王と金以外の駒をリストアップ
-        valid_pieces = []
-        for row in range(9):
-            for col in range(9):
-                piece = board.grid[row][col]
-                if piece and piece.name not in ["king", "gold"]:
-                    valid_pieces.append((row, col))
-        
         # 3枚以上ない場合は効果発動しない
-        if len(valid_pieces) < 3:
+        if len(self._get_valid_pieces(board)) < 3:
             return False
         
-        # ランダムに3枚選択
-        selected_pieces = random.sample(valid_pieces, 3)
+        # ランダムに3枚選択して裏返す（成っていない駒は成る、成っている駒は元に戻る）
+        delta = self._delta(board, self._choose(board, player))
+        board.apply_delta(delta)
         
         # 効果メッセージ
         print(f"{self.name}")
-        
-        # 選択された駒を裏返す（成り/成り戻し）
-        for row, col in selected_pieces:
+        for kind, (row, col), before, after in delta:
             piece = board.grid[row][col]
-            if piece:
-                # 成っていない駒は成る、成っている駒は元に戻る
-                piece.is_promoted = not piece.is_promoted
-                print(f"位置 ({row+1},{col+1}) の {piece.kanji} が{'成った' if piece.is_promoted else '元に戻った'}！")
+            print(f"位置 ({row+1},{col+1}) の {piece.kanji} が{'成った' if after else '元に戻った'}！")
         
         # イベント発火（表示はこのイベントに反応する形で行う）
         if board.event_manager:
@@ -91,7 +191,7 @@ class Menko(SpecialMove):
                 {
                     "move_name": self.name,
                     "message": f"{self.name}の効果が発動！ 3枚の駒が裏返りました！",
-                    "affected_positions": selected_pieces
+                    "affected_positions": affected_positions(delta)
                 }
             )
         
@@ -121,83 +221,81 @@ class Toppuu(SpecialMove):
                 if piece and piece.name != "king":
                     # 左に空きマスがあるか確認
                     if col > 0 and board.grid[row][col-1] is None:
-                        # 歩の場合、移動後に二歩にならないか確認
+                        # 歩の場合、左に移動した場合に同じ筋に自分の歩がないか確認
                         if piece.name == "pawn" and not piece.is_promoted:
-                            # 左に移動した場合に同じ筋に自分の歩がないか確認
-                            has_pawn_in_same_column = False
-                            for r in range(9):
-                                if r != row and board.grid[r][col-1] and board.grid[r][col-1].name == "pawn" and \
-                                   board.grid[r][col-1].player == piece.player and not board.grid[r][col-1].is_promoted:
-                                    has_pawn_in_same_column = True
-                                    break
-                            if not has_pawn_in_same_column:
+                            if not board.has_pawn_on_file(piece.player, col-1):
                                 valid_pieces.append((row, col, "left"))
                         else:
                             valid_pieces.append((row, col, "left"))
                     
                     # 右に空きマスがあるか確認
                     if col < 8 and board.grid[row][col+1] is None:
-                        # 歩の場合、移動後に二歩にならないか確認
+                        # 歩の場合、右に移動した場合に同じ筋に自分の歩がないか確認
                         if piece.name == "pawn" and not piece.is_promoted:
-                            # 右に移動した場合に同じ筋に自分の歩がないか確認
-                            has_pawn_in_same_column = False
-                            for r in range(9):
-                                if r != row and board.grid[r][col+1] and board.grid[r][col+1].name == "pawn" and \
-                                   board.grid[r][col+1].player == piece.player and not board.grid[r][col+1].is_promoted:
-                                    has_pawn_in_same_column = True
-                                    break
-                            if not has_pawn_in_same_column:
+                            if not board.has_pawn_on_file(piece.player, col+1):
                                 valid_pieces.append((row, col, "right"))
                         else:
                             valid_pieces.append((row, col, "right"))
         return valid_pieces
     
-    def execute(self, board, player, target_pos=None):
-        # 横に空きマスがある駒のリストを取得
+    def _candidates(self, board, player):
+        # 方向は左右が等確率、その方向に動ける駒から最大3枚の組み合わせが等確率
         valid_pieces = self._get_valid_pieces(board)
+        if not valid_pieces:
+            return [], None
+        candidates = []
+        weights = []
+        for direction in ("left", "right"):
+            filtered_pieces = [(row, col) for row, col, dir in valid_pieces if dir == direction]
+            if not filtered_pieces:
+                candidates.append((direction, ()))  # 何も起こらない
+                weights.append(0.5)
+                continue
+            combinations = list(itertools.combinations(filtered_pieces, min(3, len(filtered_pieces))))
+            for selected in combinations:
+                candidates.append((direction, selected))
+                weights.append(0.5 / len(combinations))
+        return candidates, weights
+    
+    def _delta(self, board, candidate):
+        direction, selected = candidate
+        delta = []
+        for row, col in selected:
+            piece = board.grid[row][col]
+            new_col = col - 1 if direction == "left" else col + 1
+            delta.append(("square", (row, new_col), None, piece))
+            delta.append(("square", (row, col), piece, None))
+        return delta
+    
+    def execute(self, board, player, target_pos=None):
+        # 横に空きマスがある駒と移動方向（左か右）をランダムに選択
+        candidate = self._choose(board, player)
         
         # 対象となる駒がない場合
-        if not valid_pieces:
+        if candidate is None:
             print(f"何も起こらなかった。")
             return True
         
-        # 移動方向をランダムに決定（左か右）
-        direction = random.choice(["left", "right"])
+        direction, selected = candidate
         direction_text = "左" if direction == "left" else "右"
         
-        # 選択した方向に移動可能な駒だけをフィルタリング
-        filtered_pieces = [(row, col, dir) for row, col, dir in valid_pieces if dir == direction]
-        
-        # 対象となる駒がない場合
-        if not filtered_pieces:
+        # 選択した方向に移動可能な駒がない場合
+        if not selected:
             print(f"何も起こらなかった")
             return True
         
-        # 最大3枚をランダムに選択（対象が3枚未満の場合は全て選択）
-        num_to_select = min(3, len(filtered_pieces))
-        selected_pieces = random.sample(filtered_pieces, num_to_select)
+        # 選択された駒を移動
+        delta = self._delta(board, candidate)
+        board.apply_delta(delta)
         
         # 効果メッセージ
         print(f"{self.name}")
+        for row, col in selected:
+            new_col = col - 1 if direction == "left" else col + 1
+            print(f"位置 ({row+1},{col+1}) の {board.grid[row][new_col].kanji} が{direction_text}に流された")
         
-        # 移動した駒の位置を記録
-        moved_positions = []
-        
-        # 選択された駒を移動
-        for row, col, dir in selected_pieces:
-            piece = board.grid[row][col]
-            if piece:
-                # 移動先の列を計算
-                new_col = col - 1 if dir == "left" else col + 1
-                
-                # 駒を移動
-                board.grid[row][new_col] = piece
-                board.grid[row][col] = None
-                
-                print(f"位置 ({row+1},{col+1}) の {piece.kanji} が{direction_text}に流された")
-                
-                # 移動後の位置を記録
-                moved_positions.append((row, new_col))
+        # 移動後の位置
+        moved_positions = [change[1] for change in delta if change[3] is not None]
         
         # イベント発火（表示はこのイベントに反応する形で行う）
         if board.event_manager:
@@ -230,77 +328,65 @@ class HengeStaff(SpecialMove):
                     return True
         return False
     
-    def execute(self, board, player, target_pos=None):
-        # 盤上の王以外の駒をリストアップ
+    def _get_valid_pieces(self, board):
+        """変化させられる駒（王以外）の位置のリストを返す"""
         valid_pieces = []
         for row in range(9):
             for col in range(9):
                 piece = board.grid[row][col]
                 if piece and piece.name != "king":
                     valid_pieces.append((row, col))
+        return valid_pieces
+    
+    def _get_new_piece_types(self, board, row, col):
+        """変化後の駒の種類の候補（元の駒の種類と、二歩になる歩を除く）"""
+        original_piece = board.grid[row][col]
+        piece_types = []
+        for piece_type in ["pawn", "lance", "knight", "silver", "gold", "bishop", "rook"]:
+            if piece_type == original_piece.name:
+                continue
+            if piece_type == "pawn" and board.has_pawn_on_file(original_piece.player, col, ignore=[(row, col)]):
+                continue
+            piece_types.append(piece_type)
+        return piece_types
+    
+    def _candidates(self, board, player):
+        # 駒の選択が等確率、変化後の駒の種類は候補の中で等確率
+        valid_pieces = self._get_valid_pieces(board)
+        candidates = []
+        weights = []
+        for row, col in valid_pieces:
+            piece_types = self._get_new_piece_types(board, row, col)
+            for piece_type in piece_types:
+                candidates.append((row, col, piece_type))
+                weights.append(1.0 / (len(valid_pieces) * len(piece_types)))
+        return candidates, weights
+    
+    def _delta(self, board, candidate):
+        row, col, piece_type = candidate
+        original_piece = board.grid[row][col]
+        return [("square", (row, col), original_piece, create_piece(piece_type, original_piece.player))]
+    
+    def execute(self, board, player, target_pos=None):
+        # 盤上の王以外の駒からランダムに1枚選び、変化後の駒をランダムに決定
+        # （元の駒の種類と二歩になる歩を除く）
+        candidate = self._choose(board, player)
         
         # 対象となる駒がない場合
-        if not valid_pieces:
+        if candidate is None:
             print("何も起こらなかった")
             return True
         
         # 技発動メッセージ
         print(f"{self.name}")
         
-        # ランダムに1枚選択
-        selected_pos = random.choice(valid_pieces)
-        row, col = selected_pos
-        original_piece = board.grid[row][col]
-        
-        # 変更可能な駒の種類（王と元の駒を除く）
-        piece_types = ["pawn", "lance", "knight", "silver", "gold", "bishop", "rook"]
-        if original_piece.name in piece_types:
-            piece_types.remove(original_piece.name)
-        
-        # 変更後の駒をランダムに決定
-        while True:
-            new_piece_type = random.choice(piece_types)
-            
-            # 歩の場合は二歩チェック
-            if new_piece_type == "pawn":
-                # 同じ筋に同じプレイヤーの歩があるかチェック
-                has_pawn_in_same_column = False
-                for r in range(9):
-                    if r != row and board.grid[r][col] and board.grid[r][col].name == "pawn" and \
-                       board.grid[r][col].player == original_piece.player and not board.grid[r][col].is_promoted:
-                        has_pawn_in_same_column = True
-                        break
-                
-                if has_pawn_in_same_column:
-                    # 二歩になる場合は別の駒を選択
-                    continue
-            
-            # 問題なければループを抜ける
-            break
-        
-        # 駒の漢字表記
-        kanji_map = {
-            "pawn": "歩",
-            "lance": "香",
-            "knight": "桂",
-            "silver": "銀",
-            "gold": "金",
-            "bishop": "角",
-            "rook": "飛"
-        }
-        
-        # 元の駒の情報を保存
-        original_player = original_piece.player
-        original_name = original_piece.name
-        original_kanji = original_piece.kanji
-        
         # 新しい駒を作成して配置
-        from pieces import Piece
-        new_piece = Piece(new_piece_type, kanji_map[new_piece_type], is_promoted=False, player=original_player)
-        board.grid[row][col] = new_piece
+        delta = self._delta(board, candidate)
+        kind, (row, col), original_piece, new_piece = delta[0]
+        board.apply_delta(delta)
         
         # 効果メッセージ
-        print(f"位置 ({row+1},{col+1}) の {original_kanji} が {new_piece.kanji} に変化した")
+        print(f"位置 ({row+1},{col+1}) の {original_piece.kanji} が {new_piece.kanji} に変化した")
         
         # イベント発火（表示はこのイベントに反応する形で行う）
         if board.event_manager:
@@ -308,8 +394,8 @@ class HengeStaff(SpecialMove):
                 "special_move_activated", 
                 {
                     "move_name": self.name,
-                    "message": f"{self.name}の効果が発動！ {original_kanji}が{new_piece.kanji}に変化しました！",
-                    "affected_positions": [(row, col)]
+                    "message": f"{self.name}の効果が発動！ {original_piece.kanji}が{new_piece.kanji}に変化しました！",
+                    "affected_positions": affected_positions(delta)
                 }
             )
         
@@ -341,97 +427,62 @@ class Teleporter(SpecialMove):
     
     def _check_nifu(self, board, pos1, pos2):
         """入れ替えた後に二歩になるかチェック"""
-        row1, col1 = pos1
-        row2, col2 = pos2
-        piece1 = board.grid[row1][col1]
-        piece2 = board.grid[row2][col2]
+        piece1 = board.grid[pos1[0]][pos1[1]]
+        piece2 = board.grid[pos2[0]][pos2[1]]
         
-        # どちらかが歩でない場合は二歩にならない
-        if piece1.name != "pawn" or piece1.is_promoted or piece2.name != "pawn" or piece2.is_promoted:
-            return False
-            
-        # 同じ列でない場合は二歩にならない
-        if col1 != col2:
-            return False
-            
-        # 同じプレイヤーの駒でない場合は二歩にならない
-        if piece1.player != piece2.player:
-            return False
-            
-        # 同じプレイヤーの歩が同じ列に2枚以上ある場合は二歩になる
-        return True
+        # 移動する歩ごとに、移動先の筋に自分の歩が残っていないか確認（入れ替える2マスの駒は数えない）
+        for piece, (row, col) in ((piece1, pos2), (piece2, pos1)):
+            if piece.name == "pawn" and not piece.is_promoted:
+                if board.has_pawn_on_file(piece.player, col, ignore=[pos1, pos2]):
+                    return True
+        return False
+    
+    def _candidates(self, board, player):
+        # 二歩にならない2枚の組み合わせが等確率
+        pairs = [
+            (pos1, pos2) for pos1, pos2 in itertools.combinations(self._get_valid_pieces(board), 2)
+            if not self._check_nifu(board, pos1, pos2)
+        ]
+        return pairs, None
+    
+    def _delta(self, board, pair):
+        pos1, pos2 = pair
+        piece1 = board.grid[pos1[0]][pos1[1]]
+        piece2 = board.grid[pos2[0]][pos2[1]]
+        return [("square", pos1, piece1, piece2), ("square", pos2, piece2, piece1)]
     
     def execute(self, board, player, target_pos=None):
         # 技発動メッセージ
         print(f"{self.name}")
         
-        # 入れ替え可能な駒のリストを取得
-        valid_pieces = self._get_valid_pieces(board)
+        # 二歩にならない組み合わせからランダムに2枚選択
+        pair = self._choose(board, player)
         
-        # 対象となる駒が2枚未満の場合
-        if len(valid_pieces) < 2:
+        # 入れ替え可能な組み合わせがない場合
+        if pair is None:
             print(f"何も起こらなかった")
             return True
         
-        # 入れ替え可能な組み合わせを見つける
-        max_attempts = 50  # 最大試行回数
-        for _ in range(max_attempts):
-            # ランダムに2枚選択
-            pos1, pos2 = random.sample(valid_pieces, 2)
-            row1, col1 = pos1
-            row2, col2 = pos2
-            piece1 = board.grid[row1][col1]
-            piece2 = board.grid[row2][col2]
-            
-            # 二歩チェック
-            if self._check_nifu(board, pos1, pos2):
-                continue  # 二歩になる場合は別の組み合わせを試す
-                
-            # 歩の場合、入れ替え後に二歩にならないかチェック
-            if piece1.name == "pawn" and not piece1.is_promoted:
-                # 同じ筋に同じプレイヤーの歩があるかチェック
-                has_pawn_in_same_column = False
-                for r in range(9):
-                    if r != row2 and board.grid[r][col2] and board.grid[r][col2].name == "pawn" and \
-                       board.grid[r][col2].player == piece1.player and not board.grid[r][col2].is_promoted:
-                        has_pawn_in_same_column = True
-                        break
-                if has_pawn_in_same_column:
-                    continue  # 二歩になる場合は別の組み合わせを試す
-            
-            if piece2.name == "pawn" and not piece2.is_promoted:
-                # 同じ筋に同じプレイヤーの歩があるかチェック
-                has_pawn_in_same_column = False
-                for r in range(9):
-                    if r != row1 and board.grid[r][col1] and board.grid[r][col1].name == "pawn" and \
-                       board.grid[r][col1].player == piece2.player and not board.grid[r][col1].is_promoted:
-                        has_pawn_in_same_column = True
-                        break
-                if has_pawn_in_same_column:
-                    continue  # 二歩になる場合は別の組み合わせを試す
-            
-            # 入れ替え可能な組み合わせが見つかった
-            # 駒を入れ替え
-            board.grid[row1][col1], board.grid[row2][col2] = board.grid[row2][col2], board.grid[row1][col1]
-            
-            # 効果メッセージ
-            print(f"位置 ({row1+1},{col1+1}) の {piece1.kanji} と位置 ({row2+1},{col2+1}) の {piece2.kanji} が入れ替わった")
-            
-            # イベント発火（表示はこのイベントに反応する形で行う）
-            if board.event_manager:
-                board.event_manager.dispatch(
-                    "special_move_activated", 
-                    {
-                        "move_name": self.name,
-                        "message": f"{self.name}の効果が発動！ {piece1.kanji}と{piece2.kanji}が入れ替わりました！",
-                        "affected_positions": [(row1, col1), (row2, col2)]
-                    }
-                )
-            
-            return True
+        # 駒を入れ替え
+        delta = self._delta(board, pair)
+        (row1, col1), (row2, col2) = pair
+        piece1, piece2 = delta[0][2], delta[1][2]
+        board.apply_delta(delta)
+        
+        # 効果メッセージ
+        print(f"位置 ({row1+1},{col1+1}) の {piece1.kanji} と位置 ({row2+1},{col2+1}) の {piece2.kanji} が入れ替わった")
+        
+        # イベント発火（表示はこのイベントに反応する形で行う）
+        if board.event_manager:
+            board.event_manager.dispatch(
+                "special_move_activated", 
+                {
+                    "move_name": self.name,
+                    "message": f"{self.name}の効果が発動！ {piece1.kanji}と{piece2.kanji}が入れ替わりました！",
+                    "affected_positions": affected_positions(delta)
+                }
+            )
         
-        # 入れ替え可能な組み合わせが見つからなかった場合
-        print(f"何も起こらなかった")
         return True
 
 
@@ -452,25 +503,35 @@ class KomaOchi(SpecialMove):
                     return True
         return False
     
-    def execute(self, board, player, target_pos=None):
-        # 技発動メッセージ
-        print(f"{self.name}")
-        
-        # 盤上の王以外の駒をリストアップ
+    def _get_valid_pieces(self, board):
+        """消滅させられる駒（王以外）の位置のリストを返す"""
         valid_pieces = []
         for row in range(9):
             for col in range(9):
                 piece = board.grid[row][col]
                 if piece and piece.name != "king":
                     valid_pieces.append((row, col))
+        return valid_pieces
+    
+    def _candidates(self, board, player):
+        # 駒の選択が等確率
+        return self._get_valid_pieces(board), None
+    
+    def _delta(self, board, pos):
+        return [("square", pos, board.grid[pos[0]][pos[1]], None)]
+    
+    def execute(self, board, player, target_pos=None):
+        # 技発動メッセージ
+        print(f"{self.name}")
+        
+        # 盤上の王以外の駒からランダムに1枚選択
+        selected_pos = self._choose(board, player)
         
         # 対象となる駒がない場合
-        if not valid_pieces:
+        if selected_pos is None:
             print(f"何も起こらなかった")
             return True
         
-        # ランダムに1枚選択
-        selected_pos = random.choice(valid_pieces)
         row, col = selected_pos
         piece = board.grid[row][col]
         
@@ -479,7 +540,8 @@ class KomaOchi(SpecialMove):
         piece_player = "先手" if piece.player == 1 else "後手"
         
         # 駒を消滅させる
-        board.grid[row][col] = None
+        delta = self._delta(board, selected_pos)
+        board.apply_delta(delta)
         
         # 効果メッセージ
         print(f"位置 ({row+1},{col+1}) の {piece_player}の{piece_kanji} が消滅した")
@@ -491,7 +553,7 @@ class KomaOchi(SpecialMove):
                 {
                     "move_name": self.name,
                     "message": f"{self.name}の効果が発動！ {piece_kanji}が消滅しました！",
-                    "affected_positions": [(row, col)]
+                    "affected_positions": affected_positions(delta)
                 }
             )
         
@@ -507,25 +569,51 @@ AVAILABLE_SPECIAL_MOVES = [
     KomaOchi(),  # 駒落ち
 ]
 
-# 特殊技の使用状態を管理する辞書
-# キー: 技の名前、値: 使用済みかどうか（True/False）
-used_special_moves = {}
+# 技の名前 -> 使用状態のビット番号
+SPECIAL_MOVE_INDEX = {move.name: i for i, move in enumerate(AVAILABLE_SPECIAL_MOVES)}
 
 def get_special_moves():
     """利用可能な特殊技のリストを返す"""
     return AVAILABLE_SPECIAL_MOVES
 
-def reset_special_moves():
-    """特殊技の使用状態をリセットする"""
-    global used_special_moves
-    used_special_moves = {move.name: False for move in get_special_moves()}
 
-def mark_as_used(move_name):
-    """特殊技を使用済みとしてマークする"""
-    global used_special_moves
-    used_special_moves[move_name] = True
+class SpecialMoveState:
+    """1局分の特殊技の使用状態（プレイヤーごとの使用済みの技のビットマスク）
 
-def is_move_used(move_name):
-    """特殊技が使用済みかどうかを返す"""
-    global used_special_moves
-    return used_special_moves.get(move_name, False)
+    局面と一緒にコピー・比較・ハッシュでき、探索中に技の使用を取り消すこともできる。
+    技のインスタンス（AVAILABLE_SPECIAL_MOVES）は状態を持たないので全ての対局で共有する。
+    """
+    def __init__(self, used=None):
+        self.used = dict(used) if used else {1: 0, 2: 0}
+        
+    def is_used(self, player, move_name):
+        """playerが技を使用済みかどうか"""
+        return self.used[player] >> SPECIAL_MOVE_INDEX[move_name] & 1 == 1
+        
+    def mark_used(self, player, move_name):
+        """技を使用済みにする"""
+        self.used[player] |= 1 << SPECIAL_MOVE_INDEX[move_name]
+        
+    def unmark_used(self, player, move_name):
+        """技の使用を取り消す（探索で使用した技を戻す）"""
+        self.used[player] &= ~(1 << SPECIAL_MOVE_INDEX[move_name])
+        
+    def available_moves(self, board, player):
+        """playerが今使える技のリスト"""
+        return [
+            move for move in AVAILABLE_SPECIAL_MOVES
+            if not self.is_used(player, move.name) and move.can_use(board, player)
+        ]
+        
+    def copy(self):
+        return SpecialMoveState(self.used)
+        
+    def key(self):
+        """比較・ハッシュ用の値"""
+        return (self.used[1], self.used[2])
+        
+    def __eq__(self, other):
+        return isinstance(other, SpecialMoveState) and self.key() == other.key()
+        
+    def __hash__(self):
+        return hash(self.key())
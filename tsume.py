@@ -0,0 +1,748 @@
+"""
+df-pn（depth-first proof-number search）による詰み探索モジュール
+
+攻め方は王手のみ、玉方は王手を回避する合法手のみを生成し、局面ごとの
+証明数・反証数を Board.zobrist_key をキーとするハッシュ表に保存して再利用する。
+"""
+import time
+from array import array
+
+from moves import generate_moves, append_piece_moves, move_to, move_from, encode_drop, is_promotion
+
+INFINITE = 1 << 30  # 証明数・反証数の無限大
+AND_NODE_KEY = 0x5D1C3A79E2B4F681  # 玉方の手番の局面を区別するためのハッシュ値
+
+
+def _is_aligned(pos1, pos2):
+    """2つのマスが縦・横・斜めの同じ直線上にあるか"""
+    dr = pos1[0] - pos2[0]
+    dc = pos1[1] - pos2[1]
+    return dr == 0 or dc == 0 or abs(dr) == abs(dc)
+
+
+RAY_DIRECTIONS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+KNIGHT_OFFSETS = [(-2, -1), (-2, 1), (2, -1), (2, 1)]
+ORTHOGONAL = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+DIAGONAL = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+
+
+def _piece_reach(move_type, forward):
+    """動きタイプの(1マスだけ動ける方向の集合, 何マスでも動ける方向の集合)。forwardは前に進む行の向き"""
+    steps = {
+        "pawn": [(forward, 0)],
+        "knight": [(2 * forward, -1), (2 * forward, 1)],
+        "silver": [(forward, -1), (forward, 0), (forward, 1), (-forward, -1), (-forward, 1)],
+        "gold": [(forward, -1), (forward, 0), (forward, 1), (0, -1), (0, 1), (-forward, 0)],
+        "king": ORTHOGONAL + DIAGONAL,
+        "horse": ORTHOGONAL,
+        "dragon": DIAGONAL,
+    }.get(move_type, [])
+    slides = {
+        "lance": [(forward, 0)],
+        "bishop": DIAGONAL,
+        "rook": ORTHOGONAL,
+        "horse": DIAGONAL,
+        "dragon": ORTHOGONAL,
+    }.get(move_type, [])
+    return frozenset(steps), frozenset(slides)
+
+
+# (動きタイプ, プレイヤー) -> (1マスだけ動ける方向, 何マスでも動ける方向)（Piece.get_possible_movesと同じ動き。
+# 先手は row + 1 の方向に進む）
+PIECE_REACH = {
+    (move_type, player): _piece_reach(move_type, 1 if player == 1 else -1)
+    for move_type in ("pawn", "lance", "knight", "silver", "gold", "king", "bishop", "rook", "horse", "dragon")
+    for player in (1, 2)
+}
+
+
+def _on_board(row, col):
+    return 0 <= row < 9 and 0 <= col < 9
+
+
+# 王の周囲8マス（マス番号 row * 9 + col ごと）
+KING_NEIGHBORS = [
+    [(row + dr, col + dc) for dr, dc in RAY_DIRECTIONS if _on_board(row + dr, col + dc)]
+    for row in range(9) for col in range(9)
+]
+# 王に桂馬で王手をかけられるマス（攻め方のプレイヤーごと。先手の桂馬は row + 2 に進む）
+KNIGHT_CHECK_SQUARES = {
+    player: [
+        [(row - 2 * direction, col + dc) for dc in (-1, 1) if _on_board(row - 2 * direction, col + dc)]
+        for row in range(9) for col in range(9)
+    ]
+    for player, direction in ((1, 1), (2, -1))
+}
+
+
+def _reach(grid, reach, from_pos, to_pos, vacated=None):
+    """動きがreach（PIECE_REACHの値）の駒がfrom_posからto_posに動けるか（to_posに自分の駒がないとき）
+
+    vacatedのマスは空いているものとして間のマスを調べる（駒を動かす前に動かした後の利きを調べる用）。
+    """
+    steps, slides = reach
+    dr = to_pos[0] - from_pos[0]
+    dc = to_pos[1] - from_pos[1]
+    if (dr, dc) in steps:
+        return True
+    if not slides or not (dr == 0 or dc == 0 or abs(dr) == abs(dc)):
+        return False
+    step_r = (dr > 0) - (dr < 0)
+    step_c = (dc > 0) - (dc < 0)
+    if (step_r, step_c) not in slides:
+        return False
+    row, col = from_pos[0] + step_r, from_pos[1] + step_c
+    while row != to_pos[0] or col != to_pos[1]:
+        if grid[row][col] is not None and (row, col) != vacated:
+            return False
+        row += step_r
+        col += step_c
+    return True
+
+
+def reaches(board, from_pos, to_pos):
+    """from_posの駒がto_posに動けるか（to_pos in board.get_piece_moves(from_pos) と同じ判定）
+
+    駒の移動可能なマスをすべて計算せず、方向と間のマスだけを調べる。特殊効果のかかった駒は
+    動きが変わりうるのでget_piece_movesで確かめる。
+    """
+    grid = board.grid
+    piece = grid[from_pos[0]][from_pos[1]]
+    if piece.effects:
+        return to_pos in board.get_piece_moves(from_pos)
+    target = grid[to_pos[0]][to_pos[1]]
+    if target is not None and target.player == piece.player:
+        return False
+    return _reach(grid, PIECE_REACH[(piece.type.move_types[piece.is_promoted], piece.player)], from_pos, to_pos)
+
+
+def _discovered_check_squares(board, king_pos, attacker):
+    """attackerの駒のうち、動くと後ろの駒の利きが王に通りうる（開き王手になりうる）駒のマスの集合
+
+    王から各方向に見て最初の駒も次の駒もattackerの駒で、次の駒がその方向に何マスでも動ける
+    （特殊効果のかかった駒は動きが変わりうるので含める）ときの最初の駒のマス。
+    """
+    grid = board.grid
+    squares = set()
+    for dr, dc in RAY_DIRECTIONS:
+        row, col = king_pos[0] + dr, king_pos[1] + dc
+        front = None
+        while 0 <= row < 9 and 0 <= col < 9:
+            piece = grid[row][col]
+            if piece is not None:
+                if piece.player != attacker:
+                    break
+                if front is None:
+                    front = (row, col)
+                else:
+                    if piece.effects or \
+                            (-dr, -dc) in PIECE_REACH[(piece.type.move_types[piece.is_promoted], attacker)][1]:
+                        squares.add(front)
+                    break
+            row += dr
+            col += dc
+    return squares
+
+
+def _ray_attacker(board, pos, through, by_player):
+    """posからthroughの方向に見て最初に当たる駒がby_playerの駒でposに利いているか（開き王手の判定用）"""
+    step_r = (through[0] > pos[0]) - (through[0] < pos[0])
+    step_c = (through[1] > pos[1]) - (through[1] < pos[1])
+    grid = board.grid
+    row, col = pos[0] + step_r, pos[1] + step_c
+    while 0 <= row < 9 and 0 <= col < 9:
+        piece = grid[row][col]
+        if piece is not None:
+            return piece.player == by_player and reaches(board, (row, col), pos)
+        row += step_r
+        col += step_c
+    return False
+
+
+def attackers(board, pos, by_player, first_only=False):
+    """posに利いているby_playerの駒の位置のリスト
+
+    利きがありうるのは各方向で最初に当たる駒と桂馬の位置の駒だけなので、
+    それらの駒がposに動けるかだけを調べる（盤全体の利きは計算しない）。
+    """
+    grid = board.grid
+    row, col = pos
+    candidates = []
+    for dr, dc in RAY_DIRECTIONS:
+        r, c = row + dr, col + dc
+        while 0 <= r < 9 and 0 <= c < 9:
+            if grid[r][c] is not None:
+                candidates.append((r, c))
+                break
+            r += dr
+            c += dc
+    for dr, dc in KNIGHT_OFFSETS:
+        r, c = row + dr, col + dc
+        if 0 <= r < 9 and 0 <= c < 9 and grid[r][c] is not None:
+            candidates.append((r, c))
+
+    found = []
+    for square in candidates:
+        piece = grid[square[0]][square[1]]
+        if piece.player == by_player and reaches(board, square, pos):
+            found.append(square)
+            if first_only:
+                break
+    return found
+
+
+def _king_square_safe(board, king_pos, to_pos, by_player):
+    """王がking_posからto_posに動いた後、to_posにby_playerの駒が利いていないか
+
+    王を動かす前の盤面で、王が元いたマスを空きマスとして調べる（attackersと同じく各方向の
+    最初の駒と桂馬の位置の駒だけを見る）。特殊効果のかかった駒が関わるときは判定せずNoneを返す。
+    """
+    grid = board.grid
+    row, col = to_pos
+    squares = []
+    for dr, dc in RAY_DIRECTIONS:
+        r, c = row + dr, col + dc
+        while 0 <= r < 9 and 0 <= c < 9:
+            if grid[r][c] is not None and (r, c) != king_pos:
+                squares.append((r, c))
+                break
+            r += dr
+            c += dc
+    for dr, dc in KNIGHT_OFFSETS:
+        r, c = row + dr, col + dc
+        if 0 <= r < 9 and 0 <= c < 9 and grid[r][c] is not None:
+            squares.append((r, c))
+
+    for square in squares:
+        piece = grid[square[0]][square[1]]
+        if piece.player != by_player:
+            continue
+        if piece.effects:
+            return None
+        if _reach(grid, PIECE_REACH[(piece.type.move_types[piece.is_promoted], by_player)], square, to_pos, king_pos):
+            return False
+    return True
+
+
+def _squares_between(pos1, pos2):
+    """直線上にある2つのマスの間のマスのリスト（直線上にない場合は空）"""
+    if not _is_aligned(pos1, pos2):
+        return []
+    dr = (pos2[0] > pos1[0]) - (pos2[0] < pos1[0])
+    dc = (pos2[1] > pos1[1]) - (pos2[1] < pos1[1])
+    squares = []
+    row, col = pos1[0] + dr, pos1[1] + dc
+    while (row, col) != pos2:
+        squares.append((row, col))
+        row += dr
+        col += dc
+    return squares
+
+
+def _drop_check_squares(board, king_pos):
+    """持ち駒を打って王手になりうる空きマス（王の周囲・桂馬の位置・王から見た直線上）"""
+    squares = set(KING_NEIGHBORS[king_pos[0] * 9 + king_pos[1]])
+    for player in (1, 2):
+        squares.update(KNIGHT_CHECK_SQUARES[player][king_pos[0] * 9 + king_pos[1]])
+    grid = board.grid
+    for dr, dc in RAY_DIRECTIONS:
+        row, col = king_pos[0] + dr, king_pos[1] + dc
+        while _on_board(row, col) and grid[row][col] is None:
+            squares.add((row, col))
+            row += dr
+            col += dc
+    return squares
+
+
+def check_moves(board, kings):
+    """手番のプレイヤーの王手になる合法手 [(指し手, 指した後の局面のハッシュ値)]
+
+    kingsは {プレイヤー: 王の位置}。盤上の駒の直接の王手は動かす前の盤面で動かした後の利きを調べ、
+    開き王手になりうる駒（_discovered_check_squares）と特殊効果のかかった駒の手だけを指して確かめる。
+    持ち駒は王の近傍表と直線上のマスだけを調べる。自玉に王手がかかっていなければ、自玉が危なくなり
+    うるのは自玉が動く手と自玉との直線上から動く手だけなので、それ以外の手は自玉への利きを確かめない。
+    """
+    attacker = board.player_turn
+    defender = 3 - attacker
+    king_pos = kings[defender]
+    own_king_pos = kings[attacker]
+    if king_pos is None:
+        return []
+    in_check = own_king_pos is not None and bool(attackers(board, own_king_pos, defender, True))
+    discoverers = _discovered_check_squares(board, king_pos, attacker)
+
+    grid = board.grid
+    candidates = []
+    for move in generate_moves(board, attacker, include_drops=False):
+        to_pos = move_to(move)
+        from_pos = move_from(move)
+        piece = grid[from_pos[0]][from_pos[1]]
+        discovered = from_pos in discoverers
+        if piece.effects:
+            # 特殊効果のかかった駒は指した後の移動可能なマスで直接の王手を確かめる
+            checked = False
+            direct = max(abs(to_pos[0] - king_pos[0]), abs(to_pos[1] - king_pos[1])) <= 2 or \
+                _is_aligned(to_pos, king_pos)
+            if not (direct or discovered):
+                continue
+        else:
+            promoted = piece.is_promoted or is_promotion(move)
+            checked = _reach(grid, PIECE_REACH[(piece.type.move_types[promoted], attacker)], to_pos, king_pos, from_pos)
+            direct = False
+            if not (checked or discovered):
+                continue
+        if from_pos == own_king_pos:
+            own_king_after = to_pos
+        elif in_check or (own_king_pos is not None and _is_aligned(from_pos, own_king_pos)):
+            own_king_after = own_king_pos
+        else:
+            own_king_after = None
+        candidates.append((move, checked, direct, discovered, from_pos, own_king_after))
+
+    # 持ち駒は打った駒が王に利くマスだけ（打つ手で利きが通ることはない）
+    drop_squares = None
+    for piece_name, count in board.iter_hand(attacker):
+        if drop_squares is None:
+            drop_squares = sorted(_drop_check_squares(board, king_pos))
+        reach = PIECE_REACH[(piece_name, attacker)]
+        targets = board.drop_target_mask(piece_name, attacker)
+        for to_pos in drop_squares:
+            if targets >> (to_pos[0] * 9 + to_pos[1]) & 1 and _reach(grid, reach, to_pos, king_pos):
+                candidates.append((encode_drop(piece_name, to_pos), True, False, False, None,
+                                   own_king_pos if in_check else None))
+
+    children = []
+    for move, checked, direct, discovered, from_pos, own_king_after in candidates:
+        if checked and own_king_after is None:
+            # 王手が確定していて自玉も危なくならない手は指さずに指した後のハッシュ値を求める
+            children.append((move, board.zobrist_key_after(move) ^ AND_NODE_KEY))
+            continue
+        to_pos = move_to(move)
+        undo = board.make_move(move)
+        try:
+            gives_check = checked or \
+                          (direct and reaches(board, to_pos, king_pos)) or \
+                          (discovered and _ray_attacker(board, king_pos, from_pos, attacker))
+            if gives_check and not (own_king_after and attackers(board, own_king_after, defender, True)):
+                children.append((move, board.zobrist_key ^ AND_NODE_KEY))
+        finally:
+            board.unmake_move(move, undo)
+    return children
+
+
+def evasion_moves(board, kings, first_only=False):
+    """手番のプレイヤーの王手を回避する合法手 [(指し手, 指した後の局面のハッシュ値)]
+
+    first_onlyを指定すると回避手が1つ見つかった時点で返す（詰みかどうかの判定用）。
+    全部の指し手は生成せず、王が動く手、王手駒を取る手・合駒（移動合・打つ合駒）だけを作る。
+    王が動く手は動かす前の盤面で移動先の利きを調べる（_king_square_safe）。王以外の駒の手で
+    自玉が危なくなりうるのは王との直線上から動く（ピンされている）ときだけなので、それ以外の手は
+    王への利きを確かめない。
+    """
+    defender = board.player_turn
+    attacker = 3 - defender
+    king_pos = kings[defender]
+    if king_pos is None:
+        return []
+
+    # 王手をかけている駒
+    checkers = attackers(board, king_pos, attacker)
+
+    grid = board.grid
+    candidates = array('H')
+    append_piece_moves(candidates, grid[king_pos[0]][king_pos[1]], king_pos[0], king_pos[1],
+                       board.get_piece_moves(king_pos))
+    # 両王手なら王が動く手のみ、そうでなければ王手駒を取る手・合駒も候補になる
+    if len(checkers) == 1:
+        between = _squares_between(checkers[0], king_pos)
+        for square in [checkers[0]] + between:
+            for from_pos in attackers(board, square, defender):
+                if from_pos != king_pos:
+                    append_piece_moves(candidates, grid[from_pos[0]][from_pos[1]], from_pos[0], from_pos[1],
+                                       (square,))
+        for piece_name, count in board.iter_hand(defender):
+            targets = board.drop_target_mask(piece_name, defender)
+            for to_pos in between:
+                if targets >> (to_pos[0] * 9 + to_pos[1]) & 1:
+                    candidates.append(encode_drop(piece_name, to_pos))
+
+    children = []
+    for move in candidates:
+        from_pos = move_from(move)
+        to_pos = move_to(move)
+        king_moves = from_pos == king_pos
+        if king_moves:
+            safe = _king_square_safe(board, king_pos, to_pos, attacker)
+            if safe is False:
+                continue
+            verify = safe is None
+        else:
+            verify = from_pos is not None and _is_aligned(from_pos, king_pos)
+        if verify:
+            undo = board.make_move(move)
+            try:
+                if not attackers(board, to_pos if king_moves else king_pos, attacker, True):
+                    children.append((move, board.zobrist_key))
+            finally:
+                board.unmake_move(move, undo)
+        else:
+            # 安全を確かめた王の手・ピンされていない駒の手・打つ合駒は、指さずに指した後のハッシュ値を求める
+            children.append((move, board.zobrist_key_after(move)))
+        if first_only and children:
+            break
+    return children
+
+
+def king_positions(board):
+    """{プレイヤー: 王の位置}"""
+    return {1: board.find_king_position(1), 2: board.find_king_position(2)}
+
+
+def is_mating_move(board, move):
+    """手番のプレイヤーがこの手を指すと相手が詰むか（王を取る手も含む）"""
+    attacker = board.player_turn
+    defender = 3 - attacker
+    kings = king_positions(board)
+    to_pos = move_to(move)
+    if to_pos == kings[defender]:
+        return True
+    if kings[defender] is None:
+        return False
+
+    from_pos = move_from(move)
+    own_king_after = to_pos if from_pos is not None and from_pos == kings[attacker] else kings[attacker]
+    undo = board.make_move(move)
+    board.player_turn = defender
+    try:
+        if not attackers(board, kings[defender], attacker, True):
+            return False
+        if own_king_after and attackers(board, own_king_after, defender, True):
+            return False
+        return not evasion_moves(board, kings, first_only=True)
+    finally:
+        board.player_turn = attacker
+        board.unmake_move(move, undo)
+
+
+def find_mate_in_one(board, attacker=None):
+    """attacker（省略時は手番のプレイヤー）の1手詰めの手を返す。なければNone"""
+    if attacker is None:
+        attacker = board.player_turn
+    original_turn = board.player_turn
+    board.player_turn = attacker
+    kings = king_positions(board)
+    try:
+        for move, child_key in check_moves(board, kings):
+            undo = board.make_move(move)
+            board.player_turn = 3 - attacker
+            try:
+                if not evasion_moves(board, kings, first_only=True):
+                    return move
+            finally:
+                board.player_turn = attacker
+                board.unmake_move(move, undo)
+        return None
+    finally:
+        board.player_turn = original_turn
+
+
+def has_mate_threat(board, player):
+    """playerの王に詰めろ（相手が続けて指せば1手詰め）がかかっているか"""
+    return find_mate_in_one(board, 3 - player) is not None
+
+
+class DfPnSolver:
+    """df-pnによる詰将棋ソルバー"""
+
+    def __init__(self, max_nodes=200000, time_limit=1.0, max_ply=31, clock=time.time):
+        self.max_nodes = max_nodes  # 展開する局面数の上限
+        self.time_limit = time_limit  # 制限時間（秒）
+        self.clock = clock  # 制限時間の計測に使う時計（決定的モードでは呼び出し回数で進む時計）
+        self.max_ply = max_ply  # 詰み手順の最大手数
+        # 局面のハッシュ値 -> [証明数, 反証数, 探索した残り手数, 不詰の根拠にした手順上の局面, 詰みの手数]
+        # 詰み・不詰はどちらも残り手数によるので、詰みは見つけた最短の手数を覚えてその手数が残り手数以内の
+        # ときだけ、不詰は探した残り手数以上で、千日手が根拠なら根拠の局面が手順上にあるときだけ再利用する
+        self.table = {}
+        self._children = {}  # 局面のハッシュ値 -> 展開済みの子局面の一覧（再訪時の指し手生成を省く）
+        self.nodes = 0
+        self.probes = 0  # 置換表を引いた回数（累計）
+        self.hits = 0  # そのうち置換表に局面があった回数（累計）
+        self._deadline = 0
+        self.aborted = False  # 局面数・時間の制限で打ち切ったか
+        self._path = {}  # 探索中の手順上の局面 -> 手数（千日手の検出用）
+        self._kings = {}  # プレイヤー -> 王の位置（指し手に合わせて更新する）
+        self.mate_length = None  # 最後に解いた局面の詰みの手数（詰まなければNone）
+
+    def solve(self, board, attacker=None):
+        """詰み手順（整数の指し手のリスト）を返す。詰まない・制限に達した場合はNone"""
+        if attacker is None:
+            attacker = board.player_turn
+        original_turn = board.player_turn
+        board.player_turn = attacker
+
+        self.table = {}
+        self._children = {}
+        self.nodes = 0
+        self._deadline = self.clock() + self.time_limit
+        self.aborted = False
+        self._path = {}
+        self._kings = {1: board.find_king_position(1), 2: board.find_king_position(2)}
+        self.mate_length = None
+
+        try:
+            # 王が取れる局面ならそれで終わり
+            capture = self._king_capture_move(board)
+            if capture is not None:
+                self.mate_length = 1
+                return [capture]
+
+            root_key = board.zobrist_key
+            self._mid(board, root_key, True, INFINITE, INFINITE, 0)
+            length = self._proof_length(root_key, self.max_ply)
+            if length == INFINITE:
+                return None
+            self.mate_length = length
+            return self._principal_variation(board, root_key, length)
+        finally:
+            board.player_turn = original_turn
+
+    def _king_capture_move(self, board):
+        """手番のプレイヤーが相手の王を取れる手を返す"""
+        king_pos = self._kings[3 - board.player_turn]
+        if king_pos is None:
+            return None
+        for move in generate_moves(board):
+            if move_to(move) == king_pos:
+                return move
+        return None
+
+    def _mid(self, board, key, or_node, threshold_pn, threshold_dn, ply):
+        """局面を展開し、証明数・反証数が閾値に達するまで最良の子局面を探索する"""
+        self.nodes += 1
+        if self.nodes > self.max_nodes or (self.nodes & 255 == 0 and self.clock() > self._deadline):
+            self.aborted = True
+        if self.aborted:
+            return
+
+        remaining = self.max_ply - ply
+        if or_node and remaining <= 0:
+            # 手数制限に達した局面はこの残り手数では不詰として扱う（子局面の一覧は覚えない）
+            self._store(key, INFINITE, 0, remaining, None)
+            return
+
+        children = self._children.get(key)
+        if children is None:
+            children = self._expand(board, or_node, ply)
+            self._children[key] = children
+        if not children:
+            # 攻め方に王手がなければ不詰、玉方に回避手がなければ詰み（どちらも残り手数によらない）
+            if or_node:
+                self._store(key, INFINITE, 0, INFINITE, None)
+            else:
+                self._store(key, 0, INFINITE, remaining, None, 0)
+            return
+        if or_node and remaining == 1:
+            self._mate_in_one(board, key, children)
+            return
+
+        self._path[key] = ply
+        try:
+            while True:
+                pn, dn, best, best_pn, best_dn, second, loop = self._collect(children, or_node, remaining - 1)
+                if loop == key:
+                    # この局面に戻る千日手だけが根拠なら、ここまでの手順によらない不詰になる
+                    loop = None
+                if pn == 0:
+                    self._store(key, pn, dn, remaining, loop, self._mate_length(children, or_node, remaining - 1))
+                else:
+                    self._store(key, pn, dn, remaining, loop)
+                if pn >= threshold_pn or dn >= threshold_dn:
+                    break
+
+                # 最良の子局面に渡す閾値
+                if or_node:
+                    child_pn = min(threshold_pn, second + 1)
+                    child_dn = min(INFINITE, threshold_dn - dn + best_dn)
+                else:
+                    child_pn = min(INFINITE, threshold_pn - pn + best_pn)
+                    child_dn = min(threshold_dn, second + 1)
+
+                move, child_key = best
+                undo = self._play(board, move)
+                try:
+                    self._mid(board, child_key, not or_node, child_pn, child_dn, ply + 1)
+                finally:
+                    self._unplay(board, move, undo)
+                if self.aborted:
+                    break
+        finally:
+            del self._path[key]
+
+    def _mate_in_one(self, board, key, children):
+        """残り1手の攻め方の局面を、玉方に回避手のない王手があるかどうかだけで詰み・不詰にする
+
+        玉方の局面を1つずつ展開せず、回避手が1つ見つかった時点でその王手を打ち切る。
+        """
+        for move, child_key in children:
+            if child_key in self._path:
+                continue
+            self.nodes += 1
+            undo = self._play(board, move)
+            try:
+                mated = not evasion_moves(board, self._kings, first_only=True)
+            finally:
+                self._unplay(board, move, undo)
+            if mated:
+                self._store(child_key, 0, INFINITE, 0, None, 0)
+                self._store(key, 0, INFINITE, 1, None, 1)
+                return
+        self._store(key, INFINITE, 0, 1, None)
+
+    def _play(self, board, move):
+        """手を指して手番を交代する（王の位置も更新する）"""
+        player = board.player_turn
+        king_pos = self._kings[player]
+        if move_from(move) == king_pos:
+            self._kings[player] = move_to(move)
+        undo = (board.make_move(move), king_pos)
+        board.player_turn = 3 - player
+        return undo
+
+    def _unplay(self, board, move, undo):
+        """_playで指した手を取り消す"""
+        board.player_turn = 3 - board.player_turn
+        board.unmake_move(move, undo[0])
+        self._kings[board.player_turn] = undo[1]
+
+    def _store(self, key, pn, dn, remaining, loop, mate=INFINITE):
+        """局面の探索結果をハッシュ表に書く（前に見つけた詰みの手数の方が短ければそちらを残す）"""
+        entry = self.table.get(key)
+        if entry is not None and entry[4] < mate:
+            mate = entry[4]
+        self.table[key] = [pn, dn, remaining, loop, mate]
+
+    def _lookup(self, key, remaining):
+        """残り手数remainingの局面の(証明数, 反証数, 不詰の根拠にした手順上の局面)を返す
+
+        残り手数を超える手数の詰み、浅い残り手数で確かめた不詰、今の手順にない局面への千日手による
+        不詰は未解決として扱う。
+        """
+        path = self._path
+        if key in path:
+            # 千日手になる手は攻め方の失敗とみなす
+            return INFINITE, 0, key
+        self.probes += 1
+        entry = self.table.get(key)
+        if entry is None:
+            return 1, 1, None
+        self.hits += 1
+        pn, dn, depth, loop, mate = entry
+        if mate <= remaining:
+            return 0, INFINITE, None
+        if pn == 0 or (dn == 0 and (depth < remaining or (loop is not None and loop not in path))):
+            return 1, 1, None
+        return pn, dn, loop
+
+    def _proof_length(self, key, remaining):
+        """残り手数remainingの局面で再利用できる詰みの手数（なければINFINITE）"""
+        entry = self.table.get(key)
+        if entry is None or key in self._path or entry[4] > remaining:
+            return INFINITE
+        return entry[4]
+
+    def _mate_length(self, children, or_node, remaining):
+        """詰みを証明した局面の詰みの手数（攻め方は最短、玉方は最長で詰む子局面の手数 + 1）"""
+        lengths = [self._proof_length(child_key, remaining) for _, child_key in children]
+        return 1 + (min(lengths) if or_node else max(lengths))
+
+    def _deeper_loop(self, loop, other):
+        """手順上の局面のうち、手順の後ろの方（先に手順から外れる方）を返す"""
+        if loop is None or (other is not None and self._path[other] > self._path[loop]):
+            return other
+        return loop
+
+    def _collect(self, children, or_node, remaining):
+        """子局面の証明数・反証数を集計し、次に探索する子局面を選ぶ
+
+        不詰になった場合は、その根拠にした千日手の手順上の局面（なければNone）も返す。
+        """
+        best = None
+        best_pn = best_dn = INFINITE
+        second = INFINITE
+        total = 0
+        loop = None  # 攻め方: すべての子の不詰の根拠のうち手順の最も後ろの局面
+        free_disproof = False  # 玉方: 千日手によらない不詰の子があるか
+        and_loop = None  # 玉方: 千日手による不詰の子の根拠のうち手順の最も前の局面
+
+        for child in children:
+            child_pn, child_dn, child_loop = self._lookup(child[1], remaining)
+
+            if or_node:
+                # 攻め方: 証明数は子の最小値、反証数は子の合計
+                total = min(INFINITE, total + child_dn)
+                loop = self._deeper_loop(loop, child_loop)
+                if child_pn < best_pn:
+                    second = best_pn
+                    best, best_pn, best_dn = child, child_pn, child_dn
+                elif child_pn < second:
+                    second = child_pn
+            else:
+                # 玉方: 反証数は子の最小値、証明数は子の合計
+                total = min(INFINITE, total + child_pn)
+                if child_dn == 0:
+                    if child_loop is None:
+                        free_disproof = True
+                    elif and_loop is None or self._path[child_loop] < self._path[and_loop]:
+                        and_loop = child_loop
+                if child_dn < best_dn:
+                    second = best_dn
+                    best, best_pn, best_dn = child, child_pn, child_dn
+                elif child_dn < second:
+                    second = child_dn
+
+        if or_node:
+            return best_pn, total, best, best_pn, best_dn, second, (loop if total == 0 else None)
+        loop = None if free_disproof or best_dn != 0 else and_loop
+        return total, best_dn, best, best_pn, best_dn, second, loop
+
+    def _expand(self, board, or_node, ply):
+        """子局面の一覧 [(指し手, 子局面のハッシュ値)] を生成する"""
+        if or_node:
+            if ply >= self.max_ply:
+                # 手数制限に達した局面は不詰として扱う
+                return []
+            return check_moves(board, self._kings)
+        return evasion_moves(board, self._kings)
+
+    def _principal_variation(self, board, key, length):
+        """証明済みの局面をたどって詰み手順を取り出す
+
+        攻め方は最短で詰む手、玉方は最長で詰む手を選ぶ。子局面の詰みの手数は親より必ず短いので、
+        手順は玉方に回避手がない局面（詰みの手数0）で終わり、長さは根の詰みの手数length以下になる。
+        """
+        sequence = []
+        played = []
+        or_node = True
+        try:
+            while length > 0:
+                children = self._children.get(key)
+                if children is None:
+                    children = self._expand(board, or_node, len(sequence))
+                chosen = None
+                for move, child_key in children:
+                    child_length = self._proof_length(child_key, length - 1)
+                    if child_length == INFINITE:
+                        continue
+                    if chosen is None or (child_length < chosen[2] if or_node else child_length > chosen[2]):
+                        chosen = (move, child_key, child_length)
+                if chosen is None:
+                    break
+
+                move, key, length = chosen
+                sequence.append(move)
+                played.append((move, self._play(board, move)))
+                or_node = not or_node
+        finally:
+            for move, undo in reversed(played):
+                self._unplay(board, move, undo)
+        return sequence
@@ -1,5 +1,6 @@
 import pygame
 from constants import BUTTON_COLOR, BUTTON_HOVER_COLOR, BUTTON_TEXT_COLOR
+from ui.text_cache import render_text
 
 class Button:
     def __init__(self, x, y, width, height, text, action=None):
@@ -15,9 +16,10 @@ class Button:
         pygame.draw.rect(surface, (0, 0, 0), self.rect, 2)  # 枠線
         
         # ボタンのテキスト
-        text_surf = button_font.render(self.text, True, BUTTON_TEXT_COLOR)
+        text_surf = render_text(button_font, self.text, BUTTON_TEXT_COLOR)
         text_rect = text_surf.get_rect(center=self.rect.center)
         surface.blit(text_surf, text_rect)
+        return self.rect
         
     def update(self, mouse_pos):
         self.is_hovered = self.rect.collidepoint(mouse_pos)
@@ -1,94 +1,110 @@
-import pygame
 import time
+from ui.surface_pool import filled_surface
+from ui.text_cache import render_text
 
 class Effect:
-    def __init__(self, duration=2.0):
+    """エフェクトの基底クラス（時刻はEffectDisplayのフレームの時刻（time.monotonicの秒）で受け取る）"""
+    def __init__(self, duration=2.0, start_time=None):
         self.duration = duration
-        self.start_time = time.time()
+        self.start_time = time.monotonic() if start_time is None else start_time
         
-    def is_expired(self):
-        return time.time() - self.start_time > self.duration
+    def is_expired(self, now):
+        return now - self.start_time > self.duration
         
-    def update(self):
+    def update(self, now):
         pass
         
     def draw(self, screen):
         pass
 
 class MessageEffect(Effect):
-    def __init__(self, message, font, position=(400, 100), color=(255, 0, 0), duration=2.0):
-        super().__init__(duration)
+    def __init__(self, message, font, position=(400, 100), color=(255, 0, 0), duration=2.0, start_time=None):
+        super().__init__(duration, start_time)
         self.message = message
         self.font = font
         self.position = position
         self.color = color
         self.alpha = 255  # 透明度
+        self._surface = None  # フェード用に共有のキャッシュからコピーした文字の画像
         
-    def update(self):
+    def update(self, now):
         # フェードアウト効果
-        time_passed = time.time() - self.start_time
+        time_passed = now - self.start_time
         if time_passed > self.duration * 0.7:
             fade_factor = 1.0 - (time_passed - self.duration * 0.7) / (self.duration * 0.3)
             self.alpha = max(0, int(255 * fade_factor))
     
     def draw(self, screen):
-        text_surface = self.font.render(self.message, True, self.color)
+        # 文字は一度だけ描き、フェードは同じ画像の透明度を変えるだけにする
+        if self._surface is None:
+            self._surface = render_text(self.font, self.message, self.color).copy()
+        text_surface = self._surface
         text_surface.set_alpha(self.alpha)
         text_rect = text_surface.get_rect(center=self.position)
-        screen.blit(text_surface, text_rect)
+        return screen.blit(text_surface, text_rect)
 
 class HighlightEffect(Effect):
-    def __init__(self, position, cell_size, color=(255, 255, 0, 150), duration=1.0):
-        super().__init__(duration)
+    def __init__(self, position, cell_size, color=(255, 255, 0, 150), duration=1.0, start_time=None):
+        super().__init__(duration, start_time)
         self.position = position
         self.cell_size = cell_size
         self.color = color
         self.alpha = color[3] if len(color) > 3 else 150
         
-    def update(self):
+    def update(self, now):
         # 点滅効果
-        time_passed = time.time() - self.start_time
+        time_passed = now - self.start_time
         self.alpha = int(150 * (0.5 + 0.5 * abs(((time_passed * 5) % 2) - 1)))
         
     def draw(self, screen):
-        highlight = pygame.Surface((self.cell_size, self.cell_size), pygame.SRCALPHA)
-        color_with_alpha = (*self.color[:3], self.alpha)
-        highlight.fill(color_with_alpha)
+        # 点滅は同じ画像の透明度を変えるだけにする
+        highlight = filled_surface((self.cell_size, self.cell_size), self.color, self.alpha)
         x, y = self.position
-        screen.blit(highlight, (x, y))
+        return screen.blit(highlight, (x, y))
 
 class EffectDisplay:
-    def __init__(self, screen, font):
+    """エフェクトの一覧（updateは1フレームに1回呼び、そのときのclockの時刻でエフェクトを進める）"""
+    def __init__(self, screen, font, clock=time.monotonic):
         self.screen = screen
         self.font = font
+        self.clock = clock  # 単調増加する時刻（秒）を返す関数
+        self.now = clock()  # 最後にupdateしたフレームの時刻
         self.effects = []
         self.effects_active = False  # エフェクトがアクティブかどうか
         
     def add_message(self, message, position=(400, 100), color=(255, 0, 0), duration=2.0):
-        effect = MessageEffect(message, self.font, position, color, duration)
+        effect = MessageEffect(message, self.font, position, color, duration, self.clock())
         self.effects.append(effect)
         self.effects_active = True  # エフェクト開始
         
     def add_highlight(self, position, cell_size, color=(255, 255, 0, 150), duration=1.0):
-        effect = HighlightEffect(position, cell_size, color, duration)
+        effect = HighlightEffect(position, cell_size, color, duration, self.clock())
         self.effects.append(effect)
         self.effects_active = True  # エフェクト開始
         
     def update(self):
+        # このフレームの時刻（同じフレームのエフェクトはすべて同じ時刻で進める）
+        now = self.now = self.clock()
+        
         # 期限切れのエフェクトを削除
-        self.effects = [effect for effect in self.effects if not effect.is_expired()]
+        self.effects = [effect for effect in self.effects if not effect.is_expired(now)]
         
         # 残りのエフェクトを更新
         for effect in self.effects:
-            effect.update()
+            effect.update(now)
             
         # すべてのエフェクトが完了したかチェック
         if len(self.effects) == 0:
             self.effects_active = False
             
     def draw(self):
+        """エフェクトを描画し、描いた範囲のリストを返す"""
+        rects = []
         for effect in self.effects:
-            effect.draw(self.screen)
+            rect = effect.draw(self.screen)
+            if rect:
+                rects.append(rect)
+        return rects
             
     def is_effects_active(self):
         """エフェクトがアクティブかどうかを返す"""
@@ -0,0 +1,37 @@
+import pygame
+
+# アニメーションがないときにイベントを待つ最長の時間（ミリ秒）
+IDLE_TIMEOUT_MS = 500
+
+
+class FramePacer:
+    """ループの速さの調整（アニメーション中は毎秒fpsフレーム、ないときはイベントが来るまで待つ）
+
+    各フレームの最後にwait(動かすものがあるか)を呼び、イベントはpygame.event.getの代わりに
+    events()で受け取る。待っている間に来たイベントは次のフレームのevents()で返す。
+    """
+
+    def __init__(self, fps=60, idle_timeout=IDLE_TIMEOUT_MS):
+        self.fps = fps
+        self.idle_timeout = idle_timeout
+        self.clock = pygame.time.Clock()
+        self.idle_frames = 0  # イベントを待ったフレーム数
+        self._pending = []  # 待っている間に来たイベント
+
+    def events(self):
+        """このフレームで処理するイベントのリスト"""
+        events = self._pending + pygame.event.get()
+        self._pending = []
+        return events
+
+    def wait(self, animating):
+        """animatingなら次のフレームまでの残り時間だけ待ち、そうでなければイベントが来るまで待つ"""
+        if animating:
+            self.clock.tick(self.fps)
+            return
+        self.idle_frames += 1
+        event = pygame.event.wait(self.idle_timeout)
+        if event.type != pygame.NOEVENT:
+            self._pending.append(event)
+        # 待った時間を次のフレームの待ち時間の計算に含めない
+        self.clock.tick()
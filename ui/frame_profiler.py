@@ -0,0 +1,132 @@
+import time
+from collections import deque
+
+import pygame
+
+FRAME_BUDGET = 1.0 / 60  # 60fpsで1フレームに使える秒数（16.7ms）
+
+# 1フレームの工程（表示順）
+FRAME_SECTIONS = ("input", "ai", "board", "captured", "effects", "windows", "flip")
+
+
+def percentile(sorted_values, fraction):
+    """昇順に並んだ値のfractionの分位点（最も近い順位の値）"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+class FrameProfiler:
+    """1フレームの時間を工程ごとに測り、直近のフレームの分位点と16.7msを超えたフレーム数を集計する
+
+    begin_frameの後、各工程の終わりでlap(工程名)を呼ぶと、前のlapからの時間がその工程に加算される。
+    overlay_visibleのときは集計を画面に重ねて表示し、log_everyフレームごとにsinkへ要約を渡す。
+    """
+
+    def __init__(self, window=120, log_every=None, sink=print):
+        self.window = window  # 分位点を取る直近のフレーム数
+        self.frames = deque(maxlen=window)  # 直近のフレームの合計秒
+        self.sections = {name: deque(maxlen=window) for name in FRAME_SECTIONS}  # 工程 -> 直近のフレームの秒
+        self.over_budget = 0  # 16.7msを超えたフレーム数（累計）
+        self.frame_count = 0
+        self.log_every = log_every  # 要約をsinkに渡す間隔（フレーム数、Noneなら渡さない）
+        self.sink = sink
+        self.overlay_visible = False
+        self._current = {}
+        self._frame_start = 0.0
+        self._last = 0.0
+        self._summary = None  # 表示用の要約（数フレームごとに作り直す）
+        self._overlay_lines = []
+        self._overlay_panel = None
+
+    def begin_frame(self):
+        self._current = {}
+        self._frame_start = self._last = time.perf_counter()
+
+    def lap(self, section):
+        """前のlap（またはbegin_frame）からの時間をsectionに加える"""
+        now = time.perf_counter()
+        self._current[section] = self._current.get(section, 0.0) + now - self._last
+        self._last = now
+
+    def end_frame(self):
+        """フレームの集計を確定する（clock.tickの待ち時間は含めない）"""
+        total = time.perf_counter() - self._frame_start
+        self.frames.append(total)
+        for name, samples in self.sections.items():
+            samples.append(self._current.get(name, 0.0))
+        self.frame_count += 1
+        if total > FRAME_BUDGET:
+            self.over_budget += 1
+        if self.overlay_visible and (self._summary is None or self.frame_count % 15 == 0):
+            self._summary = self.summary()
+            self._overlay_lines = []
+        if self.log_every and self.frame_count % self.log_every == 0:
+            self.sink(self.format_summary(self.summary()))
+
+    def toggle_overlay(self):
+        self.overlay_visible = not self.overlay_visible
+        self._summary = None
+
+    def summary(self):
+        """直近のフレームの集計（ミリ秒）を辞書で返す"""
+        frames = sorted(self.frames)
+        result = {
+            "frames": self.frame_count,
+            "over_budget": self.over_budget,
+            "window_frames": len(frames),
+            "window_over_budget": sum(1 for total in frames if total > FRAME_BUDGET),
+            "total": self._percentiles(frames),
+            "sections": {},
+        }
+        for name, samples in self.sections.items():
+            result["sections"][name] = self._percentiles(sorted(samples))
+        return result
+
+    @staticmethod
+    def _percentiles(sorted_values):
+        return {
+            "p50": percentile(sorted_values, 0.5) * 1000,
+            "p95": percentile(sorted_values, 0.95) * 1000,
+            "p99": percentile(sorted_values, 0.99) * 1000,
+            "max": (sorted_values[-1] if sorted_values else 0.0) * 1000,
+        }
+
+    @staticmethod
+    def format_summary(summary):
+        """要約を1行の文字列にする"""
+        total = summary["total"]
+        sections = " ".join(f"{name}={values['p95']:.1f}" for name, values in summary["sections"].items())
+        return (f"フレーム時間: p50={total['p50']:.1f}ms p95={total['p95']:.1f}ms p99={total['p99']:.1f}ms "
+                f"max={total['max']:.1f}ms "
+                f"16.7ms超過={summary['window_over_budget']}/{summary['window_frames']} 工程p95[ms]: {sections}")
+
+    def draw(self, screen, font):
+        """集計を画面の右上に重ねて表示し、表示した範囲を返す"""
+        if not self.overlay_visible or self._summary is None:
+            return None
+        if not self._overlay_lines:
+            summary = self._summary
+            total = summary["total"]
+            texts = [
+                f"frame p50 {total['p50']:.1f} p95 {total['p95']:.1f} p99 {total['p99']:.1f} ms",
+                f">16.7ms: {summary['window_over_budget']}/{summary['window_frames']} (total {summary['over_budget']})",
+            ]
+            for name, values in summary["sections"].items():
+                texts.append(f"{name:<9}{values['p50']:6.2f}{values['p95']:7.2f} ms")
+            self._overlay_lines = [font.render(text, True, (255, 255, 255)) for text in texts]
+            width = max(line.get_width() for line in self._overlay_lines) + 16
+            height = sum(line.get_height() for line in self._overlay_lines) + 12
+            if self._overlay_panel is None or self._overlay_panel.get_size() != (width, height):
+                self._overlay_panel = pygame.Surface((width, height), pygame.SRCALPHA)
+                self._overlay_panel.fill((0, 0, 0, 170))
+
+        panel = self._overlay_panel
+        x = screen.get_width() - panel.get_width() - 8
+        rect = screen.blit(panel, (x, 8))
+        y = 14
+        for line in self._overlay_lines:
+            screen.blit(line, (x + 8, y))
+            y += line.get_height()
+        return rect
@@ -0,0 +1,65 @@
+import pygame
+
+
+class LayeredRenderer:
+    """静的なレイヤーと変化した部分だけを描き直す描画（dirty rect）
+
+    画面は下から、あらかじめ描いておいた静的なレイヤー（背景・盤・マス目）、
+    変化したときだけ描き直すレイヤー（駒・持ち駒）、毎フレーム描くオーバーレイ（文字・ボタン・
+    ウィンドウ・エフェクト）の順に重なる。フレームごとに、変化した範囲と前のフレームで
+    オーバーレイを描いた範囲だけを静的なレイヤーから描き直し、その範囲と今回のオーバーレイの範囲だけを
+    pygame.display.updateで画面に反映する。
+    """
+
+    # 描き直す範囲がこれより多いときは1つの矩形にまとめる
+    MAX_REGIONS = 32
+
+    def __init__(self, screen, static_layer):
+        self.screen = screen
+        self.static_layer = static_layer
+        self.screen_rect = screen.get_rect()
+        self._dirty = []  # 今回のフレームで描き直す範囲
+        self._full = True  # 画面全体を描き直すかどうか
+        self._overlays = []  # 今回のフレームでオーバーレイを描いた範囲
+
+    def invalidate(self, rect=None):
+        """rect（省略時は画面全体）を次の描画で描き直す"""
+        if rect is None:
+            self._full = True
+        else:
+            self._dirty.append(pygame.Rect(rect))
+
+    def regions(self):
+        """今回のフレームで描き直す範囲のリスト"""
+        if self._full:
+            return [self.screen_rect]
+        if len(self._dirty) > self.MAX_REGIONS:
+            self._dirty = [self._dirty[0].unionall(self._dirty[1:])]
+        return self._dirty
+
+    def restore_static(self):
+        """描き直す範囲に静的なレイヤーを描く"""
+        for rect in self.regions():
+            self.screen.blit(self.static_layer, rect, rect)
+
+    def redraw(self, draw_region):
+        """描き直す範囲ごとに、その範囲で切り抜いてdraw_region(範囲)を呼ぶ"""
+        for rect in self.regions():
+            self.screen.set_clip(rect)
+            draw_region(rect)
+        self.screen.set_clip(None)
+
+    def add_overlay(self, rect):
+        """オーバーレイを描いた範囲を記録する（次のフレームでその範囲を描き直す）"""
+        if rect:
+            self._overlays.append(pygame.Rect(rect))
+
+    def present(self):
+        """描き直した範囲とオーバーレイの範囲を画面に反映する"""
+        if self._full:
+            pygame.display.update(self.screen_rect)
+        else:
+            pygame.display.update(self._dirty + self._overlays)
+        self._full = False
+        self._dirty = self._overlays
+        self._overlays = []
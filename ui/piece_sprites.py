@@ -0,0 +1,67 @@
+import pygame
+from constants import CELL_SIZE, SELECTED_COLOR
+
+ENHANCED_GLOW_COLOR = (255, 0, 0, 50)  # 強化効果の赤い輝き
+
+# スプライトを作る駒の種類
+SPRITE_PIECES = ("pawn", "lance", "knight", "silver", "gold", "bishop", "rook", "king")
+
+
+class PieceSprites:
+    """駒の描画用の画像キャッシュ
+
+    (駒の種類, プレイヤー, 成り) ごとに、マスの大きさに縮小して画面の形式に変換した画像と、
+    選択中・強化中のハイライトを合成済みの画像を一度だけ作る。画面の初期化後に作ること。
+    駒の縁の半透明な部分も画面に直接重ねたときと同じ色になるよう、画像はアルファ乗算済みで持ち、
+    blend_flagsを付けて描画する。
+    """
+    
+    blend_flags = pygame.BLEND_PREMULTIPLIED
+
+    def __init__(self, piece_images, font, cell_size=CELL_SIZE, selected_color=SELECTED_COLOR):
+        from pieces import create_piece
+        self.cell_size = cell_size
+        self.sprites = {}  # (画像のキー, 選択中, 強化中) -> Surface
+        converts = pygame.display.get_surface() is not None
+        selected = self._overlay(selected_color).premul_alpha()
+        glow = self._overlay(ENHANCED_GLOW_COLOR).premul_alpha()
+        for name in SPRITE_PIECES:
+            for player in (1, 2):
+                for promoted in (False, True):
+                    key = (name, player, promoted)
+                    image = piece_images.get(key)
+                    base = pygame.Surface((cell_size, cell_size), pygame.SRCALPHA)
+                    if image is not None:
+                        base.blit(pygame.transform.scale(image, (cell_size, cell_size)), (0, 0))
+                    else:
+                        piece = create_piece(name, player, promoted)
+                        self._draw_kanji_piece(base, font, piece.promoted_kanji if promoted else piece.kanji, player)
+                    if converts:
+                        base = base.convert_alpha()
+                    base = base.premul_alpha()
+                    for is_selected in (False, True):
+                        for enhanced in (False, True):
+                            sprite = base.copy() if is_selected or enhanced else base
+                            if is_selected:
+                                sprite.blit(selected, (0, 0), special_flags=self.blend_flags)
+                            if enhanced:
+                                sprite.blit(glow, (0, 0), special_flags=self.blend_flags)
+                            self.sprites[(key, is_selected, enhanced)] = sprite
+
+    def _overlay(self, color):
+        surface = pygame.Surface((self.cell_size, self.cell_size), pygame.SRCALPHA)
+        surface.fill(color)
+        return surface
+
+    def _draw_kanji_piece(self, surface, font, kanji, player):
+        """画像がない駒の代わりの画像（木の色の四角に漢字）を描く"""
+        piece_rect = surface.get_rect()
+        pygame.draw.rect(surface, (210, 180, 140), piece_rect)
+        pygame.draw.rect(surface, (0, 0, 0), piece_rect, 1)
+        text_color = (0, 0, 0) if player == 1 else (200, 0, 0)
+        text = font.render(kanji, True, text_color)
+        surface.blit(text, text.get_rect(center=piece_rect.center))
+
+    def get(self, key, selected=False, enhanced=False):
+        """合成済みの画像を返す（描画するときはspecial_flags=blend_flagsを付ける）"""
+        return self.sprites[(key, selected, enhanced)]
@@ -0,0 +1,52 @@
+from collections import OrderedDict
+
+import pygame
+
+# 覚えておく塗りつぶし済みの画像の数（これを超えたら最も長く使っていないものから捨てる）
+MAX_POOLED_SURFACES = 32
+
+
+class SurfacePool:
+    """(大きさ, 色) ごとに塗りつぶし済みの半透明の画像を使い回すプール
+
+    ハイライトや画面を暗くするオーバーレイのように、毎フレーム同じ大きさ・色で描く画像を
+    一度だけ作る。透明度だけが変わる画像は、不透明な色で塗った画像をset_alphaで透明にして使い回す。
+    返す画像は共有なので、描画する以外の変更はしないこと。
+    """
+
+    def __init__(self, max_entries=MAX_POOLED_SURFACES):
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()  # (大きさ, 色) -> Surface
+        self.created = 0  # 作った画像の数（使い回せているかの確認用）
+
+    def filled(self, size, color, alpha=None):
+        """sizeの大きさでcolorに塗りつぶした画像を返す
+
+        alphaを指定すると、colorの透明度の代わりにalphaの透明度にした画像を返す
+        （透明度ごとに画像を作らず、同じ画像の透明度を変える）。
+        """
+        if alpha is not None:
+            color = (*color[:3], 255)
+        key = (tuple(size), tuple(color))
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = self.surfaces[key] = pygame.Surface(size, pygame.SRCALPHA)
+            surface.fill(color)
+            self.created += 1
+            if len(self.surfaces) > self.max_entries:
+                self.surfaces.popitem(last=False)
+        else:
+            self.surfaces.move_to_end(key)
+        surface.set_alpha(255 if alpha is None else alpha)
+        return surface
+
+    def clear(self):
+        self.surfaces.clear()
+
+
+surface_pool = SurfacePool()
+
+
+def filled_surface(size, color, alpha=None):
+    """共有のプールから塗りつぶし済みの画像を返す（SurfacePool.filledを参照）"""
+    return surface_pool.filled(size, color, alpha)
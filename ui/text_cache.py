@@ -0,0 +1,42 @@
+from collections import OrderedDict
+
+# 覚えておく文字の画像の数（これを超えたら最も長く使っていないものから捨てる）
+MAX_TEXT_SURFACES = 256
+
+
+class TextCache:
+    """font.renderで描いた文字の画像の上限付きLRUキャッシュ
+
+    (フォント, 文字列, 色, アンチエイリアス) ごとに画像を一度だけ作る。返す画像は共有なので、
+    set_alphaなどで変更するときはcopyしてから使うこと。
+    """
+
+    def __init__(self, max_entries=MAX_TEXT_SURFACES):
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()  # (フォント, 文字列, 色, アンチエイリアス) -> Surface
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, color, antialias=True):
+        key = (font, text, tuple(color), antialias)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+        self.misses += 1
+        surface = self.surfaces[key] = font.render(text, antialias, color)
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def clear(self):
+        self.surfaces.clear()
+
+
+text_cache = TextCache()
+
+
+def render_text(font, text, color, antialias=True):
+    """共有のキャッシュから文字の画像を返す（font.render(text, antialias, color)と同じ画像）"""
+    return text_cache.render(font, text, color, antialias)
@@ -1,7 +1,8 @@
 import pygame
 from constants import WINDOW_BG_COLOR, WINDOW_BORDER_COLOR, SCREEN_WIDTH, SCREEN_HEIGHT
 from ui.button import Button
-from special_moves import get_special_moves, is_move_used
+from ui.text_cache import render_text
+from special_moves import get_special_moves
 
 class SpecialMoveWindow:
     def __init__(self, font, button_font):
@@ -37,6 +38,9 @@ class SpecialMoveWindow:
         self.selected_move = None
         # 選択された技のインデックス
         self.selected_index = -1
+        # 技を使う局面とプレイヤー（openで設定）
+        self.board = None
+        self.player = None
         
         # 技の表示領域
         self.move_list_rect = pygame.Rect(
@@ -53,6 +57,7 @@ class SpecialMoveWindow:
             self.width - 100,
             120  # 説明領域をさらに広げる（3行分）
         )
+        self._description_layouts = {}  # 説明テキスト -> 表示する行のリスト
         
     def open(self, board=None, player=None):
         self.active = True
@@ -64,6 +69,10 @@ class SpecialMoveWindow:
     def close(self):
         self.active = False
         
+    def _is_used(self, move):
+        """ウィンドウを開いたプレイヤーが技を使用済みかどうか"""
+        return self.board is not None and self.board.special_state.is_used(self.player, move.name)
+        
     def use_special_move(self):
         if self.selected_move and self.board:
             # 技を使う処理
@@ -101,6 +110,33 @@ class SpecialMoveWindow:
         # 適切な分割位置が見つからない場合は文字数で分割
         return min(len(text) // 2, min_pos + search_range)
         
+    def _description_layout(self, description):
+        """説明テキストを表示する行のリスト [(行の文字列, 説明の領域の上端からの行の中心のy（Noneなら中央）)]"""
+        layout = self._description_layouts.get(description)
+        if layout is not None:
+            return layout
+            
+        # 説明テキストの長さに応じて分割（最大3行）
+        if len(description) > 30:
+            # 1行目と2行目の分割位置を探す
+            split_pos1 = self._find_split_position(description, 0, 15)  # 文字数を減らす
+            line1 = description[:split_pos1]
+            
+            # 2行目と3行目の分割位置を探す
+            remaining = description[split_pos1:]
+            split_pos2 = self._find_split_position(remaining, 0, 15)  # 文字数を減らす
+            line2 = remaining[:split_pos2]
+            line3 = remaining[split_pos2:]
+            layout = [(line1, 30), (line2, 60), (line3, 90)]
+        elif len(description) > 18:
+            # 適切な分割位置を探す（スペースや句読点の位置）
+            split_pos = self._find_split_position(description, 10, 15)  # 文字数を減らす
+            layout = [(description[:split_pos], 40), (description[split_pos:], 80)]
+        else:
+            layout = [(description, None)]
+        self._description_layouts[description] = layout
+        return layout
+        
     def draw(self, surface):
         if not self.active:
             return
@@ -111,7 +147,7 @@ class SpecialMoveWindow:
         pygame.draw.rect(surface, WINDOW_BORDER_COLOR, window_rect, 2)
         
         # タイトル
-        title_text = self.font.render("特殊技一覧", True, (0, 0, 0))
+        title_text = render_text(self.font, "特殊技一覧", (0, 0, 0))
         title_rect = title_text.get_rect(center=(self.x + self.width // 2, self.y + 30))
         surface.blit(title_text, title_rect)
         
@@ -126,7 +162,7 @@ class SpecialMoveWindow:
                 move_y = self.move_list_rect.y + 15 + i * 35  # 間隔を広げる
                 
                 # 技の背景色を決定（使用済みならグレー、選択中なら青、それ以外は白）
-                if is_move_used(move.name):
+                if self._is_used(move):
                     bg_color = (180, 180, 180)  # グレー（使用済み）
                 elif i == self.selected_index:
                     bg_color = (200, 220, 255)  # 青（選択中）
@@ -142,21 +178,21 @@ class SpecialMoveWindow:
                 )
                 pygame.draw.rect(surface, bg_color, highlight_rect)
                 
-                if i == self.selected_index and not is_move_used(move.name):
+                if i == self.selected_index and not self._is_used(move):
                     pygame.draw.rect(surface, (100, 150, 230), highlight_rect, 1)
                 
                 # 技の名前を表示（使用済みなら薄い色で）
-                text_color = (150, 150, 150) if is_move_used(move.name) else (0, 0, 0)
-                move_text = self.font.render(move.name, True, text_color)
+                text_color = (150, 150, 150) if self._is_used(move) else (0, 0, 0)
+                move_text = render_text(self.font, move.name, text_color)
                 surface.blit(move_text, (self.move_list_rect.x + 30, move_y))  # 左側の余白を増やす
                 
                 # 使用済みの場合は「使用済」と表示
-                if is_move_used(move.name):
-                    used_text = self.button_font.render("使用済", True, (200, 50, 50))
+                if self._is_used(move):
+                    used_text = render_text(self.button_font, "使用済", (200, 50, 50))
                     surface.blit(used_text, (self.move_list_rect.x + self.move_list_rect.width - 80, move_y))
         else:
             # 技がない場合のメッセージ
-            no_moves_text = self.font.render("利用可能な特殊技はありません", True, (100, 100, 100))
+            no_moves_text = render_text(self.font, "利用可能な特殊技はありません", (100, 100, 100))
             no_moves_rect = no_moves_text.get_rect(center=self.move_list_rect.center)
             surface.blit(no_moves_text, no_moves_rect)
         
@@ -166,56 +202,14 @@ class SpecialMoveWindow:
             pygame.draw.rect(surface, (240, 240, 240), self.description_rect)
             pygame.draw.rect(surface, (0, 0, 0), self.description_rect, 1)
             
-            # 説明テキストを複数行に分割して表示
-            description = self.selected_move.description
-            
-            # 説明テキストの長さに応じて分割（最大3行）
-            if len(description) > 30:
-                # 1行目と2行目の分割位置を探す
-                split_pos1 = self._find_split_position(description, 0, 15)  # 文字数を減らす
-                line1 = description[:split_pos1]
-                
-                # 2行目と3行目の分割位置を探す
-                remaining = description[split_pos1:]
-                split_pos2 = self._find_split_position(remaining, 0, 15)  # 文字数を減らす
-                line2 = remaining[:split_pos2]
-                line3 = remaining[split_pos2:]
-                
-                # 1行目
-                desc_text1 = self.font.render(line1, True, (0, 0, 0))
-                desc_rect1 = desc_text1.get_rect(center=(self.description_rect.centerx, self.description_rect.y + 30))
-                surface.blit(desc_text1, desc_rect1)
-                
-                # 2行目
-                desc_text2 = self.font.render(line2, True, (0, 0, 0))
-                desc_rect2 = desc_text2.get_rect(center=(self.description_rect.centerx, self.description_rect.y + 60))
-                surface.blit(desc_text2, desc_rect2)
-                
-                # 3行目
-                desc_text3 = self.font.render(line3, True, (0, 0, 0))
-                desc_rect3 = desc_text3.get_rect(center=(self.description_rect.centerx, self.description_rect.y + 90))
-                surface.blit(desc_text3, desc_rect3)
-                
-            elif len(description) > 18:
-                # 適切な分割位置を探す（スペースや句読点の位置）
-                split_pos = self._find_split_position(description, 10, 15)  # 文字数を減らす
-                
-                line1 = description[:split_pos]
-                line2 = description[split_pos:]
-                
-                # 1行目
-                desc_text1 = self.font.render(line1, True, (0, 0, 0))
-                desc_rect1 = desc_text1.get_rect(center=(self.description_rect.centerx, self.description_rect.y + 40))
-                surface.blit(desc_text1, desc_rect1)
-                
-                # 2行目
-                desc_text2 = self.font.render(line2, True, (0, 0, 0))
-                desc_rect2 = desc_text2.get_rect(center=(self.description_rect.centerx, self.description_rect.y + 80))
-                surface.blit(desc_text2, desc_rect2)
-            else:
-                # 短い説明はそのまま中央に表示
-                desc_text = self.font.render(description, True, (0, 0, 0))
-                desc_rect = desc_text.get_rect(center=self.description_rect.center)
+            # 説明テキストを複数行に分割して表示（分割結果は説明ごとに覚えておく）
+            for line, offset_y in self._description_layout(self.selected_move.description):
+                desc_text = render_text(self.font, line, (0, 0, 0))
+                if offset_y is None:
+                    # 短い説明はそのまま中央に表示
+                    desc_rect = desc_text.get_rect(center=self.description_rect.center)
+                else:
+                    desc_rect = desc_text.get_rect(center=(self.description_rect.centerx, self.description_rect.y + offset_y))
                 surface.blit(desc_text, desc_rect)
         
         # 戻るボタンの描画
@@ -230,9 +224,11 @@ class SpecialMoveWindow:
             pygame.draw.rect(surface, (200, 200, 200), disabled_rect)
             pygame.draw.rect(surface, (150, 150, 150), disabled_rect, 2)
             
-            text_surf = self.button_font.render("使う", True, (150, 150, 150))
+            text_surf = render_text(self.button_font, "使う", (150, 150, 150))
             text_rect = text_surf.get_rect(center=disabled_rect.center)
             surface.blit(text_surf, text_rect)
+            
+        return window_rect
         
     def handle_event(self, event):
         if not self.active:
@@ -242,7 +238,7 @@ class SpecialMoveWindow:
             if self.back_button.handle_event(event):
                 return True
                 
-            if self.selected_move and not is_move_used(self.selected_move.name) and self.use_button.handle_event(event):
+            if self.selected_move and not self._is_used(self.selected_move) and self.use_button.handle_event(event):
                 return True
                 
             # 技リストのクリック処理
@@ -255,7 +251,7 @@ class SpecialMoveWindow:
                 if 0 <= clicked_index < len(self.special_moves):
                     move = self.special_moves[clicked_index]
                     # 使用済みの技は選択できない
-                    if not is_move_used(move.name):
+                    if not self._is_used(move):
                         self.selected_index = clicked_index
                         self.selected_move = move
                     return True
@@ -329,7 +325,7 @@ class PromotionWindow:
         pygame.draw.rect(surface, WINDOW_BORDER_COLOR, window_rect, 2)
         
         # タイトル
-        title_text = self.font.render("成りますか？", True, (0, 0, 0))
+        title_text = render_text(self.font, "成りますか？", (0, 0, 0))
         title_rect = title_text.get_rect(center=(self.x + self.width // 2, self.y + 30))
         surface.blit(title_text, title_rect)
         
@@ -337,6 +333,8 @@ class PromotionWindow:
         self.promote_button.draw(surface, self.button_font)
         self.dont_promote_button.draw(surface, self.button_font)
         
+        return window_rect
+        
     def handle_event(self, event):
         if not self.active:
             return False